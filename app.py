@@ -1,14 +1,41 @@
+import logging
+import os
+
 from flask import Flask
 
-from config import init_datastore_client
+from config import init_storage_client
 from contracts import require_accept_json, reject_body
+from storage import StorageClient
+from storage.instrumented import InstrumentedClient
+from storage.lazy import LazyClient
+from utils.cache import get_entity_cache
+from utils.compression import init_compression
+from utils.json_provider import init_json
+from utils.metrics import init_metrics, metrics
 from users.routes import create_users_blueprint
 from arts.routes import create_arts_blueprint
 from galleries.routes import create_galleries_blueprint
+from comments.routes import create_comments_blueprint
+
+logger = logging.getLogger(__name__)
 
-def create_app() -> Flask:
+# ds lets callers (tests, benchmarks) supply their own storage client. By default the client
+# is created lazily on first use, once per process, so a preloaded app can be forked safely.
+def create_app(ds: StorageClient | None = None) -> Flask:
     app = Flask(__name__)
-    ds = init_datastore_client()
+    if ds is None:
+        ds = LazyClient(init_storage_client)
+    app.extensions["bearsty.storage"] = ds
+    # Every storage call made through the repo modules is counted and timed for /metrics. A
+    # client that is already instrumented (the bench's) reports to both instead of being
+    # wrapped twice.
+    if isinstance(ds, InstrumentedClient):
+        ds.add_listener(metrics.observe_rpc)
+    else:
+        ds = InstrumentedClient(ds, metrics.observe_rpc)
+    init_json(app)
+    init_compression(app)
+    init_metrics(app)
 
     @app.get("/")
     @require_accept_json
@@ -16,11 +43,42 @@ def create_app() -> Flask:
     def health_check():
         return {"status": "ok"}, 200
 
+    @app.get("/stats/cache")
+    @require_accept_json
+    @reject_body
+    def cache_stats():
+        return get_entity_cache().stats(), 200
+
     app.register_blueprint(create_users_blueprint(ds))
     app.register_blueprint(create_arts_blueprint(ds))
     app.register_blueprint(create_galleries_blueprint(ds))
+    app.register_blueprint(create_comments_blueprint(ds))
     
     return app
 
+# Per-worker warm-up: build the storage client, open its channel with one lookup and run a
+# request through the full Flask stack, so the first real request doesn't pay for it.
+def warm_up(app: Flask) -> None:
+    ds = app.extensions["bearsty.storage"]
+    try:
+        ds.get(ds.key("User", 1))
+    except Exception:
+        logger.exception("Storage warm-up failed")
+    with app.test_client() as client:
+        client.get("/", headers={"Accept": "application/json"})
+
+# Flushes buffered writes (live canvases) and closes the storage client
+def shutdown(app: Flask) -> None:
+    for hook in app.extensions.get("bearsty.on_shutdown", []):
+        try:
+            hook()
+        except Exception:
+            logger.exception("Shutdown hook failed")
+    ds = app.extensions["bearsty.storage"]
+    close = getattr(ds, "close", None)
+    if close is not None:
+        close()
+
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
     create_app().run(port=8080, debug=True)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import re
+import struct
+from array import array
+
+# Palette-indexed pixel canvas, the image format of live drawing sessions. One byte per
+# pixel indexes a palette of up to 256 RGB colours. Encoded as
+#   b"BCV1" | width, height (uint16 LE) | width*height palette indices | palette (3 bytes per colour)
+# The pixels come before the palette, so painting changes bytes in place and a new colour
+# only appends; revisions diff down to a few bytes per stroke.
+
+CANVAS_TYPE = "application/vnd.bearsty.canvas"
+MAGIC = b"BCV1"
+MAX_DIMENSION = 4096
+MAX_COLOURS = 256
+WHITE = 0xFFFFFF
+
+_HEADER = struct.Struct("<4sHH")
+_COLOUR_RE = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+
+def parse_colour(value) -> int:
+    if isinstance(value, int) and 0 <= value <= 0xFFFFFF:
+        return value
+    if isinstance(value, str):
+        m = _COLOUR_RE.match(value)
+        if m:
+            return int(m.group(1), 16)
+    raise ValueError(f"invalid colour: {value!r}")
+
+
+class Canvas:
+    def __init__(self, width: int, height: int, pixels: array, palette: list[int]):
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.palette = palette
+        self._lookup = {rgb: i for i, rgb in enumerate(palette)}
+
+    @classmethod
+    def blank(cls, width: int, height: int, background: int = WHITE) -> "Canvas":
+        if not (0 < width <= MAX_DIMENSION and 0 < height <= MAX_DIMENSION):
+            raise ValueError("invalid canvas size")
+        return cls(width, height, array("B", bytes(width * height)), [background])
+
+    @classmethod
+    def decode(cls, data: bytes) -> "Canvas":
+        if len(data) < _HEADER.size:
+            raise ValueError("not a canvas")
+        magic, width, height = _HEADER.unpack_from(data)
+        end = _HEADER.size + width * height
+        palette_bytes = data[end:]
+        if magic != MAGIC or len(data) < end or len(palette_bytes) % 3 or not palette_bytes:
+            raise ValueError("not a canvas")
+        pixels = array("B", data[_HEADER.size:end])
+        palette = [int.from_bytes(palette_bytes[i:i + 3], "big") for i in range(0, len(palette_bytes), 3)]
+        if max(pixels, default=0) >= len(palette):
+            raise ValueError("canvas pixel outside palette")
+        return cls(width, height, pixels, palette)
+
+    def encode(self) -> bytes:
+        return b"".join((
+            _HEADER.pack(MAGIC, self.width, self.height),
+            self.pixels.tobytes(),
+            b"".join(rgb.to_bytes(3, "big") for rgb in self.palette),
+        ))
+
+    def colour_index(self, rgb: int) -> int:
+        index = self._lookup.get(rgb)
+        if index is None:
+            if len(self.palette) >= MAX_COLOURS:
+                raise ValueError("canvas palette is full")
+            index = self._lookup[rgb] = len(self.palette)
+            self.palette.append(rgb)
+        return index
+
+    # Returns True if the pixel changed
+    def paint(self, x: int, y: int, rgb: int) -> bool:
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise ValueError(f"pixel ({x}, {y}) is outside the canvas")
+        offset = y * self.width + x
+        index = self.colour_index(rgb)
+        if self.pixels[offset] == index:
+            return False
+        self.pixels[offset] = index
+        return True
+
+    # Flat RGB bytes, row by row
+    def to_rgb(self) -> bytes:
+        colours = [rgb.to_bytes(3, "big") for rgb in self.palette]
+        return b"".join(colours[i] for i in self.pixels)
+
+    def colour_at(self, x: int, y: int) -> int:
+        return self.palette[self.pixels[y * self.width + x]]
@@ -0,0 +1,176 @@
+import base64
+import binascii
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from google.cloud import datastore
+
+from contracts import ApiContractViolation
+from storage import StorageClient
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Materialised public feed: the FEED_SIZE most recently modified public arts, kept sorted in
+# memory so GET /feed never queries storage. The arts repo updates it on every create,
+# update and delete. It is rebuilt from storage (one bounded query) on first use in each
+# process and again once it is FEED_REFRESH seconds old, which picks up writes made by other
+# worker processes.
+#
+#   FEED_SIZE     arts kept in the feed; older ones drop off the end
+#   FEED_REFRESH  seconds between rebuilds (0 never rebuilds after the first)
+
+FEED_SIZE = int(os.getenv("FEED_SIZE", "1000"))
+FEED_REFRESH = float(os.getenv("FEED_REFRESH", "60"))
+
+# Properties kept per feed entry; enough for a feed item without reading the art
+FEED_FIELDS = ("A_Title", "A_Modified_Date", "User", "A_Image_Digest")
+
+
+def _project(art: datastore.Entity) -> datastore.Entity | None:
+    if not art.get("A_Is_Public"):
+        return None
+    entry = datastore.Entity(key=art.key)
+    entry.update({k: art[k] for k in FEED_FIELDS if k in art})
+    return entry
+
+
+def _sort_key(entry: datastore.Entity) -> tuple[str, int]:
+    return entry.get("A_Modified_Date") or "", entry.key.id
+
+
+# Cursors are the sort key of the last item served, so paging is stable while the feed changes
+def encode_cursor(key: tuple[str, int]) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}|{key[1]}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        modified, art_id = base64.urlsafe_b64decode(cursor).decode("utf-8").rsplit("|", 1)
+        return modified, int(art_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ApiContractViolation(400, "Bad Request: invalid cursor.")
+
+
+class PublicFeed:
+    def __init__(self, *, size: int = FEED_SIZE, refresh: float = FEED_REFRESH):
+        self.size = size
+        self.refresh = refresh
+        self._keys = []  # (A_Modified_Date, art id), ascending
+        self._entries = {}  # art id -> projected entity
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._loaded_at = None
+        self._changes = None  # art id -> entry or None, recorded while a rebuild runs
+
+    def update(self, art: datastore.Entity) -> None:
+        self._change(art.key.id, _project(art))
+
+    def remove(self, art_id: int) -> None:
+        self._change(art_id, None)
+
+    def _change(self, art_id: int, entry: datastore.Entity | None) -> None:
+        with self._lock:
+            if self._changes is not None:
+                self._changes[art_id] = entry
+            # Before the first rebuild there is nothing to keep up to date
+            if self._loaded_at is not None:
+                self._apply(art_id, entry)
+
+    # Caller holds self._lock
+    def _apply(self, art_id: int, entry: datastore.Entity | None) -> None:
+        old = self._entries.pop(art_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, _sort_key(old))]
+        if entry is None:
+            return
+        key = _sort_key(entry)
+        if len(self._keys) >= self.size and key < self._keys[0]:
+            return
+        insort(self._keys, key)
+        self._entries[art_id] = entry
+        if len(self._keys) > self.size:
+            del self._entries[self._keys.pop(0)[1]]
+
+    # Reloads the newest public arts from storage. Writes that land while the query runs are
+    # replayed on top, so the rebuilt feed is never older than what this process wrote.
+    def rebuild(self, ds: StorageClient, *, if_stale: bool = False) -> None:
+        from arts.repo import list_public_arts
+
+        with self._rebuild_lock:
+            # Another request may have rebuilt it while this one waited
+            if if_stale and self._is_fresh():
+                return
+            with self._lock:
+                self._changes = {}
+            try:
+                arts = list_public_arts(ds, limit=self.size)
+            except BaseException:
+                with self._lock:
+                    self._changes = None
+                raise
+            with self._lock:
+                self._keys, self._entries = [], {}
+                for art in arts:
+                    self._apply(art.key.id, _project(art))
+                for art_id, entry in self._changes.items():
+                    self._apply(art_id, entry)
+                self._changes = None
+                self._loaded_at = time.monotonic()
+        metrics.increment("feed_rebuilds")
+
+    # The first request in a process waits for the load; a stale feed is rebuilt by the one
+    # request that notices, while concurrent requests keep reading the current one.
+    def _ensure_fresh(self, ds: StorageClient) -> None:
+        if self._loaded_at is None:
+            self.rebuild(ds, if_stale=True)
+        elif not self._is_fresh() and not self._rebuild_lock.locked():
+            try:
+                self.rebuild(ds, if_stale=True)
+            except Exception:
+                logger.exception("Feed rebuild failed; serving the previous feed")
+
+    def _is_fresh(self) -> bool:
+        loaded_at = self._loaded_at
+        if loaded_at is None:
+            return False
+        return self.refresh <= 0 or time.monotonic() - loaded_at <= self.refresh
+
+    # One page, newest first. Returns the projected arts and the next cursor (None at the end).
+    def page(
+        self, ds: StorageClient, *, limit: int, offset: int = 0, cursor: str | None = None
+    ) -> tuple[list[datastore.Entity], str | None]:
+        after = decode_cursor(cursor) if cursor is not None else None
+        self._ensure_fresh(ds)
+        with self._lock:
+            end = bisect_left(self._keys, after) if after is not None else len(self._keys) - offset
+            start = max(0, end - limit)
+            keys = self._keys[start:max(start, end)]
+            items = [self._entries[art_id] for _, art_id in reversed(keys)]
+        next_cursor = encode_cursor(keys[0]) if keys and start > 0 else None
+        return items, next_cursor
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_public_feed() -> PublicFeed:
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = PublicFeed()
+    return _feed
+
+
+def set_public_feed(feed: PublicFeed) -> None:
+    global _feed
+    _feed = feed
@@ -0,0 +1,183 @@
+import os
+import struct
+import zlib
+
+from google.cloud import datastore
+
+from storage import StorageClient
+from storage.blobs import blob_digest, get_blob_store
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from utils.time_utils import iso_utc_now
+
+# Image history of an art. Every image write adds an ArtRevision child entity
+# (key Art/<id>/ArtRevision/<n>, n = 1, 2, ...). A revision is either
+#   snapshot  R_Digest names the full image in the blob store
+#   delta     R_Delta holds the byte runs that changed since revision n-1 (zlib)
+# A snapshot is taken every HISTORY_SNAPSHOT_INTERVAL revisions, and whenever a delta would
+# not be much smaller than the image. Rebuilding any revision therefore reads one snapshot
+# and at most HISTORY_SNAPSHOT_INTERVAL - 1 deltas, in one batched lookup.
+
+REVISION_KIND = "ArtRevision"
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+HISTORY_SNAPSHOT_INTERVAL = max(1, int(os.getenv("HISTORY_SNAPSHOT_INTERVAL", "16")))
+
+# Deltas are stored inline on the revision entity, well under Datastore's 1 MiB entity limit
+MAX_DELTA_SIZE = 512 * 1024
+
+# Unchanged gaps shorter than this are folded into the surrounding run; an op header costs 8 bytes
+_MIN_GAP = 8
+_OP = struct.Struct("<II")
+_LENGTH = struct.Struct("<I")
+
+
+# -------------------------
+# Byte deltas
+# -------------------------
+
+def diff(old: bytes, new: bytes) -> bytes:
+    ops = [_LENGTH.pack(len(new))]
+    common = min(len(old), len(new))
+    i = 0
+    while i < common:
+        if old[i] == new[i]:
+            i += 1
+            continue
+        start = i
+        end = i + 1
+        while end < common:
+            if old[end] != new[end]:
+                end += 1
+                continue
+            gap = end
+            while gap < common and gap - end < _MIN_GAP and old[gap] == new[gap]:
+                gap += 1
+            if gap == common or gap - end >= _MIN_GAP:
+                break
+            end = gap
+        ops.append(_OP.pack(start, end - start) + new[start:end])
+        i = end
+    if len(new) > common:
+        ops.append(_OP.pack(common, len(new) - common) + new[common:])
+    return zlib.compress(b"".join(ops), 9)
+
+
+def patch(old: bytes, delta: bytes) -> bytes:
+    raw = zlib.decompress(delta)
+    (length,) = _LENGTH.unpack_from(raw)
+    out = bytearray(old[:length].ljust(length, b"\0"))
+    pos = _LENGTH.size
+    while pos < len(raw):
+        start, size = _OP.unpack_from(raw, pos)
+        pos += _OP.size
+        out[start:start + size] = raw[pos:pos + size]
+        pos += size
+    return bytes(out)
+
+
+# -------------------------
+# Revisions
+# -------------------------
+
+def revision_key(ds: StorageClient, art_id: int, number: int) -> datastore.Key:
+    return ds.key("Art", art_id, REVISION_KIND, number)
+
+
+# The revision entity for an image write, or None if the image did not change. `art` is the
+# stored entity before the write; A_Image_Digest / A_Image_Type in `updates` describe the new
+# image. The caller persists it together with the art (and bumps A_Revision) in one commit.
+def build_revision(ds: StorageClient, art: datastore.Entity, updates: dict) -> datastore.Entity | None:
+    if "A_Image_Digest" not in updates:
+        return None
+    old_digest = art.get("A_Image_Digest")
+    new_digest = updates["A_Image_Digest"]
+    previous = art.get("A_Revision", 0)
+    if new_digest == old_digest and (previous or new_digest is None):
+        return None
+
+    number = previous + 1
+    revision = datastore.Entity(key=revision_key(ds, art.key.id, number), exclude_from_indexes=("R_Delta",))
+    revision.update({
+        "R_Number": number,
+        "R_Date": iso_utc_now(),
+        "R_Digest": new_digest,
+        "R_Type": SNAPSHOT,
+        "R_Base": number,
+        "R_Media_Type": updates.get("A_Image_Type"),
+    })
+
+    blobs = get_blob_store()
+    new = blobs.get(new_digest) if new_digest else b""
+    revision["R_Size"] = len(new or b"")
+    base = art.get("A_Revision_Base", previous)
+    if not previous or number - base >= HISTORY_SNAPSHOT_INTERVAL or art.get("A_Image_Type") != updates.get("A_Image_Type"):
+        return revision
+    old = blobs.get(old_digest) if old_digest else b""
+    if old is None or new is None:
+        return revision
+    delta = diff(old, new)
+    if len(delta) * 2 > len(new) or len(delta) > MAX_DELTA_SIZE:
+        return revision
+    revision.update({"R_Type": DELTA, "R_Base": base, "R_Delta": delta})
+    return revision
+
+
+# Properties the art carries so the next write can build its revision without a query
+def revision_pointer(revision: datastore.Entity) -> dict:
+    return {"A_Revision": revision["R_Number"], "A_Revision_Base": revision["R_Base"]}
+
+
+def list_revisions(
+    ds: StorageClient, art_id: int, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[datastore.Entity], str | None]:
+    query = ds.query(kind=REVISION_KIND, ancestor=ds.key("Art", art_id))
+    return fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+
+
+def list_revision_keys(ds: StorageClient, art_id: int) -> list[datastore.Key]:
+    query = ds.query(kind=REVISION_KIND, ancestor=ds.key("Art", art_id))
+    query.keys_only()
+    return [e.key for e in query.fetch()]
+
+
+# Called when the art is deleted; in batches, as a long-lived art has more revisions than
+# one commit can delete
+def delete_revisions(ds: StorageClient, art_id: int, *, batch: int = 400) -> None:
+    keys = list_revision_keys(ds, art_id)
+    for start in range(0, len(keys), batch):
+        ds.delete_multi(keys[start:start + batch])
+
+
+# (bytes, revision entity) for revision `number`, or None if it does not exist. Raises
+# LookupError if the chain cannot be rebuilt (a snapshot blob is missing or a delta is corrupt).
+def get_revision_content(ds: StorageClient, art_id: int, number: int) -> tuple[bytes, datastore.Entity] | None:
+    revision = ds.get(revision_key(ds, art_id, number))
+    if revision is None:
+        return None
+    if revision["R_Type"] == SNAPSHOT:
+        return _snapshot_content(revision), revision
+
+    base = revision["R_Base"]
+    chain = {
+        e["R_Number"]: e
+        for e in ds.get_multi([revision_key(ds, art_id, n) for n in range(base, number)])
+    }
+    if len(chain) != number - base or chain[base]["R_Type"] != SNAPSHOT:
+        raise LookupError(f"revision chain of art {art_id} is broken at {number}")
+    content = _snapshot_content(chain[base])
+    chain[number] = revision
+    for n in range(base + 1, number + 1):
+        content = patch(content, chain[n]["R_Delta"])
+    if revision["R_Digest"] and blob_digest(content) != revision["R_Digest"]:
+        raise LookupError(f"revision {number} of art {art_id} does not match its digest")
+    return content, revision
+
+
+def _snapshot_content(revision: datastore.Entity) -> bytes:
+    if not revision["R_Digest"]:
+        return b""
+    content = get_blob_store().get(revision["R_Digest"])
+    if content is None:
+        raise LookupError(f"blob {revision['R_Digest']} is missing")
+    return content
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import re
+
+from google.cloud import datastore
+
+from contracts import ApiContractViolation
+from arts.canvas import CANVAS_TYPE
+from arts.thumbnails import schedule_thumbnails
+from storage.blobs import get_blob_store
+
+# A_Image arrives as a string: either a data URL (data:image/png;base64,...) or plain text
+# such as a path. The bytes go to the blob store; the Art entity keeps only
+#   A_Image_Digest  SHA-256 of the bytes (None when there is no image)
+#   A_Image_Type    media type to serve them with
+# Data URLs must carry one of RASTER_TYPES. The bytes are served from the API's own origin,
+# so a type a browser would render as a document (text/html, image/svg+xml) would be stored
+# XSS; those are rejected, and anything stored before this check is served as a download.
+
+_DATA_URL_RE = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?((?:;[\w-]+=[^;,]*)*)(;base64)?,(.*)$", re.DOTALL)
+TEXT_TYPE = "text/plain; charset=utf-8"
+BINARY_TYPE = "application/octet-stream"
+RASTER_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp")
+_INLINE_TYPES = (*RASTER_TYPES, "text/plain", CANVAS_TYPE)
+
+# Query-string version in image URLs; long enough to be unique per art in practice
+VERSION_LENGTH = 16
+
+
+# any_type skips the RASTER_TYPES check, for values stored before it existed
+def decode_image(value, *, any_type: bool = False) -> tuple[bytes, str]:
+    if not isinstance(value, str):
+        raise ApiContractViolation(400, "Bad Request: invalid A_Image.")
+    m = _DATA_URL_RE.match(value)
+    if m is None:
+        return value.encode("utf-8"), TEXT_TYPE
+    media_type, params, is_base64, payload = m.groups()
+    media_type = (media_type or "text/plain").lower()
+    if media_type in RASTER_TYPES:
+        params = ""
+    elif not any_type:
+        raise ApiContractViolation(400, "Bad Request: A_Image must be a PNG, JPEG, GIF or WebP data URL.")
+    media_type += params or ""
+    if not is_base64:
+        return payload.encode("utf-8"), media_type
+    try:
+        return base64.b64decode(payload, validate=True), media_type
+    except (binascii.Error, ValueError):
+        raise ApiContractViolation(400, "Bad Request: invalid A_Image.")
+
+
+# Entity properties for a request's A_Image value. Stores the bytes and starts rendering
+# thumbnails as side effects.
+def image_fields(value, *, any_type: bool = False) -> dict:
+    data, media_type = decode_image(value, any_type=any_type)
+    if not data:
+        return {"A_Image_Digest": None, "A_Image_Type": None}
+    digest = get_blob_store().put(data)
+    schedule_thumbnails(digest, media_type)
+    return {"A_Image_Digest": digest, "A_Image_Type": media_type}
+
+
+# Digest and media type of an art's image, or (None, None). Arts written before the blob
+# store still carry the inline A_Image value; it is copied into the store on first read.
+def image_blob(art: datastore.Entity) -> tuple[str | None, str | None]:
+    if "A_Image_Digest" in art:
+        return art["A_Image_Digest"], art.get("A_Image_Type") or BINARY_TYPE
+    legacy = art.get("A_Image")
+    if not legacy:
+        return None, None
+    fields = image_fields(legacy, any_type=True)
+    return fields["A_Image_Digest"], fields["A_Image_Type"]
+
+
+# Content-Type and extra headers for sending stored bytes of media_type. Types outside the
+# ones this API writes go out as an attachment, and nosniff stops browsers second-guessing.
+def served_type(media_type: str | None) -> tuple[str, dict]:
+    headers = {"X-Content-Type-Options": "nosniff"}
+    base = (media_type or "").split(";")[0].strip().lower()
+    if base in _INLINE_TYPES:
+        return media_type, headers
+    return BINARY_TYPE, {**headers, "Content-Disposition": "attachment"}
+
+
+def image_version(art: datastore.Entity) -> str | None:
+    digest = art.get("A_Image_Digest")
+    return digest[:VERSION_LENGTH] if digest else None
@@ -0,0 +1,155 @@
+import struct
+import zlib
+
+# Minimal PNG codec for thumbnails, standard library only. Decodes non-interlaced images
+# with 8-bit channels (grey, RGB, palette, grey+alpha, RGBA; palette also at 1/2/4 bits)
+# to RGB, compositing alpha over white. Encodes 8-bit RGB. Uploaded images are untrusted, so
+# the header's size is capped before anything is allocated and the pixel data is inflated
+# only as far as that size needs; a small file cannot ask for gigabytes.
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+MAX_SIDE = 8192
+MAX_PIXELS = 4096 * 4096
+
+
+def is_png(data: bytes) -> bool:
+    return data[:8] == SIGNATURE
+
+
+def _chunks(data: bytes):
+    pos = 8
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack_from(">I4s", data, pos)
+        yield kind, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _unfilter(raw: bytes, height: int, stride: int, bpp: int) -> bytearray:
+    out = bytearray(height * stride)
+    prev = bytearray(stride)
+    pos = 0
+    for y in range(height):
+        ftype = raw[pos]
+        line = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if ftype == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif ftype == 2:
+            for i in range(stride):
+                line[i] = (line[i] + prev[i]) & 0xFF
+        elif ftype == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif ftype == 4:
+            for i in range(stride):
+                a = line[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                line[i] = (line[i] + pred) & 0xFF
+        elif ftype != 0:
+            raise ValueError(f"bad PNG filter type {ftype}")
+        out[y * stride:(y + 1) * stride] = line
+        prev = line
+    return out
+
+
+# Returns (width, height, rgb bytes). Raises ValueError for unsupported, oversized or corrupt
+# images, including those zlib and struct reject.
+def decode_png(data: bytes) -> tuple[int, int, bytes]:
+    try:
+        return _decode(data)
+    except (zlib.error, struct.error) as e:
+        raise ValueError(f"corrupt PNG: {e}") from e
+
+
+def _inflate(chunks: list[bytes], size: int) -> bytes:
+    inflater = zlib.decompressobj()
+    raw = inflater.decompress(b"".join(chunks), size)
+    if len(raw) < size:
+        raise ValueError("truncated PNG data")
+    return raw
+
+
+def _decode(data: bytes) -> tuple[int, int, bytes]:
+    if not is_png(data):
+        raise ValueError("not a PNG")
+    header = None
+    palette = b""
+    idat = []
+    for kind, body in _chunks(data):
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"PLTE":
+            palette = body
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ValueError("PNG without IHDR")
+    width, height, depth, colour_type, _, _, interlace = header
+    if interlace or colour_type not in _CHANNELS:
+        raise ValueError("unsupported PNG layout")
+    if depth != 8 and not (colour_type == 3 and depth in (1, 2, 4)):
+        raise ValueError(f"unsupported PNG bit depth {depth}")
+    if not (0 < width <= MAX_SIDE and 0 < height <= MAX_SIDE) or width * height > MAX_PIXELS:
+        raise ValueError(f"PNG too large: {width}x{height}")
+
+    channels = _CHANNELS[colour_type]
+    stride = (width * channels * depth + 7) // 8
+    raw = _inflate(idat, height * (stride + 1))
+    pixels = _unfilter(raw, height, stride, max(1, channels * depth // 8))
+    # Indices past the end of a short palette read as black
+    palette = palette.ljust(256 * 3, b"\0")
+
+    rgb = bytearray(width * height * 3)
+    o = 0
+    for y in range(height):
+        row = pixels[y * stride:(y + 1) * stride]
+        if colour_type == 3:
+            if depth < 8:
+                per_byte = 8 // depth
+                mask = (1 << depth) - 1
+                indices = [(row[x // per_byte] >> (8 - depth * (x % per_byte + 1))) & mask for x in range(width)]
+            else:
+                indices = row[:width]
+            for i in indices:
+                rgb[o:o + 3] = palette[i * 3:i * 3 + 3]
+                o += 3
+        elif colour_type == 2:
+            rgb[o:o + width * 3] = row
+            o += width * 3
+        elif colour_type == 0:
+            for g in row:
+                rgb[o] = rgb[o + 1] = rgb[o + 2] = g
+                o += 3
+        else:
+            for x in range(width):
+                px = row[x * channels:(x + 1) * channels]
+                alpha = px[-1]
+                colour = px[:3] if colour_type == 6 else px[:1] * 3
+                for c in colour:
+                    rgb[o] = (c * alpha + 255 * (255 - alpha)) // 255
+                    o += 1
+    return width, height, bytes(rgb)
+
+
+def encode_png(width: int, height: int, rgb: bytes) -> bytes:
+    stride = width * 3
+    raw = b"".join(b"\0" + rgb[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    return b"".join((
+        SIGNATURE,
+        chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        chunk(b"IDAT", zlib.compress(raw, 9)),
+        chunk(b"IEND", b""),
+    ))
@@ -1,44 +1,207 @@
+import os
+from typing import Callable, Iterable
+
 from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from arts.feed import get_public_feed
+from arts.history import build_revision, delete_revisions, revision_pointer
+from comments.repo import delete_comments
+from galleries.members import delete_art_memberships
+from storage import StorageClient
+from users.repo import stage_user_counts
+from utils.cache import cache_invalidate, cache_refresh, cached_get, cached_get_multi
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from utils.writebehind import WriteBehindBuffer
 
 ART_KIND = "Art"
 
-def create_art_entity(ds: datastore.Client, data: dict) -> datastore.Entity:
+# Opt-in write-behind for PATCH autosaves: with a positive interval (seconds), buffered field
+# updates are merged in memory and each art is written at most once per interval. Reads
+# through this module see buffered updates; every synchronous write takes them along.
+ART_WRITE_BEHIND_INTERVAL = float(os.getenv("ART_WRITE_BEHIND_INTERVAL", "0") or 0)
+
+def create_art_entity(ds: StorageClient, data: dict) -> datastore.Entity:
     key = ds.key(ART_KIND)
     art = datastore.Entity(key=key)
     art.update(data)
-    ds.put(art)
+    # The owner's Art_Count changes in the same commit as the art
+    with ds.transaction():
+        owner = stage_user_counts(ds, _owner_id(art), Art_Count=1)
+        ds.put_multi([art] + ([owner] if owner is not None else []))
+    if owner is not None:
+        cache_refresh(owner)
+    # The first revision needs the art's id, so it is written once the art exists
+    revision = build_revision(ds, datastore.Entity(key=art.key), data)
+    if revision is not None:
+        art.update(revision_pointer(revision))
+        ds.put_multi([art, revision])
+    cache_refresh(art)
+    get_public_feed().update(art)
     return art
 
-def get_art(ds: datastore.Client, art_id: int) -> datastore.Entity | None:
-    return ds.get(ds.key(ART_KIND, art_id))
+def get_art(ds: StorageClient, art_id: int) -> datastore.Entity | None:
+    return _with_pending(cached_get(ds, ART_KIND, art_id))
+
+# Batch lookup; ids that do not exist are absent from the result
+def get_arts(ds: StorageClient, art_ids: Iterable[int]) -> dict[int, datastore.Entity]:
+    return {art_id: _with_pending(art) for art_id, art in cached_get_multi(ds, ART_KIND, art_ids).items()}
+
+def list_arts(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[datastore.Entity], str | None]:
+    query = ds.query(kind=ART_KIND)
+    arts, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [_with_pending(a) for a in arts], next_cursor
+
+# Keys-only variant for callers that only need ids (mini responses): no property data is read
+def list_art_ids(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = ds.query(kind=ART_KIND)
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [e.key.id for e in keys], next_cursor
+
+# A user's arts, most recently modified first (composite index in index.yaml)
+def list_user_art_ids(
+    ds: StorageClient, user_id: int, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = _user_arts_query(ds, user_id)
+    query.order = ["-A_Modified_Date"]
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [e.key.id for e in keys], next_cursor
+
+# Full count with a keys-only scan; only used by users.migrate to seed Art_Count
+def count_user_arts(ds: StorageClient, user_id: int) -> int:
+    query = _user_arts_query(ds, user_id)
+    query.keys_only()
+    return sum(1 for _ in query.fetch())
 
-def list_arts(ds: datastore.Client, *, limit: int | None = None, offset: int = 0) -> list[datastore.Entity]:
+def _user_arts_query(ds: StorageClient, user_id: int):
     query = ds.query(kind=ART_KIND)
-    if limit is None:
-        return list(query.fetch(offset=offset))
-    return list(query.fetch(limit=limit, offset=offset))
+    query.add_filter(filter=PropertyFilter("User.U_ID", "=", user_id))
+    return query
 
-def delete_art(ds: datastore.Client, art_id: int) -> bool:
+def _owner_id(art: datastore.Entity) -> int | None:
+    return (art.get("User") or {}).get("U_ID")
+
+# Public arts, newest first; the feed's cold rebuild (composite index in index.yaml)
+def list_public_arts(ds: StorageClient, *, limit: int) -> list[datastore.Entity]:
+    query = ds.query(kind=ART_KIND)
+    query.add_filter(filter=PropertyFilter("A_Is_Public", "=", True))
+    query.order = ["-A_Modified_Date"]
+    return [_with_pending(a) for a in query.fetch(limit=limit)]
+
+# An author's public arts modified in [since, until], newest first (composite index in
+# index.yaml); timelines merge these in for authors on fan-out-on-read
+def list_public_user_arts(
+    ds: StorageClient, user_id: int, *, limit: int, since: str | None = None, until: str | None = None
+) -> list[datastore.Entity]:
+    query = _user_arts_query(ds, user_id)
+    query.add_filter(filter=PropertyFilter("A_Is_Public", "=", True))
+    if since is not None:
+        query.add_filter(filter=PropertyFilter("A_Modified_Date", ">=", since))
+    if until is not None:
+        query.add_filter(filter=PropertyFilter("A_Modified_Date", "<=", until))
+    query.order = ["-A_Modified_Date"]
+    return [_with_pending(a) for a in query.fetch(limit=limit)]
+
+def delete_art(ds: StorageClient, art_id: int) -> bool:
     key = ds.key(ART_KIND, art_id)
-    if ds.get(key) is None:
-        return False
-    ds.delete(key)
+    with ds.transaction():
+        art = ds.get(key)
+        if art is None:
+            return False
+        owner = stage_user_counts(ds, _owner_id(art), Art_Count=-1)
+        ds.delete(key)
+        if owner is not None:
+            ds.put(owner)
+    if owner is not None:
+        cache_refresh(owner)
+    delete_revisions(ds, art_id)
+    delete_comments(ds, key)
+    delete_art_memberships(ds, art_id, [g.get("G_ID") for g in art.get("Galleries", []) or [] if isinstance(g, dict)])
+    if _write_buffer is not None:
+        _write_buffer.discard(art_id)
+    cache_invalidate(ART_KIND, art_id)
+    get_public_feed().remove(art_id)
     return True
 
-def update_art(ds: datastore.Client, art: datastore.Entity, updates: dict) -> datastore.Entity:
+# Applies updates to a fresh read inside a transaction, so properties other writers own
+# (comment counts, Galleries, revision pointers) are never written back from a stale copy.
+# precondition (e.g. an If-Match version check) runs against that read, so the check and the
+# write are atomic. An image change writes the art and its new revision in the same commit.
+# Returns None if the entity is gone.
+def update_art(
+    ds: StorageClient, art: datastore.Entity, updates: dict, *, precondition: Callable | None = None
+) -> datastore.Entity | None:
+    pending = _write_buffer.take(art.key.id) if _write_buffer is not None else {}
+    try:
+        with ds.transaction():
+            art = ds.get(art.key)
+            if art is None:
+                return None
+            # The precondition sees the version the client last read, buffered updates included
+            art.update(pending)
+            if precondition is not None:
+                precondition(art)
+            revision = build_revision(ds, art, updates)
+            _apply_updates(art, updates)
+            if revision is None:
+                ds.put(art)
+            else:
+                art.update(revision_pointer(revision))
+                ds.put_multi([art, revision])
+    except BaseException:
+        if pending:
+            _write_buffer.restore(ds, art.key.id, pending)
+        raise
+    cache_refresh(art)
+    get_public_feed().update(art)
+    return art
+
+# PATCH fast path. With write-behind enabled the updates are buffered and the art is returned
+# as it will be stored; otherwise this is update_art.
+def buffer_art_update(ds: StorageClient, art: datastore.Entity, updates: dict) -> datastore.Entity | None:
+    if _write_buffer is None or "A_Image_Digest" in updates:
+        return update_art(ds, art, updates)
+    _write_buffer.add(ds, art.key.id, updates)
     art.update(updates)
-    ds.put(art)
+    get_public_feed().update(art)
     return art
 
-def add_gallery_to_art(ds: datastore.Client, art: datastore.Entity, gallery_mini: dict) -> None:
-    galleries = art.get("Galleries", []) or []
-    galleries.append(gallery_mini)
-    art["Galleries"] = galleries
-    ds.put(art)
+def stop_art_writes() -> None:
+    if _write_buffer is not None:
+        _write_buffer.stop()
 
-def remove_gallery_from_art(ds: datastore.Client, art: datastore.Entity, gallery_id: int) -> None:
-    galleries = art.get("Galleries", []) or []
-    art["Galleries"] = [g for g in galleries if g.get("G_ID") != gallery_id]
-    ds.put(art)
+# Writes buffered updates onto a fresh read, so fields changed since (e.g. Galleries) survive
+def _persist_buffered(ds: StorageClient, art_id: int, updates: dict) -> datastore.Entity | None:
+    with ds.transaction():
+        art = ds.get(ds.key(ART_KIND, art_id))
+        if art is None:
+            return None
+        _apply_updates(art, updates)
+        ds.put(art)
+    cache_refresh(art)
+    get_public_feed().update(art)
+    return art
 
+def _with_pending(art: datastore.Entity | None) -> datastore.Entity | None:
+    if art is not None and _write_buffer is not None:
+        pending = _write_buffer.pending(art.key.id)
+        if pending:
+            art.update(pending)
+    return art
 
+_write_buffer = (
+    WriteBehindBuffer(_persist_buffered, interval=ART_WRITE_BEHIND_INTERVAL, name="art")
+    if ART_WRITE_BEHIND_INTERVAL > 0 else None
+)
+
+def _apply_updates(art: datastore.Entity, updates: dict) -> None:
+    art.update(updates)
+    # A new image replaces the inline A_Image kept by arts written before the blob store
+    if "A_Image_Digest" in updates:
+        art.pop("A_Image", None)
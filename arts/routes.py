@@ -1,6 +1,6 @@
-from flask import Blueprint, request, jsonify
-from google.cloud import datastore
-from datetime import datetime, timezone
+import logging
+
+from flask import Blueprint, Response, request, jsonify
 
 from contracts import (
     require_accept_json,
@@ -8,19 +8,41 @@ from contracts import (
     reject_body,
     require_json_body,
     error_response,
+    ApiContractViolation,
 )
 
-from arts.repo import create_art_entity, get_art as repo_get_art, list_arts, delete_art as repo_delete_art, update_art as repo_update_art
-from arts.serializers import art_to_response, art_mini_response
+from storage import StorageClient
+from arts.repo import create_art_entity, get_art as repo_get_art, list_art_ids, delete_art as repo_delete_art, update_art as repo_update_art
+from arts.repo import buffer_art_update, stop_art_writes
+from arts.serializers import art_to_response, art_mini, feed_item_response, revision_to_response
+from arts.images import image_fields, image_blob, image_version, served_type
+from arts.feed import get_public_feed
+from arts.history import list_revisions, get_revision_content
+from arts.strokes import CanvasSessions, parse_strokes
+from arts.thumbnails import DEFAULT_THUMBNAIL_SIZE, THUMBNAIL_SIZES, get_thumbnail_renderer
+from storage.blobs import get_blob_store
 from users.repo import get_user as repo_get_user
+from users.timeline import schedule_fan_out, stop_fan_out
 from utils.urls import user_self_url 
+from utils.time_utils import iso_utc_now
+from utils.pagination import parse_page_args
+from utils.expand import ART_EXPANDABLE, parse_expand, load_expansions, apply_expansions, expanded_etag
+from utils.etags import entity_etag, is_not_modified, not_modified_response, etag_response, check_if_match
+
+logger = logging.getLogger(__name__)
 
-def iso_utc_now() -> str:
-    # Example: 2026-01-09T05:12:34Z
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+# Versioned image URLs never change content; unversioned ones must be revalidated
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
 
-def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
+def create_arts_blueprint(ds: StorageClient) -> Blueprint:
     bp = Blueprint("arts", __name__)
+    sessions = CanvasSessions(ds)
+
+    @bp.record_once
+    def register_shutdown(state):
+        hooks = state.app.extensions.setdefault("bearsty.on_shutdown", [])
+        hooks += [sessions.stop, stop_art_writes, get_thumbnail_renderer().shutdown, stop_fan_out]
 
     @bp.post("/arts")
     @require_accept_json
@@ -40,11 +62,19 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
         creator = repo_get_user(ds, creator_id)
         if creator is None:
             return error_response(404, "Not Found")
+        if body.get("A_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /arts/<id>/comments.")
+
+        try:
+            image = image_fields(body.get("A_Image", ""))
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
 
         art = create_art_entity(ds, {
-            "A_Image": body.get("A_Image", ""),
+            **image,
             "A_Title": body.get("A_Title", ""),
-            "A_Comments": body.get("A_Comments", []) or [],
+            "A_Comment_Count": 0,
+            "A_Latest_Comments": [],
             "A_Modified_Date": iso_utc_now(),
             "A_Previous": body.get("A_Previous", None),
             "A_Is_Public": body.get("A_Is_Public", False),
@@ -52,6 +82,8 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
             "User": {"U_ID": creator_id, "self": user_self_url(creator_id)},
             "Galleries": [],
         })
+        if art.get("A_Is_Public"):
+            schedule_fan_out(ds, art)
 
         return jsonify(art_to_response(art)), 201
 
@@ -59,23 +91,45 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
     @require_accept_json
     @reject_body
     def get_arts():
-        limit = request.args.get("limit", default=None, type=int)
-        offset = request.args.get("offset", default=0, type=int)
+        try:
+            limit, offset, cursor = parse_page_args()
+            art_ids, next_cursor = list_art_ids(ds, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
 
-        if offset < 0 or (limit is not None and limit < 0):
-            return error_response(400, "Bad Request: limit/offset must be non-negative.")
+        return jsonify({"Arts": [art_mini(a) for a in art_ids], "next_cursor": next_cursor}), 200
 
-        arts = list_arts(ds, limit=limit, offset=offset)
-        return jsonify({"Arts": [art_mini_response(a) for a in arts]}), 200
+    # Public arts, most recently modified first, served from the in-memory feed
+    @bp.get("/feed")
+    @require_accept_json
+    @reject_body
+    def get_feed():
+        try:
+            limit, offset, cursor = parse_page_args()
+            entries, next_cursor = get_public_feed().page(ds, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Arts": [feed_item_response(e) for e in entries], "next_cursor": next_cursor}), 200
 
     @bp.get("/arts/<int:art_id>")
     @require_accept_json
     @reject_body
     def get_art(art_id: int):
+        try:
+            fields = parse_expand(ART_EXPANDABLE)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
         art = repo_get_art(ds, art_id)
         if art is None:
             return error_response(404, "Not Found")
-        return jsonify(art_to_response(art)), 200
+
+        loaded = load_expansions(ds, art, fields) if fields else {}
+        etag = expanded_etag(art, fields, loaded)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        return etag_response(apply_expansions(art_to_response(art), fields, loaded), 200, etag)
     
     @bp.delete("/arts/<int:art_id>")
     @require_accept_json
@@ -88,7 +142,7 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
     @bp.put("/arts/<int:art_id>")
     @require_accept_json
     @require_content_type_json
-    @require_json_body(required_fields=["A_Title", "A_Image", "A_Is_Public", "A_Comments"])
+    @require_json_body(required_fields=["A_Title", "A_Image", "A_Is_Public"])
     def put_art(art_id: int):
         body = request.parsed_json
 
@@ -99,21 +153,31 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
         # Disallow changing ownership / relationships via PUT
         if "User" in body or "Galleries" in body or "A_ID" in body or "self" in body:
             return error_response(400, "Bad Request")
+        if body.get("A_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /arts/<id>/comments.")
 
-        updates = {
-            "A_Title": body["A_Title"],
-            "A_Image": body["A_Image"],
-            "A_Is_Public": body["A_Is_Public"],
-            "A_Comments": body["A_Comments"],
-        }
+        try:
+            updates = {
+                "A_Title": body["A_Title"],
+                **image_fields(body["A_Image"]),
+                "A_Is_Public": body["A_Is_Public"],
+                "A_Modified_Date": iso_utc_now(),
+            }
+            was_public = art.get("A_Is_Public")
+            updated = repo_update_art(ds, art, updates, precondition=check_if_match if request.if_match else None)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+        if updated is None:
+            return error_response(404, "Not Found")
+        if updated.get("A_Is_Public") and not was_public:
+            schedule_fan_out(ds, updated)
 
-        updated = repo_update_art(ds, art, updates)
-        return jsonify(art_to_response(updated)), 200
+        return etag_response(art_to_response(updated), 200, entity_etag(updated))
     
     @bp.patch("/arts/<int:art_id>")
     @require_accept_json
     @require_content_type_json
-    @require_json_body(at_least_one_of=["A_Title", "A_Image", "A_Is_Public", "A_Comments"])
+    @require_json_body(at_least_one_of=["A_Title", "A_Image", "A_Is_Public"])
     def patch_art(art_id: int):
         body = request.parsed_json
 
@@ -124,15 +188,201 @@ def create_arts_blueprint(ds: datastore.Client) -> Blueprint:
         # Disallow patching ownership / relationships
         if "User" in body or "Galleries" in body or "A_ID" in body or "self" in body:
             return error_response(400, "Bad Request")
+        if body.get("A_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /arts/<id>/comments.")
 
-        allowed = ["A_Title", "A_Image", "A_Is_Public", "A_Comments"]
+        allowed = ["A_Title", "A_Is_Public"]
         updates = {k: body[k] for k in allowed if k in body}
+        updates["A_Modified_Date"] = iso_utc_now()
 
-        updated = repo_update_art(ds, art, updates)
-        return jsonify(art_to_response(updated)), 200
+        was_public = art.get("A_Is_Public")
+        try:
+            if "A_Image" in body:
+                updates.update(image_fields(body["A_Image"]))
+            if request.if_match:
+                updated = repo_update_art(ds, art, updates, precondition=check_if_match)
+            else:
+                # Autosaves; coalesced in memory when write-behind is enabled
+                updated = buffer_art_update(ds, art, updates)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+        if updated is None:
+            return error_response(404, "Not Found")
+        if updated.get("A_Is_Public") and not was_public:
+            schedule_fan_out(ds, updated)
 
+        return etag_response(art_to_response(updated), 200, entity_etag(updated))
+
+
+    # Streams the image from the blob store. Supports a single byte range (Range / If-Range)
+    # and conditional requests on the content digest.
+    @bp.get("/arts/<int:art_id>/image")
+    @reject_body
+    def get_art_image(art_id: int):
+        art = repo_get_art(ds, art_id)
+        if art is None:
+            return error_response(404, "Not Found")
+
+        digest, media_type = image_blob(art)
+        blobs = get_blob_store()
+        if digest is None or not blobs.exists(digest):
+            return error_response(404, "Not Found")
+
+        cache_control = REVALIDATE_CACHE_CONTROL
+        version = request.args.get("v")
+        if version is not None and version == image_version(art):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        headers = {"ETag": f'"{digest}"', "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+        if request.if_none_match.contains(digest):
+            return "", 304, headers
+
+        size = blobs.size(digest)
+        start, stop, status = 0, size, 200
+        rng = request.range
+        if_range = request.if_range
+        if rng is not None and (if_range.etag or if_range.date) in (None, digest):
+            bounds = rng.range_for_length(size)
+            if bounds is not None:
+                start, stop = bounds
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+            elif len(rng.ranges) == 1:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status=416, headers=headers)
+            # Multiple ranges are answered with the whole body
+
+        content_type, type_headers = served_type(media_type)
+        resp = Response(blobs.iter_range(digest, start, stop), status=status, content_type=content_type,
+                        headers={**headers, **type_headers}, direct_passthrough=True)
+        resp.content_length = stop - start
+        return resp
+
+    # PNG preview of the art's image, ?size= one of THUMBNAIL_SIZES (default 128). Rendered
+    # when the image is stored; a request that arrives first waits briefly for the render.
+    @bp.get("/arts/<int:art_id>/thumbnail")
+    @reject_body
+    def get_art_thumbnail(art_id: int):
+        size = request.args.get("size", DEFAULT_THUMBNAIL_SIZE, type=int)
+        if size not in THUMBNAIL_SIZES:
+            return error_response(400, f"Bad Request: size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}.")
+
+        art = repo_get_art(ds, art_id)
+        if art is None:
+            return error_response(404, "Not Found")
+        digest, media_type = image_blob(art)
+        if digest is None or not get_blob_store().exists(digest):
+            return error_response(404, "Not Found")
+
+        cache_control = REVALIDATE_CACHE_CONTROL
+        version = request.args.get("v")
+        if version is not None and version == image_version(art):
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        etag = f"{digest}-{size}"
+        headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+        if request.if_none_match.contains(etag):
+            return "", 304, headers
+
+        try:
+            png = get_thumbnail_renderer().get(digest, media_type, size)
+        except TimeoutError:
+            resp, status = error_response(503, "Service Unavailable: thumbnail is being rendered.")
+            resp.headers["Retry-After"] = "1"
+            return resp, status
+        except ApiContractViolation as e:
+            resp, status = error_response(e.status, e.message)
+            if e.status == 503:
+                resp.headers["Retry-After"] = "1"
+            return resp, status
+        if png is None:
+            return error_response(404, "Not Found: no thumbnail for this image type.")
+        return Response(png, status=200, content_type="image/png", headers=headers)
+
+    # Paints a batch of [x, y, colour] pixels into the art's live canvas. Changes are saved on
+    # an interval; "End": true saves immediately and closes the session.
+    @bp.post("/arts/<int:art_id>/strokes")
+    @require_accept_json
+    @require_content_type_json
+    @require_json_body(at_least_one_of=["Strokes", "End"])
+    def post_strokes(art_id: int):
+        body = request.parsed_json
+
+        art = repo_get_art(ds, art_id)
+        if art is None:
+            return error_response(404, "Not Found")
+        owner_id = (art.get("User") or {}).get("U_ID")
+        owner = repo_get_user(ds, owner_id) if owner_id is not None else None
+        if owner is None:
+            return error_response(404, "Not Found")
+
+        try:
+            strokes = parse_strokes(body.get("Strokes", []))
+            result = sessions.apply(art, owner, strokes) if strokes else None
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        flushed = bool(body.get("End")) and sessions.end(art_id)
+        response = {
+            "A_ID": art_id,
+            "Applied": result.applied if result else 0,
+            "Changed": result.changed if result else 0,
+            "Pending": 0 if flushed else (result.pending if result else 0),
+        }
+        if result is not None:
+            response.update({
+                "Pixels_Used": result.pixels_used,
+                "Pixels_Remaining": result.pixel_amount - result.pixels_used,
+            })
+        if flushed:
+            art = repo_get_art(ds, art_id)
+            if art is None:
+                return error_response(404, "Not Found")
+            response["A_Image"] = art_to_response(art)["A_Image"]
+        return jsonify(response), 200
+
+    # Revisions of the art's image, oldest first. A_Previous links to the art this one was
+    # derived from, whose history continues the chain.
+    @bp.get("/arts/<int:art_id>/history")
+    @require_accept_json
+    @reject_body
+    def get_art_history(art_id: int):
+        art = repo_get_art(ds, art_id)
+        if art is None:
+            return error_response(404, "Not Found")
+
+        try:
+            limit, offset, cursor = parse_page_args()
+            revisions, next_cursor = list_revisions(ds, art_id, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({
+            "A_ID": art_id,
+            "A_Revision": art.get("A_Revision", 0),
+            "A_Previous": art.get("A_Previous", None),
+            "Revisions": [revision_to_response(art_id, r) for r in revisions],
+            "next_cursor": next_cursor,
+        }), 200
+
+    # The image as of one revision, rebuilt from the nearest snapshot. Revisions never change.
+    @bp.get("/arts/<int:art_id>/history/<int:number>")
+    @reject_body
+    def get_art_revision(art_id: int, number: int):
+        try:
+            found = get_revision_content(ds, art_id, number)
+        except LookupError:
+            logger.exception("Cannot rebuild revision %d of art %d", number, art_id)
+            return error_response(500, "Internal Server Error")
+        if found is None:
+            return error_response(404, "Not Found")
+
+        content, revision = found
+        etag = revision["R_Digest"] or "empty"
+        headers = {"ETag": f'"{etag}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if request.if_none_match.contains(etag):
+            return "", 304, headers
+        content_type, type_headers = served_type(revision.get("R_Media_Type"))
+        return Response(content, status=200, content_type=content_type, headers={**headers, **type_headers})
 
-    
     @bp.get("/arts/<int:art_id>/galleries")
     @require_accept_json
     @reject_body
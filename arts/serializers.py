@@ -1,16 +1,39 @@
 from google.cloud import datastore
-from flask import request
+
+from arts.images import image_version
+from comments.serializers import comments_summary_response
+from utils.urls import base_url
 
 def art_self_url(art_id: int) -> str:
-    return request.host_url.rstrip("/") + f"/arts/{art_id}"
+    return f"{base_url()}/arts/{art_id}"
+
+# The image itself is served by GET /arts/<id>/image. The URL carries the content version,
+# so clients and proxies can cache it indefinitely; a new image gets a new URL.
+def art_image_url(art: datastore.Entity) -> str:
+    version = image_version(art)
+    if version is not None:
+        return art_self_url(art.key.id) + f"/image?v={version}"
+    if art.get("A_Image"):
+        return art_self_url(art.key.id) + "/image"
+    return ""
+
+# Versioned like the image URL, so a new image also gets new thumbnail URLs
+def art_thumbnail_url(art: datastore.Entity) -> str:
+    version = image_version(art)
+    if version is not None:
+        return art_self_url(art.key.id) + f"/thumbnail?v={version}"
+    if art.get("A_Image"):
+        return art_self_url(art.key.id) + "/thumbnail"
+    return ""
 
 def art_to_response(art: datastore.Entity) -> dict:
     art_id = art.key.id
     return {
         "A_ID": art_id,
-        "A_Image": art.get("A_Image", ""),
+        "A_Image": art_image_url(art),
+        "A_Thumbnail": art_thumbnail_url(art),
         "A_Title": art.get("A_Title", ""),
-        "A_Comments": art.get("A_Comments", []) or [],
+        "A_Comments": comments_summary_response(art_self_url(art_id), art),
         "A_Modified_Date": art.get("A_Modified_Date", ""),
         "A_Previous": art.get("A_Previous", None),
         "A_Is_Public": art.get("A_Is_Public", False),
@@ -19,6 +42,30 @@ def art_to_response(art: datastore.Entity) -> dict:
         "self": art_self_url(art_id),
     }
 
-def art_mini_response(art: datastore.Entity) -> dict:
-    art_id = art.key.id
+# Feed items are built from the feed's in-memory projection (arts.feed.FEED_FIELDS)
+def feed_item_response(entry: datastore.Entity) -> dict:
+    art_id = entry.key.id
+    return {
+        "A_ID": art_id,
+        "A_Title": entry.get("A_Title", ""),
+        "A_Modified_Date": entry.get("A_Modified_Date", ""),
+        "A_Thumbnail": art_thumbnail_url(entry),
+        "User": entry.get("User", None),
+        "self": art_self_url(art_id),
+    }
+
+def art_mini(art_id: int) -> dict:
     return {"A_ID": art_id, "self": art_self_url(art_id)}
+
+def art_mini_response(art: datastore.Entity) -> dict:
+    return art_mini(art.key.id)
+
+def revision_to_response(art_id: int, revision: datastore.Entity) -> dict:
+    number = revision["R_Number"]
+    return {
+        "R_Number": number,
+        "R_Date": revision.get("R_Date", ""),
+        "R_Type": revision.get("R_Type"),
+        "R_Size": revision.get("R_Size", 0),
+        "self": art_self_url(art_id) + f"/history/{number}",
+    }
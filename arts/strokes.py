@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from google.cloud import datastore
+
+from arts.canvas import CANVAS_TYPE, MAX_COLOURS, Canvas, parse_colour
+from arts.repo import get_art, update_art
+from arts.thumbnails import schedule_thumbnails
+from contracts import ApiContractViolation
+from storage import StorageClient
+from storage.blobs import get_blob_store
+from users.repo import spend_pixels
+from utils.time_utils import iso_utc_now
+
+logger = logging.getLogger(__name__)
+
+# Live drawing sessions. POST /arts/<id>/strokes paints pixels into an in-memory canvas that
+# this process keeps per art; the canvas is written back (one blob, one art update, one
+# delta revision) every STROKE_FLUSH_INTERVAL seconds, when the client ends the session, and
+# on shutdown. Sessions live in the worker that served them, so an art's strokes should be
+# routed to one worker; concurrent image writes through PUT/PATCH are last-writer-wins.
+#
+# The owner's Pixel_Amount caps the pixels painted per drawing session (the user's current
+# Today_Time), across all of their arts. Each batch spends its pixels on the stored user
+# before it is painted, so the cap holds across workers.
+
+STROKE_FLUSH_INTERVAL = float(os.getenv("STROKE_FLUSH_INTERVAL", "5"))
+STROKE_SESSION_IDLE = float(os.getenv("STROKE_SESSION_IDLE", "300"))
+CANVAS_WIDTH = int(os.getenv("CANVAS_WIDTH", "64"))
+CANVAS_HEIGHT = int(os.getenv("CANVAS_HEIGHT", "64"))
+MAX_STROKES_PER_BATCH = 1000
+DEFAULT_PIXEL_AMOUNT = 10
+
+
+@dataclass
+class LiveCanvas:
+    art_id: int
+    canvas: Canvas
+    base_digest: str | None  # image the canvas was loaded from or last flushed as
+    pending: int = 0  # strokes applied since the last flush
+    touched: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class StrokeResult:
+    applied: int
+    changed: int
+    pending: int
+    pixels_used: int
+    pixel_amount: int
+
+
+# Validates a batch of [x, y, colour] operations; colour is "#rrggbb" or an int
+def parse_strokes(value) -> list[tuple[int, int, int]]:
+    if not isinstance(value, list):
+        raise ApiContractViolation(400, "Bad Request: Strokes must be a list.")
+    if len(value) > MAX_STROKES_PER_BATCH:
+        raise ApiContractViolation(400, f"Bad Request: at most {MAX_STROKES_PER_BATCH} strokes per request.")
+    strokes = []
+    for s in value:
+        if not (isinstance(s, list) and len(s) == 3 and type(s[0]) is int and type(s[1]) is int):
+            raise ApiContractViolation(400, "Bad Request: each stroke must be [x, y, colour].")
+        try:
+            strokes.append((s[0], s[1], parse_colour(s[2])))
+        except ValueError:
+            raise ApiContractViolation(400, "Bad Request: invalid stroke colour.")
+    return strokes
+
+
+class CanvasSessions:
+    def __init__(self, ds: StorageClient, *, flush_interval: float = STROKE_FLUSH_INTERVAL,
+                 idle_timeout: float = STROKE_SESSION_IDLE):
+        self._ds = ds
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self._live = {}  # art id -> LiveCanvas
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self._stop = threading.Event()
+
+    def apply(self, art: datastore.Entity, owner: datastore.Entity, strokes: list[tuple[int, int, int]]) -> StrokeResult:
+        live = self._open(art)
+
+        with live.lock:
+            canvas = live.canvas
+            for x, y, _ in strokes:
+                if not (0 <= x < canvas.width and 0 <= y < canvas.height):
+                    raise ApiContractViolation(400, f"Bad Request: pixel ({x}, {y}) is outside the {canvas.width}x{canvas.height} canvas.")
+            if len(canvas.palette) + len({rgb for _, _, rgb in strokes} - set(canvas.palette)) > MAX_COLOURS:
+                raise ApiContractViolation(409, f"Conflict: a canvas holds at most {MAX_COLOURS} colours.")
+
+            spent = spend_pixels(self._ds, owner.key.id, len(strokes), DEFAULT_PIXEL_AMOUNT)
+            if spent is None:
+                raise ApiContractViolation(404, "Not Found")
+            used, amount, ok = spent
+            if not ok:
+                raise ApiContractViolation(403, f"Forbidden: pixel budget exceeded ({amount - used} of {amount} left).")
+
+            changed = sum(canvas.paint(x, y, rgb) for x, y, rgb in strokes)
+            live.pending += len(strokes)
+            live.touched = time.monotonic()
+            pending = live.pending
+
+        self._ensure_flusher()
+        return StrokeResult(applied=len(strokes), changed=changed, pending=pending, pixels_used=used, pixel_amount=amount)
+
+    # Flushes and closes the art's session; returns False if there was none
+    def end(self, art_id: int) -> bool:
+        with self._lock:
+            live = self._live.pop(art_id, None)
+        if live is None:
+            return False
+        self._flush(live)
+        return True
+
+    def flush_all(self) -> None:
+        with self._lock:
+            sessions = list(self._live.values())
+        for live in sessions:
+            try:
+                self._flush(live)
+            except Exception:
+                logger.exception("Flushing canvas of art %d failed", live.art_id)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush_all()
+
+    # The live canvas for an art, loaded from its current image. A session with no pending
+    # strokes is reloaded if the image was replaced by another writer in the meantime.
+    def _open(self, art: datastore.Entity) -> LiveCanvas:
+        art_id = art.key.id
+        digest = art.get("A_Image_Digest")
+        with self._lock:
+            live = self._live.get(art_id)
+            if live is not None and (live.pending or live.base_digest == digest):
+                return live
+
+        if digest is None and not art.get("A_Image"):
+            canvas = Canvas.blank(CANVAS_WIDTH, CANVAS_HEIGHT)
+        elif art.get("A_Image_Type") == CANVAS_TYPE:
+            data = get_blob_store().get(digest)
+            if data is None:
+                raise ApiContractViolation(409, "Conflict: art image is unavailable.")
+            canvas = Canvas.decode(data)
+        else:
+            raise ApiContractViolation(409, "Conflict: art image is not a canvas.")
+
+        with self._lock:
+            live = self._live.get(art_id)
+            if live is None or (not live.pending and live.base_digest != digest):
+                live = self._live[art_id] = LiveCanvas(art_id, canvas, digest)
+            return live
+
+    def _flush(self, live: LiveCanvas) -> bool:
+        with live.lock:
+            if not live.pending:
+                return False
+            data = live.canvas.encode()
+            pending = live.pending
+            live.pending = 0
+        try:
+            digest = get_blob_store().put(data)
+            art = get_art(self._ds, live.art_id)
+            updated = None
+            if art is not None:
+                updated = update_art(self._ds, art, {
+                    "A_Image_Digest": digest,
+                    "A_Image_Type": CANVAS_TYPE,
+                    "A_Modified_Date": iso_utc_now(),
+                })
+            if updated is None:
+                # The art was deleted; its session goes with it
+                with self._lock:
+                    self._live.pop(live.art_id, None)
+                return False
+            with live.lock:
+                live.base_digest = digest
+            schedule_thumbnails(digest, CANVAS_TYPE)
+        except BaseException:
+            with live.lock:
+                live.pending += pending
+            raise
+        return True
+
+    # Background flusher, started on first use in each process (never in a pre-fork master)
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == os.getpid():
+                return
+            self._flusher = threading.Thread(target=self._run, name="canvas-flusher", daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush_all()
+            idle_before = time.monotonic() - self.idle_timeout
+            with self._lock:
+                for art_id, live in list(self._live.items()):
+                    if not live.pending and live.touched < idle_before:
+                        del self._live[art_id]
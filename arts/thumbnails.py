@@ -0,0 +1,276 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from arts.canvas import CANVAS_TYPE, Canvas
+from arts.png import decode_png, encode_png, is_png
+from contracts import ApiContractViolation
+from storage.blobs import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+# PNG thumbnails of art images. Rendering runs in a process pool, so a large decode never
+# holds up a request thread or the GIL. Results are cached on disk by image digest and
+# size; an image that cannot be rendered (not a canvas or 8-bit PNG) leaves a marker so it
+# is not retried.
+#
+#   THUMBNAIL_WORKERS  render processes per server process (default 1, as gunicorn already
+#                      runs one server process per core; 0 renders on demand in the request
+#                      instead of when an image is stored)
+#   THUMBNAIL_WAIT     seconds a request waits for a render before answering 503
+
+THUMBNAIL_SIZES = (64, 128, 256)
+DEFAULT_THUMBNAIL_SIZE = 128
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "1"))
+THUMBNAIL_WAIT = float(os.getenv("THUMBNAIL_WAIT", "2"))
+
+_UNSUPPORTED = b""
+
+
+# -------------------------
+# Rendering (runs in worker processes)
+# -------------------------
+
+def _to_rgb(data: bytes, media_type: str) -> tuple[int, int, bytes] | None:
+    try:
+        if media_type == CANVAS_TYPE:
+            canvas = Canvas.decode(data)
+            return canvas.width, canvas.height, canvas.to_rgb()
+        if is_png(data):
+            return decode_png(data)
+    except (ValueError, IndexError, EOFError, struct.error, zlib.error):
+        return None
+    return None
+
+
+# Fits the image in a size x size box. Downscaling averages each source box; upscaling
+# (small pixel canvases) repeats pixels so they stay crisp.
+def scale(width: int, height: int, rgb: bytes, size: int) -> tuple[int, int, bytes]:
+    factor = size / max(width, height)
+    out_w = max(1, round(width * factor))
+    out_h = max(1, round(height * factor))
+    out = bytearray(out_w * out_h * 3)
+    o = 0
+    for ty in range(out_h):
+        y0 = ty * height // out_h
+        y1 = max(y0 + 1, (ty + 1) * height // out_h)
+        for tx in range(out_w):
+            x0 = tx * width // out_w
+            x1 = max(x0 + 1, (tx + 1) * width // out_w)
+            if factor >= 1:
+                p = (y0 * width + x0) * 3
+                out[o:o + 3] = rgb[p:p + 3]
+            else:
+                r = g = b = 0
+                for y in range(y0, y1):
+                    row = y * width
+                    for x in range(x0, x1):
+                        p = (row + x) * 3
+                        r += rgb[p]
+                        g += rgb[p + 1]
+                        b += rgb[p + 2]
+                n = (y1 - y0) * (x1 - x0)
+                out[o] = r // n
+                out[o + 1] = g // n
+                out[o + 2] = b // n
+            o += 3
+    return out_w, out_h, bytes(out)
+
+
+# Worker entry point: reads the blob itself so the image isn't pickled across processes.
+# Returns {size: png bytes, or b"" if the image cannot be rendered}.
+def render_blob(path: str, media_type: str, sizes: tuple[int, ...] = THUMBNAIL_SIZES) -> dict[int, bytes]:
+    with open(path, "rb") as f:
+        decoded = _to_rgb(f.read(), media_type)
+    if decoded is None:
+        return {size: _UNSUPPORTED for size in sizes}
+    return {size: encode_png(*scale(*decoded, size)) for size in sizes}
+
+
+# -------------------------
+# Cache + pool
+# -------------------------
+
+class ThumbnailCache:
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+
+    def path(self, digest: str, size: int) -> Path:
+        return self.root / str(size) / digest[:2] / f"{digest}.png"
+
+    # PNG bytes, b"" if the image cannot be rendered, or None if not rendered yet
+    def get(self, digest: str, size: int) -> bytes | None:
+        try:
+            return self.path(digest, size).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def has_all(self, digest: str, sizes=THUMBNAIL_SIZES) -> bool:
+        return all(self.path(digest, s).is_file() for s in sizes)
+
+    def put(self, digest: str, size: int, png: bytes) -> None:
+        path = self.path(digest, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp, path)
+
+
+class ThumbnailRenderer:
+    def __init__(self, cache: ThumbnailCache, *, workers: int = THUMBNAIL_WORKERS):
+        self.cache = cache
+        self.workers = workers
+        self._pool = None
+        self._pool_pid = None
+        self._inflight = {}  # digest -> Future
+        self._lock = threading.Lock()
+
+    # Spawned, not forked: server processes run threads (and gRPC) that must not be forked
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    # Starts rendering every size of an image unless cached or already running. Returns the
+    # render's future, or None when there is nothing to do.
+    def schedule(self, digest: str, media_type: str) -> Future | None:
+        if self.cache.has_all(digest):
+            return None
+        with self._lock:
+            future = self._inflight.get(digest)
+            if future is not None:
+                return future
+            path = str(get_blob_store().path(digest))
+            if self.workers > 0:
+                future = self._executor().submit(render_blob, path, media_type)
+            else:
+                future = Future()
+                try:
+                    future.set_result(render_blob(path, media_type))
+                except Exception as e:
+                    future.set_exception(e)
+            self._inflight[digest] = future
+        future.add_done_callback(lambda f: self._store(digest, f))
+        return future
+
+    def _store(self, digest: str, future: Future) -> None:
+        try:
+            for size, png in future.result().items():
+                self.cache.put(digest, size, png)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next render starts a fresh pool
+            logger.error("Thumbnail pool broke while rendering %s", digest)
+            with self._lock:
+                self._pool = None
+        except Exception:
+            logger.exception("Rendering thumbnails of %s failed", digest)
+        finally:
+            with self._lock:
+                self._inflight.pop(digest, None)
+
+    # PNG bytes, or None if the image cannot be rendered. Raises TimeoutError if the render
+    # is still running after `wait` seconds, and ApiContractViolation if it failed: 503 when
+    # the pool broke (the next render starts a fresh one), 422 when the image itself did.
+    def get(self, digest: str, media_type: str, size: int, *, wait: float = THUMBNAIL_WAIT) -> bytes | None:
+        png = self.cache.get(digest, size)
+        if png is None:
+            future = self.schedule(digest, media_type)
+            if future is not None:
+                try:
+                    future.result(timeout=wait)
+                except TimeoutError:
+                    raise
+                except BrokenProcessPool as e:
+                    raise ApiContractViolation(503, "Service Unavailable: thumbnail renderer restarted.") from e
+                except Exception as e:
+                    raise ApiContractViolation(422, "Unprocessable Entity: the image could not be rendered.") from e
+                self._store(digest, future)
+            png = self.cache.get(digest, size)
+            if png is None:
+                raise TimeoutError(f"thumbnail of {digest} is not ready")
+        return png or None
+
+    def shutdown(self) -> None:
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_thumbnail_renderer() -> ThumbnailRenderer:
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = ThumbnailRenderer(ThumbnailCache(get_blob_store().root / "thumbnails"))
+    return _renderer
+
+
+def schedule_thumbnails(digest: str | None, media_type: str | None) -> None:
+    renderer = get_thumbnail_renderer()
+    if digest and renderer.workers > 0:
+        renderer.schedule(digest, media_type)
+
+
+# -------------------------
+# Backfill: python -m arts.thumbnails
+# -------------------------
+
+def backfill(ds, *, workers: int, page_size: int = 500) -> tuple[int, int]:
+    from arts.repo import list_arts
+
+    cache = get_thumbnail_renderer().cache
+    blobs = get_blob_store()
+    todo = {}
+    cursor = None
+    while True:
+        arts, cursor = list_arts(ds, limit=page_size, cursor=cursor)
+        for art in arts:
+            digest = art.get("A_Image_Digest")
+            if digest and digest not in todo and blobs.exists(digest) and not cache.has_all(digest):
+                todo[digest] = art.get("A_Image_Type") or ""
+        if cursor is None:
+            break
+
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        digests = list(todo)
+        paths = [str(blobs.path(d)) for d in digests]
+        for digest, result in zip(digests, pool.map(render_blob, paths, todo.values(), chunksize=8)):
+            for size, png in result.items():
+                cache.put(digest, size, png)
+            rendered += 1
+    return len(todo), rendered
+
+
+def main(argv=None) -> int:
+    from config import init_storage_client
+
+    p = argparse.ArgumentParser(prog="python -m arts.thumbnails", description="Render missing thumbnails for all arts.")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes")
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    started = time.monotonic()
+    found, rendered = backfill(init_storage_client(), workers=max(1, args.workers))
+    logger.info("Rendered thumbnails for %d of %d images in %.1fs", rendered, found, time.monotonic() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
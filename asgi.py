@@ -0,0 +1,119 @@
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import Flask, Response
+from werkzeug.exceptions import HTTPException
+
+from app import create_app, shutdown
+
+# ASGI entry point, e.g. `uvicorn asgi:app --port 8080`. One event loop accepts requests for
+# every blueprint and hands each to one of two paths:
+#   async views (the friend endpoints) run on the loop itself. Their storage calls are async
+#             repo twins on the shared storage I/O pool (utils.aio), so independent ones are
+#             awaited together and a waiting request holds no thread.
+#   sync views run on a pool of WSGI_THREADS threads. asgiref's WsgiToAsgi on its own runs
+#             every request on one thread, one at a time.
+# Both go through Flask's own request handling (before/after_request hooks, error handlers),
+# so responses are the same as under gunicorn.
+#
+#   WSGI_THREADS  sync views served at once
+
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "32"))
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+# WsgiToAsgi's run_wsgi_app, on the pool instead of asgiref's single thread-sensitive thread
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        await SyncToAsync(self._run_wsgi_app, thread_sensitive=False, executor=_wsgi_executor)(body)
+
+    def _run_wsgi_app(self, body):
+        _run_wsgi_app(self, body)
+
+
+# The plain function under asgiref's @sync_to_async
+_run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+
+class _AsyncViewInstance(WsgiToAsgiInstance):
+    def __init__(self, flask_app: Flask):
+        super().__init__(flask_app.wsgi_app)
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await super().__call__(scope, receive, send)
+
+    # Called with the request body read; runs the view on the loop instead of in a thread
+    async def run_wsgi_app(self, body):
+        response = await dispatch_async(self.flask_app, self.build_environ(self.scope, body))
+        await send_response(self.send, response)
+
+
+# Flask's full_dispatch_request with the view awaited rather than run to completion in a
+# private event loop
+async def dispatch_async(flask_app: Flask, environ: dict) -> Response:
+    with flask_app.request_context(environ) as ctx:
+        try:
+            if ctx.request.routing_exception is not None:
+                flask_app.raise_routing_exception(ctx.request)
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                view = flask_app.view_functions[ctx.request.url_rule.endpoint]
+                rv = await view(**ctx.request.view_args)
+        except Exception as e:
+            try:
+                rv = flask_app.handle_user_exception(e)
+            except Exception as unhandled:
+                rv = flask_app.handle_exception(unhandled)
+        return flask_app.finalize_request(rv)
+
+
+async def send_response(send, response: Response) -> None:
+    headers = [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    try:
+        for chunk in response.iter_encoded():
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        response.close()
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class AsgiApp:
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self._urls = flask_app.url_map.bind("localhost")
+
+    def _is_async(self, scope) -> bool:
+        try:
+            endpoint, _ = self._urls.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return False  # 404/405/redirects are Flask's to answer
+        return inspect.iscoroutinefunction(self.flask_app.view_functions.get(endpoint))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif self._is_async(scope):
+            await _AsyncViewInstance(self.flask_app)(scope, receive, send)
+        else:
+            await _PooledWsgiInstance(self.flask_app.wsgi_app)(scope, receive, send)
+
+    # Buffered writes are flushed when the server stops, as gunicorn's worker_exit does
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                shutdown(self.flask_app)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = AsgiApp(create_app())
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.runner import HttpTransport, Recorder, TestClientTransport, run_benchmark
+from bench.scenarios import parse_http_file
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse_args(argv):
+    p = argparse.ArgumentParser(prog="python -m bench", description="Replay api-tests.http scenarios under load.")
+    p.add_argument("--file", default=str(ROOT / "api-tests.http"), help="REST Client scenario file")
+    p.add_argument("--concurrency", type=int, default=8, help="concurrent virtual users")
+    p.add_argument("--iterations", type=int, default=10, help="scenario replays per virtual user")
+    p.add_argument("--backend", default="memory", help="STORAGE_BACKEND for in-process runs (memory, sqlite, datastore)")
+    p.add_argument("--url", default=None, help="benchmark a running server instead of an in-process app")
+    p.add_argument("--out", default=None, help="write machine-readable results to this JSON file")
+    p.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    return p.parse_args(argv)
+
+
+def _print_summary(summary: dict, baseline: dict | None) -> None:
+    def delta(key, name=None):
+        if baseline is None:
+            return ""
+        old = (baseline["endpoints"].get(name, {}) if name else baseline).get(key)
+        if not old:
+            return ""
+        new = (summary["endpoints"][name] if name else summary)[key]
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    print(f"{summary['requests']} requests, {summary['errors']} errors in {summary['elapsed_s']:.2f}s "
+          f"= {summary['requests_per_s']:.0f} req/s{delta('requests_per_s')}")
+    print(f"p50 {summary['p50_ms']:.2f}ms  p95 {summary['p95_ms']:.2f}ms{delta('p95_ms')}  p99 {summary['p99_ms']:.2f}ms")
+    print()
+    print(f"{'endpoint':<55} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8}  rpcs/req")
+    for name, e in summary["endpoints"].items():
+        rpcs = " ".join(f"{k}={v:.1f}" for k, v in e["rpcs_per_request"].items())
+        print(f"{name:<55} {e['requests']:>6} {e['p50_ms']:>8.2f} {e['p95_ms']:>8.2f} "
+              f"{e['p99_ms']:>8.2f}  {rpcs}{delta('p95_ms', name)}")
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    scenario = parse_http_file(args.file)
+    recorder = Recorder()
+
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        os.environ["STORAGE_BACKEND"] = args.backend
+        from app import create_app
+        from config import init_storage_client
+        from storage.instrumented import InstrumentedClient
+
+        ds = InstrumentedClient(init_storage_client(), recorder.rpc)
+        transport = TestClientTransport(create_app(ds))
+
+    summary = run_benchmark(scenario, transport, recorder, concurrency=args.concurrency, iterations=args.iterations)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["summary"]
+    _print_summary(summary, baseline)
+
+    if args.out:
+        result = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "config": {
+                "file": args.file,
+                "concurrency": args.concurrency,
+                "iterations": args.iterations,
+                "target": args.url or f"in-process ({args.backend})",
+                "python": platform.python_version(),
+            },
+            "summary": summary,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
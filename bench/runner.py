@@ -0,0 +1,173 @@
+import json
+import math
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from flask import has_request_context, request
+
+from bench.scenarios import Scenario, render
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0  # 5xx responses or transport failures
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    rpcs: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    rpc_seconds: float = 0.0
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest rank
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointStats)
+
+    def request(self, endpoint: str, status: int, seconds: float) -> None:
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats.latencies.append(seconds)
+            stats.statuses[status] += 1
+            if status == 0 or status >= 500:
+                stats.errors += 1
+
+    # InstrumentedClient callback; RPCs are attributed to the Flask rule being served
+    def rpc(self, rpc: str, seconds: float) -> None:
+        if not has_request_context() or request.url_rule is None:
+            return
+        endpoint = f"{request.method} {request.url_rule.rule}"
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats.rpcs[rpc] += 1
+            stats.rpc_seconds += seconds
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        total = 0
+        errors = 0
+        all_latencies = []
+        for name, stats in sorted(self.endpoints.items()):
+            lat = sorted(stats.latencies)
+            n = len(lat)
+            total += n
+            errors += stats.errors
+            all_latencies.extend(lat)
+            endpoints[name] = {
+                "requests": n,
+                "errors": stats.errors,
+                "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+                "p50_ms": percentile(lat, 50) * 1000,
+                "p95_ms": percentile(lat, 95) * 1000,
+                "p99_ms": percentile(lat, 99) * 1000,
+                "mean_ms": (sum(lat) / n * 1000) if n else 0.0,
+                "rpcs_per_request": {k: v / n for k, v in sorted(stats.rpcs.items())} if n else {},
+                "rpc_ms_per_request": (stats.rpc_seconds / n * 1000) if n else 0.0,
+            }
+        all_latencies.sort()
+        return {
+            "requests": total,
+            "errors": errors,
+            "elapsed_s": elapsed,
+            "requests_per_s": total / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(all_latencies, 50) * 1000,
+            "p95_ms": percentile(all_latencies, 95) * 1000,
+            "p99_ms": percentile(all_latencies, 99) * 1000,
+            "endpoints": endpoints,
+        }
+
+
+# -------------------------
+# Transports
+# -------------------------
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+        self._adapter = app.url_map.bind("localhost")
+
+    def endpoint(self, method: str, path: str) -> str:
+        try:
+            rule, _ = self._adapter.match(path, method=method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except Exception:
+            return f"{method} {_normalise(path)}"
+
+    def send(self, method: str, path: str, headers: dict, body: bytes) -> tuple[int, bytes]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, headers=headers, data=body)
+        return resp.status_code, resp.get_data()
+
+
+class HttpTransport:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def endpoint(self, method: str, path: str) -> str:
+        return f"{method} {_normalise(path)}"
+
+    def send(self, method: str, path: str, headers: dict, body: bytes) -> tuple[int, bytes]:
+        req = urllib.request.Request(self.base_url + path, data=body or None, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except OSError:
+            return 0, b""
+
+
+def _normalise(path: str) -> str:
+    return re.sub(r"/\d+(?=/|$)", "/<id>", path.split("?", 1)[0])
+
+
+# -------------------------
+# Replay
+# -------------------------
+
+def _replay_once(scenario: Scenario, transport, recorder: Recorder) -> None:
+    responses = {}
+    for req in scenario.requests:
+        url = render(req.url, scenario.variables, responses)
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        headers = {k: render(v, scenario.variables, responses) for k, v in req.headers.items()}
+        body = render(req.body, scenario.variables, responses).encode("utf-8")
+
+        started = time.perf_counter()
+        status, data = transport.send(req.method, path, headers, body)
+        recorder.request(transport.endpoint(req.method, parts.path), status, time.perf_counter() - started)
+
+        if req.name:
+            try:
+                responses[req.name] = json.loads(data) if data else None
+            except ValueError:
+                responses[req.name] = None
+
+
+def run_benchmark(scenario: Scenario, transport, recorder: Recorder, *, concurrency: int, iterations: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(_replay_once, scenario, transport, recorder)
+            for _ in range(concurrency * iterations)
+        ]
+        for f in futures:
+            f.result()
+    return recorder.summary(time.perf_counter() - started)
@@ -0,0 +1,100 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+# Parser for the REST Client (.http) format used by api-tests.http:
+#   @var = value                 file-level variable
+#   ###                          request separator
+#   # @name createUser1          names the next request so later ones can reference it
+#   {{createUser1.response.body.U_ID}}
+#                                value taken from a named request's JSON response
+
+_VAR_RE = re.compile(r"^@(\w+)\s*=\s*(.*)$")
+_NAME_RE = re.compile(r"^(?:#|//)\s*@name\s+(\w+)")
+_REF_RE = re.compile(r"\{\{\s*([^}]+?)\s*\}\}")
+_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+
+@dataclass
+class HttpRequest:
+    method: str
+    url: str
+    headers: dict[str, str] = field(default_factory=dict)
+    body: str = ""
+    name: str | None = None
+
+
+@dataclass
+class Scenario:
+    variables: dict[str, str]
+    requests: list[HttpRequest]
+
+
+def parse_http_file(path: str) -> Scenario:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    variables = {}
+    requests = []
+    for block in re.split(r"^###.*$", text, flags=re.MULTILINE):
+        req = _parse_block(block.splitlines(), variables)
+        if req is not None:
+            requests.append(req)
+    return Scenario(variables=variables, requests=requests)
+
+
+def _parse_block(lines: list[str], variables: dict[str, str]) -> HttpRequest | None:
+    name = None
+    req = None
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        if not line:
+            continue
+        m = _VAR_RE.match(line)
+        if m:
+            variables[m.group(1)] = m.group(2).strip()
+            continue
+        m = _NAME_RE.match(line)
+        if m:
+            name = m.group(1)
+            continue
+        if line.startswith("#") or line.startswith("//"):
+            continue
+        parts = line.split()
+        if parts[0].upper() in _METHODS and len(parts) >= 2:
+            req = HttpRequest(method=parts[0].upper(), url=parts[1], name=name)
+            break
+        return None
+
+    if req is None:
+        return None
+
+    # Headers run up to the first blank line; everything after is the body
+    while i < len(lines) and lines[i].strip():
+        key, _, value = lines[i].partition(":")
+        req.headers[key.strip()] = value.strip()
+        i += 1
+    body_lines = [l for l in lines[i:] if not l.lstrip().startswith("#")]
+    req.body = "\n".join(body_lines).strip()
+    return req
+
+
+# Substitutes {{var}} and {{name.response.body.path}} using variables and earlier responses
+def render(template: str, variables: dict[str, str], responses: dict[str, object]) -> str:
+    def replace(m):
+        ref = m.group(1)
+        if ref in variables:
+            return render(variables[ref], variables, responses)
+        parts = ref.split(".")
+        if len(parts) >= 3 and parts[1] == "response" and parts[2] == "body":
+            value = responses.get(parts[0])
+            for p in parts[3:]:
+                value = value.get(p) if isinstance(value, dict) else None
+            if value is None:
+                return ""
+            return value if isinstance(value, str) else json.dumps(value)
+        return m.group(0)
+
+    return _REF_RE.sub(replace, template)
@@ -0,0 +1,141 @@
+import json
+
+from google.cloud import datastore
+
+from storage import StorageClient
+from utils.cache import cache_refresh
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from utils.time_utils import iso_utc_now
+
+# Comments on arts and galleries. Each is a Comment child entity of its parent (key
+# Art/<id>/Comment/<id> or Gallery/<id>/Comment/<id>), written once and never rewritten. Ids
+# come from allocate_ids rather than the parent's count, so a parent written back from a
+# stale copy can never hand out the id of a comment that already exists. The parent only
+# carries a count and a preview of the latest few:
+#   A_Comment_Count   / G_Comment_Count     comments so far
+#   A_Latest_Comments / G_Latest_Comments   the COMMENT_PREVIEW newest, oldest first
+# so reading a parent and adding a comment cost the same however long the thread gets.
+# Parents written before this kept every comment inline (A_Comments / G_Comments); the first
+# time one's comments are added to or listed, those move into Comment entities numbered
+# 1..n in their old order.
+
+COMMENT_KIND = "Comment"
+COMMENT_PREVIEW = 3
+MAX_COMMENT_LENGTH = 2000
+
+_PREFIXES = {"Art": "A", "Gallery": "G"}
+
+# Comments are written and deleted in batches of this many, under the commit size limit
+_BATCH = 400
+# Fresh ids to try before giving up; one only collides with a migrated legacy comment
+_ID_ATTEMPTS = 3
+
+
+def comment_props(kind: str) -> tuple[str, str, str]:
+    prefix = _PREFIXES[kind]
+    return f"{prefix}_Comment_Count", f"{prefix}_Latest_Comments", f"{prefix}_Comments"
+
+
+def comment_key(ds: StorageClient, parent_key: datastore.Key, comment_id: int) -> datastore.Key:
+    return ds.key(*parent_key.flat_path, COMMENT_KIND, comment_id)
+
+
+# Comment count and latest comments of a parent, with the inline list of legacy parents
+def comment_summary(parent: datastore.Entity) -> tuple[int, list]:
+    count_prop, latest_prop, legacy_prop = comment_props(parent.key.kind)
+    if count_prop in parent:
+        return parent[count_prop], list(parent.get(latest_prop) or [])
+    legacy = parent.get(legacy_prop) or []
+    return len(legacy), [_legacy_comment(i + 1, c) for i, c in enumerate(legacy)][-COMMENT_PREVIEW:]
+
+
+# Appends a comment; returns it with the updated parent, or None if the parent is gone
+def add_comment(
+    ds: StorageClient, parent: datastore.Entity, text: str, user: dict | None
+) -> tuple[datastore.Entity, datastore.Entity] | None:
+    count_prop, latest_prop, _ = comment_props(parent.key.kind)
+    if migrate_legacy_comments(ds, parent) is None:
+        return None
+
+    for _ in range(_ID_ATTEMPTS):
+        key = ds.allocate_ids(ds.key(*parent.key.flat_path, COMMENT_KIND), 1)[0]
+        with ds.transaction():
+            found = {e.key.kind: e for e in ds.get_multi([parent.key, key])}
+            parent = found.get(parent.key.kind)
+            if parent is None:
+                return None
+            if COMMENT_KIND in found:
+                continue
+            comment = datastore.Entity(key=key, exclude_from_indexes=("C_Text",))
+            comment.update({"C_ID": key.id, "C_Text": text, "C_Date": iso_utc_now(), "User": user})
+            parent[count_prop] = parent.get(count_prop, 0) + 1
+            parent[latest_prop] = [*(parent.get(latest_prop) or []), dict(comment)][-COMMENT_PREVIEW:]
+            parent.exclude_from_indexes = set(parent.exclude_from_indexes) | {latest_prop}
+            ds.put_multi([parent, comment])
+        cache_refresh(parent)
+        return comment, parent
+    raise RuntimeError(f"No free comment id under {parent.key.flat_path}")
+
+
+# Moves a legacy parent's inline comments into Comment entities. Returns the parent as stored
+# afterwards (unchanged if there was nothing to move), or None if it is gone.
+def migrate_legacy_comments(ds: StorageClient, parent: datastore.Entity) -> datastore.Entity | None:
+    count_prop, latest_prop, legacy_prop = comment_props(parent.key.kind)
+    if count_prop in parent:
+        return parent
+    _write_legacy(ds, parent.key, parent.get(legacy_prop) or [])
+    with ds.transaction():
+        parent = ds.get(parent.key)
+        if parent is None or count_prop in parent:
+            return parent
+        count, latest = comment_summary(parent)
+        parent.pop(legacy_prop, None)
+        parent.update({count_prop: count, latest_prop: latest})
+        parent.exclude_from_indexes = set(parent.exclude_from_indexes) | {latest_prop}
+        ds.put(parent)
+    cache_refresh(parent)
+    return parent
+
+
+# Oldest first (ancestor + C_Date index in index.yaml). Migrated legacy comments have no
+# date, so they sort first, in key (= their old) order.
+def list_comments(
+    ds: StorageClient, parent_key: datastore.Key, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+    cursor: str | None = None,
+) -> tuple[list[datastore.Entity], str | None]:
+    query = ds.query(kind=COMMENT_KIND, ancestor=parent_key)
+    query.order = ["C_Date"]
+    return fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+
+
+def get_comment(ds: StorageClient, parent_key: datastore.Key, comment_id: int) -> datastore.Entity | None:
+    return ds.get(comment_key(ds, parent_key, comment_id))
+
+
+def list_comment_keys(ds: StorageClient, parent_key: datastore.Key) -> list[datastore.Key]:
+    query = ds.query(kind=COMMENT_KIND, ancestor=parent_key)
+    query.keys_only()
+    return [e.key for e in query.fetch()]
+
+
+# Called when the parent is deleted; in batches, as a long thread exceeds one commit
+def delete_comments(ds: StorageClient, parent_key: datastore.Key) -> None:
+    keys = list_comment_keys(ds, parent_key)
+    for start in range(0, len(keys), _BATCH):
+        ds.delete_multi(keys[start:start + _BATCH])
+
+
+def _legacy_comment(number: int, value) -> dict:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return {"C_ID": number, "C_Text": text, "C_Date": "", "User": None}
+
+
+# Numbered keys make this idempotent: a retry after a partial failure rewrites the same entities
+def _write_legacy(ds: StorageClient, parent_key: datastore.Key, legacy: list) -> None:
+    for start in range(0, len(legacy), _BATCH):
+        entities = []
+        for i, value in enumerate(legacy[start:start + _BATCH], start=start + 1):
+            comment = datastore.Entity(key=comment_key(ds, parent_key, i), exclude_from_indexes=("C_Text",))
+            comment.update(_legacy_comment(i, value))
+            entities.append(comment)
+        ds.put_multi(entities)
@@ -0,0 +1,97 @@
+from flask import Blueprint, request, jsonify
+
+from contracts import (
+    require_accept_json,
+    require_content_type_json,
+    reject_body,
+    require_json_body,
+    error_response,
+    ApiContractViolation,
+)
+
+from storage import StorageClient
+from arts.repo import ART_KIND, get_art
+from arts.serializers import art_self_url
+from comments.repo import MAX_COMMENT_LENGTH, add_comment, comment_summary, get_comment, list_comments, migrate_legacy_comments
+from comments.serializers import comment_to_response
+from galleries.repo import GALLERY_KIND, get_gallery
+from galleries.serializers import gallery_self_url
+from users.repo import get_user
+from utils.pagination import parse_page_args
+from utils.urls import user_self_url
+
+# POST / GET /arts/<id>/comments and /galleries/<id>/comments, plus a single comment at
+# .../comments/<n>. Comments are append-only; the parent response carries a count and the
+# latest few.
+def create_comments_blueprint(ds: StorageClient) -> Blueprint:
+    bp = Blueprint("comments", __name__)
+
+    parents = [
+        ("arts", ART_KIND, get_art, art_self_url),
+        ("galleries", GALLERY_KIND, get_gallery, gallery_self_url),
+    ]
+    for collection, kind, get_parent, self_url in parents:
+        _add_routes(bp, ds, collection, kind, get_parent, self_url)
+
+    return bp
+
+def _add_routes(bp: Blueprint, ds: StorageClient, collection: str, kind: str, get_parent, self_url) -> None:
+    @bp.post(f"/{collection}/<int:parent_id>/comments", endpoint=f"add_{collection}_comment")
+    @require_accept_json
+    @require_content_type_json
+    @require_json_body(required_fields=["C_Text"])
+    def add(parent_id: int):
+        body = request.parsed_json
+
+        text = body["C_Text"]
+        if not isinstance(text, str) or not text.strip() or len(text) > MAX_COMMENT_LENGTH:
+            return error_response(400, f"Bad Request: C_Text must be 1 to {MAX_COMMENT_LENGTH} characters.")
+
+        user = None
+        if body.get("User") is not None:
+            user_obj = body["User"]
+            if not isinstance(user_obj, dict) or not isinstance(user_obj.get("U_ID"), int):
+                return error_response(400, "Bad Request: invalid User.U_ID.")
+            if get_user(ds, user_obj["U_ID"]) is None:
+                return error_response(404, "Not Found")
+            user = {"U_ID": user_obj["U_ID"], "self": user_self_url(user_obj["U_ID"])}
+
+        parent = get_parent(ds, parent_id)
+        added = add_comment(ds, parent, text, user) if parent is not None else None
+        if added is None:
+            return error_response(404, "Not Found")
+
+        comment, _ = added
+        return jsonify(comment_to_response(self_url(parent_id), comment)), 201
+
+    @bp.get(f"/{collection}/<int:parent_id>/comments", endpoint=f"list_{collection}_comments")
+    @require_accept_json
+    @reject_body
+    def list_(parent_id: int):
+        parent = get_parent(ds, parent_id)
+        if parent is not None:
+            parent = migrate_legacy_comments(ds, parent)
+        if parent is None:
+            return error_response(404, "Not Found")
+
+        try:
+            limit, offset, cursor = parse_page_args()
+            comments, next_cursor = list_comments(ds, parent.key, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        parent_url = self_url(parent_id)
+        return jsonify({
+            "Comments": [comment_to_response(parent_url, c) for c in comments],
+            "Count": comment_summary(parent)[0],
+            "next_cursor": next_cursor,
+        }), 200
+
+    @bp.get(f"/{collection}/<int:parent_id>/comments/<int:comment_id>", endpoint=f"get_{collection}_comment")
+    @require_accept_json
+    @reject_body
+    def get(parent_id: int, comment_id: int):
+        comment = get_comment(ds, ds.key(kind, parent_id), comment_id)
+        if comment is None:
+            return error_response(404, "Not Found")
+        return jsonify(comment_to_response(self_url(parent_id), comment)), 200
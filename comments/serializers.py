@@ -0,0 +1,22 @@
+from google.cloud import datastore
+
+from comments.repo import comment_summary
+
+def comment_to_response(parent_url: str, comment) -> dict:
+    comment_id = comment["C_ID"]
+    return {
+        "C_ID": comment_id,
+        "C_Text": comment.get("C_Text", ""),
+        "C_Date": comment.get("C_Date", ""),
+        "User": comment.get("User", None),
+        "self": parent_url + f"/comments/{comment_id}",
+    }
+
+# Embedded in art and gallery responses in place of the full comment list
+def comments_summary_response(parent_url: str, parent: datastore.Entity) -> dict:
+    count, latest = comment_summary(parent)
+    return {
+        "Count": count,
+        "Latest": [comment_to_response(parent_url, c) for c in latest],
+        "self": parent_url + "/comments",
+    }
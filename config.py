@@ -1,14 +1,40 @@
 import os
+from functools import cache
 from pathlib import Path
 from dotenv import load_dotenv
 from google.cloud import datastore
 
-def init_datastore_client() -> datastore.Client:
+from storage import MemoryClient, SqliteClient, StorageClient
+
+# .env is read once per process, not on every create_app / client construction
+@cache
+def load_settings() -> None:
     load_dotenv(dotenv_path=Path(__file__).with_name(".env"))
 
+def init_datastore_client() -> datastore.Client:
+    load_settings()
+
     project_id = os.getenv("DATASTORE_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
     if not project_id:
         project_id = "bearsty-local"
 
     os.environ.setdefault("GOOGLE_CLOUD_PROJECT", project_id)
     return datastore.Client(project=project_id)
+
+# STORAGE_BACKEND selects the implementation behind the repo modules:
+#   datastore (default) - Cloud Datastore / the emulator
+#   memory              - in-process, indexed; for unit and load tests
+#   sqlite              - single file at SQLITE_PATH; for benchmarks or a single-node deployment
+def init_storage_client() -> StorageClient:
+    load_settings()
+
+    backend = os.getenv("STORAGE_BACKEND", "datastore").lower()
+    project_id = os.getenv("DATASTORE_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT") or "bearsty-local"
+
+    if backend == "memory":
+        return MemoryClient(project=project_id)
+    if backend == "sqlite":
+        return SqliteClient(os.getenv("SQLITE_PATH", "bearsty.db"), project=project_id)
+    if backend == "datastore":
+        return init_datastore_client()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import inspect
+import logging
 from dataclasses import dataclass
 from functools import wraps
 from typing import Any, Callable, Iterable, Optional
@@ -7,6 +9,8 @@ from typing import Any, Callable, Iterable, Optional
 from flask import request, jsonify
 from werkzeug.exceptions import BadRequest
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(frozen=True)
 class ApiError:
@@ -19,6 +23,21 @@ def error_response(status: int, message: str, key: str = "Error"):
     return jsonify({key: message}), status
 
 
+# Decorators below return either an error response or fn(...). When fn is an async view the
+# wrapper must be async too, or Flask would receive an un-awaited coroutine.
+def _keep_async(fn: Callable, wrapper: Callable) -> Callable:
+    if not inspect.iscoroutinefunction(fn):
+        return wrapper
+
+    @wraps(fn)
+    async def async_wrapper(*args, **kwargs):
+        result = wrapper(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    return async_wrapper
+
+
 # -------------------------
 # Accept / Content-Type
 # -------------------------
@@ -26,8 +45,8 @@ def error_response(status: int, message: str, key: str = "Error"):
 def require_accept_json(fn: Callable):
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        print("ACCEPT CHECK v2:", request.headers.get("Accept"))
         accept = request.headers.get("Accept")
+        logger.debug("Accept header: %s", accept)
         if not accept or accept.strip() == "":
             return fn(*args, **kwargs)
 
@@ -38,7 +57,7 @@ def require_accept_json(fn: Callable):
             406,
             "Not Acceptable: API supports application/json responses only."
         )
-    return wrapper
+    return _keep_async(fn, wrapper)
 
 
 # if endpoint expects a JSON body, Content-Type must be application/json. If absent/different -> 415.
@@ -49,7 +68,7 @@ def require_content_type_json(fn: Callable):
         if not ct.lower().startswith("application/json"):
             return error_response(415, "Unsupported Media Type: Content-Type must be application/json.")
         return fn(*args, **kwargs)
-    return wrapper
+    return _keep_async(fn, wrapper)
 
 
 # -------------------------
@@ -66,7 +85,7 @@ def reject_body(fn: Callable):
         if raw and len(raw) > 0:
             return error_response(400, "Bad Request: request body not allowed for this endpoint.")
         return fn(*args, **kwargs)
-    return wrapper
+    return _keep_async(fn, wrapper)
 
 
 # -------------------------
@@ -126,7 +145,7 @@ def require_json_body(
             request.parsed_json = body
             return fn(*args, **kwargs)
 
-        return wrapper
+        return _keep_async(fn, wrapper)
     return decorator
 
 
@@ -143,4 +162,4 @@ def optional_json_body(fn: Callable):
 
         request.parsed_json = body
         return fn(*args, **kwargs)
-    return wrapper
+    return _keep_async(fn, wrapper)
@@ -0,0 +1,136 @@
+import os
+import random
+import time
+from typing import Iterable
+
+from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from storage import StorageClient
+from utils.cache import cache_refresh
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from utils.time_utils import iso_utc_now
+
+# Gallery membership. Each art in a gallery is a GalleryArt root entity named
+# "<gallery id>:<art id>", so "is this art in the gallery" is one key lookup and adding or
+# removing an art writes one small entity, however large the gallery. Listing is a query
+# on G_ID ordered by GA_Order, the time added (composite index in index.yaml); the art id
+# is read back from the key name, so pages are keys-only.
+#
+# A gallery's size is kept in GALLERY_COUNT_SHARDS GalleryArtCount entities
+# ("<gallery id>:<shard>"); each change updates one shard picked at random, so concurrent
+# adds to a popular gallery don't all contend on one entity. Reading the count sums the
+# shards in one batch lookup.
+
+MEMBER_KIND = "GalleryArt"
+COUNTER_KIND = "GalleryArtCount"
+GALLERY_COUNT_SHARDS = max(1, int(os.getenv("GALLERY_COUNT_SHARDS", "8")))
+
+
+def member_key(ds: StorageClient, gallery_id: int, art_id: int) -> datastore.Key:
+    return ds.key(MEMBER_KIND, f"{gallery_id}:{art_id}")
+
+
+def counter_keys(ds: StorageClient, gallery_id: int) -> list[datastore.Key]:
+    return [ds.key(COUNTER_KIND, f"{gallery_id}:{shard}") for shard in range(GALLERY_COUNT_SHARDS)]
+
+
+def random_counter_key(ds: StorageClient, gallery_id: int) -> datastore.Key:
+    return ds.key(COUNTER_KIND, f"{gallery_id}:{random.randrange(GALLERY_COUNT_SHARDS)}")
+
+
+def new_member(ds: StorageClient, gallery_id: int, art_id: int) -> datastore.Entity:
+    member = datastore.Entity(key=member_key(ds, gallery_id, art_id))
+    member.update({"G_ID": gallery_id, "A_ID": art_id, "GA_Added": iso_utc_now(), "GA_Order": time.time_ns()})
+    return member
+
+
+# Applies delta to the shard entity read in the caller's transaction (None if it doesn't exist yet)
+def bump_counter(key: datastore.Key, shard: datastore.Entity | None, delta: int) -> datastore.Entity:
+    if shard is None:
+        shard = datastore.Entity(key=key)
+    shard["GA_Count"] = shard.get("GA_Count", 0) + delta
+    return shard
+
+
+def is_member(ds: StorageClient, gallery_id: int, art_id: int) -> bool:
+    return ds.get(member_key(ds, gallery_id, art_id)) is not None
+
+
+def count_gallery_arts(ds: StorageClient, gallery_id: int) -> int:
+    return max(0, sum(s.get("GA_Count", 0) for s in ds.get_multi(counter_keys(ds, gallery_id))))
+
+
+# Art ids in the order they were added
+def list_gallery_art_ids(
+    ds: StorageClient, gallery_id: int, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = ds.query(kind=MEMBER_KIND)
+    query.add_filter(filter=PropertyFilter("G_ID", "=", gallery_id))
+    query.order = ["GA_Order"]
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [int(e.key.name.split(":", 1)[1]) for e in keys], next_cursor
+
+
+# Removes every membership and the counter of a deleted gallery, in commit-sized batches
+def delete_gallery_members(ds: StorageClient, gallery_id: int, *, batch: int = 400) -> None:
+    query = ds.query(kind=MEMBER_KIND)
+    query.add_filter(filter=PropertyFilter("G_ID", "=", gallery_id))
+    query.keys_only()
+    keys = [e.key for e in query.fetch()] + counter_keys(ds, gallery_id)
+    for start in range(0, len(keys), batch):
+        ds.delete_multi(keys[start:start + batch])
+
+
+# Removes a deleted art from the galleries it was in; the art's own Galleries list names them
+def delete_art_memberships(ds: StorageClient, art_id: int, gallery_ids: Iterable[int]) -> None:
+    gallery_ids = list(dict.fromkeys(gallery_ids))
+    if not gallery_ids:
+        return
+    with ds.transaction():
+        keys = [member_key(ds, g, art_id) for g in gallery_ids]
+        present = {e.key.name for e in ds.get_multi(keys)}
+        shard_keys = [random_counter_key(ds, g) for g, k in zip(gallery_ids, keys) if k.name in present]
+        shards = {s.key.name: s for s in ds.get_multi(shard_keys)}
+        ds.put_multi([bump_counter(k, shards.get(k.name), -1) for k in shard_keys])
+        ds.delete_multi([k for k in keys if k.name in present])
+
+
+# Moves a gallery's embedded Arts list (galleries written before this module) into
+# memberships, keeping its order. Member keys are deterministic, so an interrupted run can
+# simply be repeated. Each batch is written in a transaction that reads the gallery again:
+# once another request has finished the migration (and arts may have been detached since),
+# this stops rather than writing members from a stale Arts list back. Returns the gallery as
+# stored afterwards, or None if it is gone.
+def migrate_embedded_arts(ds: StorageClient, gallery: datastore.Entity, *, batch: int = 400) -> datastore.Entity | None:
+    if "Arts" not in gallery:
+        return gallery
+    gallery_id = gallery.key.id
+    start = 0
+    while True:
+        with ds.transaction():
+            gallery = ds.get(gallery.key)
+            if gallery is None or "Arts" not in gallery:
+                return gallery
+            art_ids = _embedded_art_ids(gallery)
+            if start >= len(art_ids):
+                del gallery["Arts"]
+                shard = datastore.Entity(key=counter_keys(ds, gallery_id)[0])
+                shard["GA_Count"] = len(art_ids)
+                ds.put_multi([gallery, shard])
+                break
+            members = []
+            for position, art_id in enumerate(art_ids[start:start + batch], start=start):
+                member = new_member(ds, gallery_id, art_id)
+                member["GA_Order"] = position
+                members.append(member)
+            ds.put_multi(members)
+        start += batch
+    cache_refresh(gallery)
+    return gallery
+
+
+def _embedded_art_ids(gallery: datastore.Entity) -> list[int]:
+    art_ids = dict.fromkeys(a.get("A_ID") if isinstance(a, dict) else a for a in gallery.get("Arts") or [])
+    return [a for a in art_ids if isinstance(a, int)]
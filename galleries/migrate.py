@@ -0,0 +1,48 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from galleries.members import migrate_embedded_arts
+from galleries.repo import list_galleries
+
+logger = logging.getLogger(__name__)
+
+# One-shot move of every gallery's embedded Arts list into GalleryArt memberships. Galleries
+# are also migrated lazily the first time their arts are listed or changed, so this only
+# needs to run once after deploying, to finish the rest in the background. Safe to re-run.
+#
+#   python -m galleries.migrate
+
+
+def migrate_all(ds, *, page_size: int = 200) -> tuple[int, int]:
+    seen = migrated = 0
+    cursor = None
+    while True:
+        galleries, cursor = list_galleries(ds, limit=page_size, cursor=cursor)
+        for gallery in galleries:
+            seen += 1
+            if "Arts" in gallery:
+                migrate_embedded_arts(ds, gallery)
+                migrated += 1
+        if cursor is None:
+            break
+    return seen, migrated
+
+
+def main(argv=None) -> int:
+    from config import init_storage_client
+
+    p = argparse.ArgumentParser(prog="python -m galleries.migrate", description="Move embedded gallery art lists into membership entities.")
+    p.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    started = time.monotonic()
+    seen, migrated = migrate_all(init_storage_client())
+    logger.info("Migrated %d of %d galleries in %.1fs", migrated, seen, time.monotonic() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,44 +1,195 @@
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
 from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from storage import StorageClient
+from arts.repo import ART_KIND
+from comments.repo import delete_comments
+from galleries.members import (
+    bump_counter, count_gallery_arts, delete_gallery_members, list_gallery_art_ids, member_key,
+    migrate_embedded_arts, new_member, random_counter_key,
+)
+from galleries.serializers import gallery_mini
+from users.repo import stage_user_counts
+from utils.cache import cache_invalidate, cache_refresh, cached_get, cached_get_multi
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
 
 GALLERY_KIND = "Gallery"
 
-def create_gallery_entity(ds: datastore.Client, data: dict) -> datastore.Entity:
+def create_gallery_entity(ds: StorageClient, data: dict) -> datastore.Entity:
     key = ds.key(GALLERY_KIND)
     gallery = datastore.Entity(key=key)
     gallery.update(data)
-    ds.put(gallery)
+    # The owner's Gallery_Count changes in the same commit as the gallery
+    with ds.transaction():
+        owner = stage_user_counts(ds, _owner_id(gallery), Gallery_Count=1)
+        ds.put_multi([gallery] + ([owner] if owner is not None else []))
+    cache_refresh(gallery)
+    if owner is not None:
+        cache_refresh(owner)
     return gallery
 
-def get_gallery(ds: datastore.Client, gallery_id: int) -> datastore.Entity | None:
-    return ds.get(ds.key(GALLERY_KIND, gallery_id))
+def get_gallery(ds: StorageClient, gallery_id: int) -> datastore.Entity | None:
+    return cached_get(ds, GALLERY_KIND, gallery_id)
+
+# Batch lookup; ids that do not exist are absent from the result
+def get_galleries(ds: StorageClient, gallery_ids: Iterable[int]) -> dict[int, datastore.Entity]:
+    return cached_get_multi(ds, GALLERY_KIND, gallery_ids)
+
+def list_galleries(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[datastore.Entity], str | None]:
+    query = ds.query(kind=GALLERY_KIND)
+    return fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+
+# Keys-only variant for callers that only need ids (mini responses): no property data is read
+def list_gallery_ids(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = ds.query(kind=GALLERY_KIND)
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [e.key.id for e in keys], next_cursor
+
+# A user's galleries, newest first (composite index in index.yaml)
+def list_user_gallery_ids(
+    ds: StorageClient, user_id: int, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = _user_galleries_query(ds, user_id)
+    query.order = ["-G_Creation_Date"]
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [e.key.id for e in keys], next_cursor
+
+# Full count with a keys-only scan; only used by users.migrate to seed Gallery_Count
+def count_user_galleries(ds: StorageClient, user_id: int) -> int:
+    query = _user_galleries_query(ds, user_id)
+    query.keys_only()
+    return sum(1 for _ in query.fetch())
 
-def list_galleries(ds: datastore.Client, *, limit=None, offset=0):
+def _user_galleries_query(ds: StorageClient, user_id: int):
     query = ds.query(kind=GALLERY_KIND)
-    if limit is None:
-        return list(query.fetch(offset=offset))
-    return list(query.fetch(limit=limit, offset=offset))
+    query.add_filter(filter=PropertyFilter("User.U_ID", "=", user_id))
+    return query
 
-def delete_gallery(ds: datastore.Client, gallery_id: int) -> bool:
+def _owner_id(gallery: datastore.Entity) -> int | None:
+    return (gallery.get("User") or {}).get("U_ID")
+
+def delete_gallery(ds: StorageClient, gallery_id: int) -> bool:
     key = ds.key(GALLERY_KIND, gallery_id)
-    if ds.get(key) is None:
-        return False
-    ds.delete(key)
+    with ds.transaction():
+        gallery = ds.get(key)
+        if gallery is None:
+            return False
+        owner = stage_user_counts(ds, _owner_id(gallery), Gallery_Count=-1)
+        ds.delete(key)
+        if owner is not None:
+            ds.put(owner)
+    if owner is not None:
+        cache_refresh(owner)
+    delete_comments(ds, key)
+    delete_gallery_members(ds, gallery_id)
+    cache_invalidate(GALLERY_KIND, gallery_id)
     return True
 
-def update_gallery(ds: datastore.Client, gallery: datastore.Entity, updates: dict) -> datastore.Entity:
-    gallery.update(updates)
-    ds.put(gallery)
+# Applies updates to a fresh read inside a transaction, so a stale copy never writes back
+# properties other writers own (comment counts and previews). precondition (e.g. an If-Match
+# version check) runs against that read, so the check and the write are atomic. Returns None
+# if the entity is gone.
+def update_gallery(
+    ds: StorageClient, gallery: datastore.Entity, updates: dict, *, precondition: Callable | None = None
+) -> datastore.Entity | None:
+    with ds.transaction():
+        gallery = ds.get(gallery.key)
+        if gallery is None:
+            return None
+        if precondition is not None:
+            precondition(gallery)
+        gallery.update(updates)
+        ds.put(gallery)
+    cache_refresh(gallery)
     return gallery
 
-def add_art_to_gallery(ds: datastore.Client, gallery: datastore.Entity, art_mini: dict) -> None:
-    arts = gallery.get("Arts", []) or []
-    arts.append(art_mini)
-    gallery["Arts"] = arts
-    ds.put(gallery)
+@dataclass
+class ArtLinkResult:
+    gallery: datastore.Entity | None
+    missing: list[int] = field(default_factory=list)    # art ids that do not exist
+    changed: list[int] = field(default_factory=list)    # art ids attached/detached by this call
+    unchanged: list[int] = field(default_factory=list)  # already attached (attach) / not attached (detach)
+
+# Attaches or detaches arts to/from a gallery inside a single transaction: one get_multi for
+# the gallery, the arts, their membership entities and a counter shard, and one put_multi
+# and delete_multi. The gallery entity itself is not rewritten, so writers adding to the
+# same gallery only contend on the counter shard they happen to pick. Nothing is written if
+# the gallery or any art is missing.
+def update_gallery_arts(
+    ds: StorageClient, gallery_id: int, *, attach: Iterable[int] = (), detach: Iterable[int] = ()
+) -> ArtLinkResult:
+    attach = list(dict.fromkeys(attach))
+    detach = list(dict.fromkeys(detach))
+    gallery = get_gallery(ds, gallery_id)
+    if gallery is not None:
+        gallery = migrate_embedded_arts(ds, gallery)
+    if gallery is None:
+        return ArtLinkResult(gallery=None)
+
+    art_keys = [ds.key(ART_KIND, a) for a in attach + detach]
+    link_keys = [member_key(ds, gallery_id, a) for a in attach + detach]
+    shard_key = random_counter_key(ds, gallery_id)
+
+    with ds.transaction():
+        found = {(e.key.kind, e.key.id_or_name): e for e in ds.get_multi([gallery.key, shard_key] + art_keys + link_keys)}
+        gallery = found.get((GALLERY_KIND, gallery_id))
+        result = ArtLinkResult(gallery=gallery)
+        result.missing = [a for a in attach + detach if (ART_KIND, a) not in found]
+        if gallery is None or result.missing:
+            return result
+
+        linked = {a for a, k in zip(attach + detach, link_keys) if (k.kind, k.name) in found}
+        changed_arts, members, unlinked = [], [], []
+
+        for art_id in attach:
+            if art_id in linked:
+                result.unchanged.append(art_id)
+                continue
+            art = found[(ART_KIND, art_id)]
+            art["Galleries"] = (art.get("Galleries", []) or []) + [gallery_mini(gallery_id)]
+            members.append(new_member(ds, gallery_id, art_id))
+            changed_arts.append(art)
+            result.changed.append(art_id)
+
+        for art_id in detach:
+            if art_id not in linked:
+                result.unchanged.append(art_id)
+                continue
+            art = found[(ART_KIND, art_id)]
+            art["Galleries"] = [g for g in art.get("Galleries", []) or [] if g.get("G_ID") != gallery_id]
+            unlinked.append(member_key(ds, gallery_id, art_id))
+            changed_arts.append(art)
+            result.changed.append(art_id)
+
+        if not changed_arts:
+            return result
 
-def remove_art_from_gallery(ds: datastore.Client, gallery: datastore.Entity, art_id: int) -> None:
-    arts = gallery.get("Arts", []) or []
-    gallery["Arts"] = [a for a in arts if a.get("A_ID") != art_id]
-    ds.put(gallery)
+        shard = bump_counter(shard_key, found.get((shard_key.kind, shard_key.name)), len(members) - len(unlinked))
+        ds.put_multi(changed_arts + members + [shard])
+        if unlinked:
+            ds.delete_multi(unlinked)
 
+    for entity in changed_arts:
+        cache_refresh(entity)
+    return result
 
+# One page of a gallery's arts in the order they were added, and its size. Galleries that
+# still embed their Arts list are migrated first.
+def list_gallery_arts(
+    ds: StorageClient, gallery: datastore.Entity, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+    cursor: str | None = None,
+) -> tuple[list[int], int, str | None]:
+    gallery = migrate_embedded_arts(ds, gallery)
+    if gallery is None:
+        return [], 0, None
+    art_ids, next_cursor = list_gallery_art_ids(ds, gallery.key.id, limit=limit, offset=offset, cursor=cursor)
+    return art_ids, count_gallery_arts(ds, gallery.key.id), next_cursor
@@ -1,6 +1,4 @@
 from flask import Blueprint, request, jsonify
-from google.cloud import datastore
-from datetime import datetime, timezone
 
 from contracts import (
     require_accept_json,
@@ -8,21 +6,26 @@ from contracts import (
     reject_body,
     require_json_body,
     error_response,
+    ApiContractViolation,
 )
 
-from galleries.repo import create_gallery_entity, get_gallery as repo_get_gallery, list_galleries, delete_gallery as repo_delete_gallery, update_gallery as repo_update_gallery,add_art_to_gallery, remove_art_from_gallery
-from galleries.serializers import gallery_to_response, gallery_mini_response
+from storage import StorageClient
+from galleries.repo import create_gallery_entity, get_gallery as repo_get_gallery, list_gallery_ids, delete_gallery as repo_delete_gallery, update_gallery as repo_update_gallery, update_gallery_arts, list_gallery_arts as repo_list_gallery_arts
+from arts.serializers import art_mini
+from galleries.serializers import gallery_to_response, gallery_mini
 from users.repo import get_user as repo_get_user
 from utils.urls import user_self_url
-from arts.repo import get_art as repo_get_art, add_gallery_to_art, remove_gallery_from_art
-from arts.serializers import art_mini_response
+from utils.pagination import parse_page_args
+from utils.expand import GALLERY_EXPANDABLE, parse_expand, load_expansions, apply_expansions, expanded_etag
+from utils.etags import entity_etag, is_not_modified, not_modified_response, etag_response, check_if_match
+from utils.time_utils import iso_utc_now
 
 
-def iso_utc_now() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+# Arts + their membership entities must fit in one transaction commit (500 mutations)
+MAX_BULK_ARTS = 200
 
 
-def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
+def create_galleries_blueprint(ds: StorageClient) -> Blueprint:
     bp = Blueprint("galleries", __name__)
 
     @bp.post("/galleries")
@@ -43,13 +46,15 @@ def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
         creator = repo_get_user(ds, creator_id)
         if creator is None:
             return error_response(404, "Not Found")
+        if body.get("G_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /galleries/<id>/comments.")
 
         gallery = create_gallery_entity(ds, {
-            "Arts": [],
             "User": {"U_ID": creator_id, "self": user_self_url(creator_id)},
             "G_Name": body.get("G_Name", "Untitled"),
             "G_Creation_Date": iso_utc_now(),
-            "G_Comments": body.get("G_Comments", []) or [],
+            "G_Comment_Count": 0,
+            "G_Latest_Comments": [],
             "G_Profile": body.get("G_Profile", ""),
             "G_Is_Public": body.get("G_Is_Public", False),
         })
@@ -60,23 +65,32 @@ def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
     @require_accept_json
     @reject_body
     def get_galleries():
-        limit = request.args.get("limit", default=None, type=int)
-        offset = request.args.get("offset", default=0, type=int)
+        try:
+            limit, offset, cursor = parse_page_args()
+            gallery_ids, next_cursor = list_gallery_ids(ds, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
 
-        if offset < 0 or (limit is not None and limit < 0):
-            return error_response(400, "Bad Request: limit/offset must be non-negative.")
-
-        galleries = list_galleries(ds, limit=limit, offset=offset)
-        return jsonify({"Galleries": [gallery_mini_response(g) for g in galleries]}), 200
+        return jsonify({"Galleries": [gallery_mini(g) for g in gallery_ids], "next_cursor": next_cursor}), 200
 
     @bp.get("/galleries/<int:gallery_id>")
     @require_accept_json
     @reject_body
     def get_gallery(gallery_id: int):
+        try:
+            fields = parse_expand(GALLERY_EXPANDABLE)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
         gallery = repo_get_gallery(ds, gallery_id)
         if gallery is None:
             return error_response(404, "Not Found")
-        return jsonify(gallery_to_response(gallery)), 200
+
+        loaded = load_expansions(ds, gallery, fields) if fields else {}
+        etag = expanded_etag(gallery, fields, loaded)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        return etag_response(apply_expansions(gallery_to_response(gallery), fields, loaded), 200, etag)
     
     @bp.delete("/galleries/<int:gallery_id>")
     @require_accept_json
@@ -94,13 +108,18 @@ def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
         if gallery is None:
             return error_response(404, "Not Found")
 
-        # Already stored as mini objects
-        return jsonify({"Arts": gallery.get("Arts", []) or []}), 200
+        try:
+            limit, offset, cursor = parse_page_args()
+            art_ids, count, next_cursor = repo_list_gallery_arts(ds, gallery, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Arts": [art_mini(a) for a in art_ids], "Count": count, "next_cursor": next_cursor}), 200
     
     @bp.put("/galleries/<int:gallery_id>")
     @require_accept_json
     @require_content_type_json
-    @require_json_body(required_fields=["G_Name", "G_Is_Public", "G_Comments"])
+    @require_json_body(required_fields=["G_Name", "G_Is_Public"])
     def put_gallery(gallery_id: int):
         body = request.parsed_json
 
@@ -111,20 +130,27 @@ def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
         # Disallow changing ownership / relationships via PUT
         if "User" in body or "Arts" in body or "G_ID" in body or "self" in body:
             return error_response(400, "Bad Request")
+        if body.get("G_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /galleries/<id>/comments.")
 
         updates = {
             "G_Name": body["G_Name"],
             "G_Is_Public": body["G_Is_Public"],
-            "G_Comments": body["G_Comments"],
         }
 
-        updated = repo_update_gallery(ds, gallery, updates)
-        return jsonify(gallery_to_response(updated)), 200
+        try:
+            updated = repo_update_gallery(ds, gallery, updates, precondition=check_if_match if request.if_match else None)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+        if updated is None:
+            return error_response(404, "Not Found")
+
+        return etag_response(gallery_to_response(updated), 200, entity_etag(updated))
     
     @bp.patch("/galleries/<int:gallery_id>")
     @require_accept_json
     @require_content_type_json
-    @require_json_body(at_least_one_of=["G_Name", "G_Is_Public", "G_Comments"])
+    @require_json_body(at_least_one_of=["G_Name", "G_Is_Public"])
     def patch_gallery(gallery_id: int):
         body = request.parsed_json
 
@@ -135,55 +161,74 @@ def create_galleries_blueprint(ds: datastore.Client) -> Blueprint:
         # Disallow patching ownership / relationships
         if "User" in body or "Arts" in body or "G_ID" in body or "self" in body:
             return error_response(400, "Bad Request")
+        if body.get("G_Comments"):
+            return error_response(400, "Bad Request: comments are added with POST /galleries/<id>/comments.")
 
-        allowed = ["G_Name", "G_Is_Public", "G_Comments"]
+        allowed = ["G_Name", "G_Is_Public"]
         updates = {k: body[k] for k in allowed if k in body}
 
-        updated = repo_update_gallery(ds, gallery, updates)
-        return jsonify(gallery_to_response(updated)), 200
+        try:
+            updated = repo_update_gallery(ds, gallery, updates, precondition=check_if_match if request.if_match else None)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+        if updated is None:
+            return error_response(404, "Not Found")
+
+        return etag_response(gallery_to_response(updated), 200, entity_etag(updated))
     
     @bp.patch("/galleries/<int:gallery_id>/arts/<int:art_id>")
     @require_accept_json
     @reject_body
     def add_art_relationship(gallery_id: int, art_id: int):
-        gallery = repo_get_gallery(ds, gallery_id)
-        art = repo_get_art(ds, art_id)
+        # Both sides are read and written in one transaction
+        result = update_gallery_arts(ds, gallery_id, attach=[art_id])
 
-        if gallery is None or art is None:
+        if result.gallery is None or result.missing:
             return error_response(404, "Not Found")
 
         # prevent duplicates
-        existing = gallery.get("Arts", []) or []
-        if any(a.get("A_ID") == art_id for a in existing):
+        if result.unchanged:
             return error_response(403, "The art is already in the gallery")
 
-        # Build minis (absolute self URLs)
-        art_mini = art_mini_response(art)
-        gallery_mini = gallery_mini_response(gallery)
-
-        # Update both sides
-        add_art_to_gallery(ds, gallery, art_mini)
-        add_gallery_to_art(ds, art, gallery_mini)
-
-        return jsonify(gallery_to_response(gallery)), 200
+        return jsonify(gallery_to_response(result.gallery)), 200
     
     @bp.delete("/galleries/<int:gallery_id>/arts/<int:art_id>")
     @require_accept_json
     @reject_body
     def remove_art_relationship(gallery_id: int, art_id: int):
-        gallery = repo_get_gallery(ds, gallery_id)
-        art = repo_get_art(ds, art_id)
+        result = update_gallery_arts(ds, gallery_id, detach=[art_id])
 
-        if gallery is None or art is None:
+        if result.gallery is None or result.missing:
             return error_response(404, "Not Found")
 
-        existing = gallery.get("Arts", []) or []
-        if not any(a.get("A_ID") == art_id for a in existing):
+        if result.unchanged:
             return error_response(403, "The art is not in the gallery")
 
-        remove_art_from_gallery(ds, gallery, art_id)
-        remove_gallery_from_art(ds, art, gallery_id)
-
         return "", 204
 
+    @bp.patch("/galleries/<int:gallery_id>/arts")
+    @require_accept_json
+    @require_content_type_json
+    @require_json_body(at_least_one_of=["add", "remove"])
+    def update_art_relationships(gallery_id: int):
+        body = request.parsed_json
+        attach = body.get("add", []) or []
+        detach = body.get("remove", []) or []
+
+        for ids in (attach, detach):
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return error_response(400, "Bad Request: add/remove must be lists of art ids.")
+        if set(attach) & set(detach):
+            return error_response(400, "Bad Request: an art cannot be both added and removed.")
+        if len(set(attach)) + len(set(detach)) > MAX_BULK_ARTS:
+            return error_response(400, f"Bad Request: at most {MAX_BULK_ARTS} arts per request.")
+
+        # Arts already in the requested state are skipped, so the call is idempotent
+        result = update_gallery_arts(ds, gallery_id, attach=attach, detach=detach)
+
+        if result.gallery is None or result.missing:
+            return error_response(404, "Not Found")
+
+        return jsonify(gallery_to_response(result.gallery)), 200
+
     return bp
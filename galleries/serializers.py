@@ -1,23 +1,27 @@
 from google.cloud import datastore
-from flask import request
+
+from comments.serializers import comments_summary_response
+from utils.urls import base_url
 
 def gallery_self_url(gallery_id: int) -> str:
-    return request.host_url.rstrip("/") + f"/galleries/{gallery_id}"
+    return f"{base_url()}/galleries/{gallery_id}"
 
 def gallery_to_response(g: datastore.Entity) -> dict:
     gallery_id = g.key.id
     return {
         "G_ID": gallery_id,
-        "Arts": g.get("Arts", []) or [],
+        "Arts": {"self": gallery_self_url(gallery_id) + "/arts"},
         "User": g.get("User", None),
         "G_Name": g.get("G_Name", "Untitled"),
         "G_Creation_Date": g.get("G_Creation_Date", ""),
-        "G_Comments": g.get("G_Comments", []) or [],
+        "G_Comments": comments_summary_response(gallery_self_url(gallery_id), g),
         "G_Profile": g.get("G_Profile", ""),
         "G_Is_Public": g.get("G_Is_Public", False),
         "self": gallery_self_url(gallery_id),
     }
 
-def gallery_mini_response(g: datastore.Entity) -> dict:
-    gallery_id = g.key.id
+def gallery_mini(gallery_id: int) -> dict:
     return {"G_ID": gallery_id, "self": gallery_self_url(gallery_id)}
+
+def gallery_mini_response(g: datastore.Entity) -> dict:
+    return gallery_mini(g.key.id)
@@ -0,0 +1,34 @@
+import multiprocessing
+import os
+
+# Production launcher: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is imported once in the master (preload_app) and forked into workers. The storage
+# client is lazy (storage.lazy.LazyClient), so each worker opens exactly one Datastore client
+# and gRPC channel after fork and reuses it for all of its threads.
+
+bind = os.getenv("BIND", "0.0.0.0:8080")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("THREADS", "8"))
+worker_class = "gthread"
+preload_app = True
+
+timeout = int(os.getenv("TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("ACCESS_LOG") or None
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def post_worker_init(worker):
+    from app import warm_up
+    warm_up(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+    shutdown(worker.wsgi)
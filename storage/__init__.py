@@ -0,0 +1,6 @@
+from storage.base import StorageClient
+from storage.blobs import LocalBlobStore
+from storage.memory import MemoryClient
+from storage.sqlite import SqliteClient
+
+__all__ = ["StorageClient", "LocalBlobStore", "MemoryClient", "SqliteClient"]
@@ -0,0 +1,347 @@
+import base64
+import copy
+from abc import ABC, abstractmethod
+import json
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Protocol
+
+from google.cloud import datastore
+
+MISSING = object()
+
+
+# What the repo modules need from a storage client. google.cloud.datastore.Client satisfies
+# it as-is; MemoryClient and SqliteClient implement it locally. Entities and keys are
+# datastore.Entity / datastore.Key for every backend, so serializers don't care which is used.
+class StorageClient(Protocol):
+    project: str
+
+    def key(self, *path_args, **kwargs) -> datastore.Key: ...
+    def allocate_ids(self, incomplete_key: datastore.Key, num_ids: int, **kwargs) -> list[datastore.Key]: ...
+    def get(self, key: datastore.Key, **kwargs) -> datastore.Entity | None: ...
+    def get_multi(self, keys: Iterable[datastore.Key], **kwargs) -> list[datastore.Entity]: ...
+    def put(self, entity: datastore.Entity, **kwargs) -> None: ...
+    def put_multi(self, entities: Iterable[datastore.Entity], **kwargs) -> None: ...
+    def delete(self, key: datastore.Key, **kwargs) -> None: ...
+    def delete_multi(self, keys: Iterable[datastore.Key], **kwargs) -> None: ...
+    def query(self, **kwargs): ...
+    def transaction(self, **kwargs): ...
+
+
+def encode_cursor(position) -> bytes:
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw)
+
+
+def decode_cursor(cursor):
+    if isinstance(cursor, str):
+        cursor = cursor.encode("ascii")
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def property_value(entity, name: str):
+    # Dotted names reach into embedded entities, as Datastore does for "User.U_ID"
+    value = entity
+    for part in name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def _orderable(value):
+    # Datastore orders mixed types by type first; mirror that so sorting never raises
+    if value is MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, bytes):
+        return (4, value.hex())
+    return (5, json.dumps(value, sort_keys=True, default=str))
+
+
+def _values(value):
+    # List properties match a filter if any element matches, as in Datastore
+    return value if isinstance(value, list) else [value]
+
+
+def _matches(entity, flt) -> bool:
+    value = property_value(entity, flt.property_name)
+    if value is MISSING:
+        return False
+    op, target = flt.operator, flt.value
+    for v in _values(value):
+        ov, ot = _orderable(v), _orderable(target)
+        if op == "=" and v == target:
+            return True
+        if op == "!=" and v != target:
+            return True
+        if op == "<" and ov < ot:
+            return True
+        if op == "<=" and ov <= ot:
+            return True
+        if op == ">" and ov > ot:
+            return True
+        if op == ">=" and ov >= ot:
+            return True
+        if op == "IN" and v in target:
+            return True
+        if op == "NOT_IN" and v not in target:
+            return True
+    return False
+
+
+# The subset of google.cloud.datastore.Query the repo modules use
+class LocalQuery:
+    def __init__(self, client, kind=None, ancestor=None, filters=(), order=(), projection=()):
+        self._client = client
+        self.kind = kind
+        self.ancestor = ancestor
+        self.filters = list(filters)
+        self.order = list(order)
+        self.projection = list(projection)
+
+    def add_filter(self, property_name=None, operator=None, value=None, *, filter=None):
+        if filter is None:
+            filter = datastore.query.PropertyFilter(property_name, operator, value)
+        self.filters.append(filter)
+        return self
+
+    def keys_only(self):
+        self.projection = ["__key__"]
+
+    def fetch(self, limit=None, offset=0, start_cursor=None, end_cursor=None, **_):
+        return LocalIterator(self, limit=limit, offset=offset or 0, start_cursor=start_cursor)
+
+    def equality_filters(self):
+        return [f for f in self.filters if f.operator == "="]
+
+    def sort_key(self, entity) -> tuple:
+        # Plain (JSON-friendly) sort position; the key path breaks ties like Datastore does
+        parts = []
+        for name in self.order:
+            parts.append((name.startswith("-"), _orderable(property_value(entity, name.lstrip("-")))))
+        parts.append((False, tuple(entity.key.flat_path)))
+        return tuple(parts)
+
+    @staticmethod
+    def comparable(position) -> tuple:
+        return tuple(_Desc(v) if desc else v for desc, v in position)
+
+    def run(self, entities):
+        if self.ancestor is not None:
+            prefix = tuple(self.ancestor.flat_path)
+            entities = (e for e in entities if tuple(e.key.flat_path[:len(prefix)]) == prefix)
+        results = [e for e in entities if all(_matches(e, f) for f in self.filters)]
+        results.sort(key=lambda e: self.comparable(self.sort_key(e)))
+        return results
+
+
+class _Desc:
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __lt__(self, other):
+        return other.v < self.v
+
+    def __eq__(self, other):
+        return self.v == other.v
+
+
+# Mimics the Datastore query iterator: iterable, with .pages and next_page_token
+class LocalIterator:
+    def __init__(self, query, *, limit, offset, start_cursor):
+        self._query = query
+        self._limit = limit
+        self._offset = offset
+        self._start_cursor = start_cursor
+        self._page = None
+        self.next_page_token = None
+
+    def _load(self):
+        if self._page is not None:
+            return self._page
+        query = self._query
+        results = query.run(query._client._candidates(query))
+
+        if self._start_cursor is not None:
+            after = query.comparable(_tuplify(decode_cursor(self._start_cursor)))
+            results = [e for e in results if after < query.comparable(query.sort_key(e))]
+        elif self._offset:
+            results = results[self._offset:]
+
+        more = self._limit is not None and len(results) > self._limit
+        if self._limit is not None:
+            results = results[:self._limit]
+        if more and results:
+            self.next_page_token = encode_cursor(query.sort_key(results[-1]))
+
+        if query.projection == ["__key__"]:
+            results = [datastore.Entity(key=e.key) for e in results]
+        else:
+            results = [copy.deepcopy(e) for e in results]
+        self._page = results
+        return results
+
+    @property
+    def pages(self):
+        yield iter(self._load())
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+def _tuplify(v):
+    # JSON round-trips tuples as lists; restore them so cursor keys compare like sort keys
+    if isinstance(v, list):
+        return tuple(_tuplify(x) for x in v)
+    return v
+
+
+# Begins when entered, so its reads see the state its writes will be checked against:
+# SqliteClient opens BEGIN IMMEDIATE, which also holds off other processes' writers until
+# the transaction ends. Writes are buffered and applied on commit; an exception rolls back.
+class LocalTransaction:
+    def __init__(self, client):
+        self._client = client
+        self.puts = []
+        self.deletes = []
+
+    def put(self, entity):
+        self._client._complete_key(entity)
+        self.puts.append(entity)
+
+    def delete(self, key):
+        self.deletes.append(key)
+
+    def __enter__(self):
+        self._client._lock.acquire()
+        try:
+            self._client._begin()
+        except BaseException:
+            self._client._lock.release()
+            raise
+        self._client._local.txn = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._client._local.txn = None
+        try:
+            if exc_type is None:
+                self._client._commit(self.puts, self.deletes)
+            else:
+                self._client._rollback()
+        finally:
+            self._client._lock.release()
+        return False
+
+
+# Shared behaviour of the non-Datastore backends: keys, transactions, queries. Subclasses
+# implement the four storage hooks at the bottom; a backend missing one fails to construct.
+# _begin/_rollback are for backends with transactions of their own.
+class LocalClient(ABC):
+    def __init__(self, project: str):
+        self.project = project
+        self.namespace = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    # keys / ids
+    def key(self, *path_args, **kwargs):
+        kwargs.setdefault("project", self.project)
+        return datastore.Key(*path_args, **kwargs)
+
+    def allocate_ids(self, incomplete_key, num_ids, **_):
+        with self._lock:
+            return [incomplete_key.completed_key(self._allocate_id(incomplete_key.kind)) for _ in range(num_ids)]
+
+    def _complete_key(self, entity):
+        if entity.key.is_partial:
+            entity.key = entity.key.completed_key(self._allocate_id(entity.key.kind))
+
+    @property
+    def current_transaction(self):
+        return getattr(self._local, "txn", None)
+
+    def transaction(self, **_):
+        return LocalTransaction(self)
+
+    @contextmanager
+    def batch(self):
+        with self.transaction() as txn:
+            yield txn
+
+    # reads
+    def get(self, key, **_):
+        found = self.get_multi([key])
+        return found[0] if found else None
+
+    def get_multi(self, keys, missing=None, **_):
+        with self._lock:
+            found = []
+            for k in keys:
+                e = self._load(k)
+                if e is not None:
+                    found.append(e)
+                elif missing is not None:
+                    missing.append(datastore.Entity(key=k))
+            return found
+
+    def query(self, kind=None, ancestor=None, filters=(), order=(), projection=(), **_):
+        return LocalQuery(self, kind=kind, ancestor=ancestor, filters=filters, order=order, projection=projection)
+
+    # writes
+    def put(self, entity, **_):
+        self.put_multi([entity])
+
+    def put_multi(self, entities, **_):
+        txn = self.current_transaction
+        if txn is not None:
+            for e in entities:
+                txn.put(e)
+            return
+        with self._lock:
+            for e in entities:
+                self._complete_key(e)
+            self._commit(list(entities), [])
+
+    def delete(self, key, **_):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys, **_):
+        txn = self.current_transaction
+        if txn is not None:
+            for k in keys:
+                txn.delete(k)
+            return
+        with self._lock:
+            self._commit([], list(keys))
+
+    # backend hooks
+    @abstractmethod
+    def _allocate_id(self, kind: str) -> int: ...
+
+    @abstractmethod
+    def _load(self, key): ...
+
+    @abstractmethod
+    def _commit(self, puts, deletes) -> None: ...
+
+    @abstractmethod
+    def _candidates(self, query): ...
+
+    def _begin(self) -> None:
+        pass
+
+    def _rollback(self) -> None:
+        pass
@@ -0,0 +1,97 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# Content-addressed store for large binary values (art images). Blobs are keyed by the
+# SHA-256 of their bytes, so identical uploads share one file and a digest never changes
+# meaning; entities hold only the digest.
+#
+#   BLOB_STORE_PATH   directory for the local store (default ./blobs)
+
+DEFAULT_BLOB_PATH = "blobs"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore:
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    # Fan out on the first two hex digits to keep directories small
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def size(self, digest: str) -> int:
+        return self.path(digest).stat().st_size
+
+    # Returns the digest. Writing an existing blob is a no-op; new blobs go to a temp file
+    # first and are renamed into place, so readers never see a partial file.
+    def put(self, data: bytes) -> str:
+        digest = blob_digest(data)
+        path = self.path(digest)
+        if path.is_file():
+            return digest
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes | None:
+        try:
+            return self.path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    # Read-only memory map of the blob; the page cache serves repeat reads without copying
+    # the file into the process heap. Empty blobs cannot be mapped and yield b"".
+    @contextmanager
+    def open(self, digest: str) -> Iterator[mmap.mmap | bytes]:
+        with open(self.path(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    # Streams bytes [start, stop) in chunks. Opened lazily, so it can be handed to a Response.
+    def iter_range(self, digest: str, start: int = 0, stop: int | None = None) -> Iterator[bytes]:
+        with self.open(digest) as view:
+            stop = len(view) if stop is None else min(stop, len(view))
+            for offset in range(start, stop, STREAM_CHUNK_SIZE):
+                yield view[offset:min(offset + STREAM_CHUNK_SIZE, stop)]
+
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> LocalBlobStore:
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = LocalBlobStore(os.getenv("BLOB_STORE_PATH", DEFAULT_BLOB_PATH))
+    return _blob_store
+
+
+def set_blob_store(store: LocalBlobStore) -> None:
+    global _blob_store
+    _blob_store = store
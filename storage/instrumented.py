@@ -0,0 +1,139 @@
+import time
+from typing import Callable
+
+# Wraps any StorageClient and reports each Datastore RPC it causes as on_call(rpc, seconds).
+# RPC names follow the Datastore API (lookup, commit, run_query, begin_transaction,
+# allocate_ids), so counts mean the same thing whichever backend is underneath.
+OnCall = Callable[[str, float], None]
+
+
+class InstrumentedClient:
+    def __init__(self, inner, on_call: OnCall):
+        self._inner = inner
+        self._listeners = [on_call]
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    # Another consumer of the same RPC stream (e.g. app metrics on a client the bench already
+    # instruments), so each RPC is timed once however many want it
+    def add_listener(self, on_call: OnCall) -> None:
+        if on_call not in self._listeners:
+            self._listeners.append(on_call)
+
+    def _on_call(self, rpc: str, seconds: float) -> None:
+        for listener in self._listeners:
+            listener(rpc, seconds)
+
+    def _timed(self, rpc: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._on_call(rpc, time.perf_counter() - started)
+
+    def _in_transaction(self) -> bool:
+        return getattr(self._inner, "current_transaction", None) is not None
+
+    def allocate_ids(self, incomplete_key, num_ids, **kwargs):
+        return self._timed("allocate_ids", self._inner.allocate_ids, incomplete_key, num_ids, **kwargs)
+
+    def get(self, key, **kwargs):
+        return self._timed("lookup", self._inner.get, key, **kwargs)
+
+    def get_multi(self, keys, **kwargs):
+        return self._timed("lookup", self._inner.get_multi, keys, **kwargs)
+
+    # Writes inside a transaction are buffered and sent with its commit
+    def put(self, entity, **kwargs):
+        if self._in_transaction():
+            return self._inner.put(entity, **kwargs)
+        return self._timed("commit", self._inner.put, entity, **kwargs)
+
+    def put_multi(self, entities, **kwargs):
+        if self._in_transaction():
+            return self._inner.put_multi(entities, **kwargs)
+        return self._timed("commit", self._inner.put_multi, entities, **kwargs)
+
+    def delete(self, key, **kwargs):
+        if self._in_transaction():
+            return self._inner.delete(key, **kwargs)
+        return self._timed("commit", self._inner.delete, key, **kwargs)
+
+    def delete_multi(self, keys, **kwargs):
+        if self._in_transaction():
+            return self._inner.delete_multi(keys, **kwargs)
+        return self._timed("commit", self._inner.delete_multi, keys, **kwargs)
+
+    def query(self, **kwargs):
+        return _InstrumentedQuery(self._inner.query(**kwargs), self._on_call)
+
+    def transaction(self, **kwargs):
+        return _InstrumentedTransaction(self._inner.transaction(**kwargs), self._on_call)
+
+
+class _InstrumentedQuery:
+    def __init__(self, inner, on_call: OnCall):
+        self._inner = inner
+        self._on_call = on_call
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def __setattr__(self, name, value):
+        if name in ("_inner", "_on_call"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._inner, name, value)
+
+    def fetch(self, *args, **kwargs):
+        return _InstrumentedIterator(self._inner.fetch(*args, **kwargs), self._on_call)
+
+
+# Queries run lazily, one RPC per page, so time is taken while pages are pulled
+class _InstrumentedIterator:
+    def __init__(self, inner, on_call: OnCall):
+        self._inner = inner
+        self._on_call = on_call
+
+    @property
+    def next_page_token(self):
+        return self._inner.next_page_token
+
+    @property
+    def pages(self):
+        pages = self._inner.pages
+        while True:
+            started = time.perf_counter()
+            page = next(pages, None)
+            items = list(page) if page is not None else None
+            if items is None:
+                return
+            self._on_call("run_query", time.perf_counter() - started)
+            yield iter(items)
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+
+class _InstrumentedTransaction:
+    def __init__(self, inner, on_call: OnCall):
+        self._inner = inner
+        self._on_call = on_call
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._inner.__enter__()
+        self._on_call("begin_transaction", time.perf_counter() - started)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        started = time.perf_counter()
+        try:
+            return self._inner.__exit__(exc_type, exc, tb)
+        finally:
+            self._on_call("rollback" if exc_type else "commit", time.perf_counter() - started)
@@ -0,0 +1,34 @@
+import os
+import threading
+from typing import Callable
+
+from storage.base import StorageClient
+
+
+# Defers building the real client until first use, and builds it again in a forked child.
+# With a preloaded app the master never opens a gRPC channel; each worker creates exactly one
+# client after fork and reuses it for every request.
+class LazyClient:
+    def __init__(self, factory: Callable[[], StorageClient]):
+        self._factory = factory
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_client(self) -> StorageClient:
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
+
+    def close(self) -> None:
+        if self._client is not None and self._pid == os.getpid():
+            close = getattr(self._client, "close", None)
+            if close is not None:
+                close()
+        self._client = None
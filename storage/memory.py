@@ -0,0 +1,78 @@
+import copy
+import itertools
+from collections import defaultdict
+
+from storage.base import MISSING, LocalClient, property_value
+
+
+def _index_values(value):
+    values = value if isinstance(value, list) else [value]
+    return [v for v in values if v is not MISSING and not isinstance(v, (dict, list))]
+
+
+# Process-local store with equality indexes built on first use. Nothing survives a restart.
+class MemoryClient(LocalClient):
+    def __init__(self, project: str):
+        super().__init__(project)
+        self._ids = itertools.count(1)
+        self._kinds = defaultdict(dict)  # kind -> flat_path -> entity
+        self._indexes = {}  # (kind, property) -> value -> set(flat_path)
+
+    def _allocate_id(self, kind: str) -> int:
+        return next(self._ids)
+
+    def _load(self, key):
+        e = self._kinds[key.kind].get(tuple(key.flat_path))
+        return copy.deepcopy(e) if e is not None else None
+
+    def _commit(self, puts, deletes) -> None:
+        for key in deletes:
+            old = self._kinds[key.kind].pop(tuple(key.flat_path), None)
+            if old is not None:
+                self._unindex(old)
+        for entity in puts:
+            stored = copy.deepcopy(entity)
+            path = tuple(stored.key.flat_path)
+            old = self._kinds[stored.key.kind].get(path)
+            if old is not None:
+                self._unindex(old)
+            self._kinds[stored.key.kind][path] = stored
+            self._index(stored)
+
+    def _index(self, entity) -> None:
+        path = tuple(entity.key.flat_path)
+        for (kind, prop), index in self._indexes.items():
+            if kind == entity.key.kind:
+                for v in _index_values(property_value(entity, prop)):
+                    index[v].add(path)
+
+    def _unindex(self, entity) -> None:
+        path = tuple(entity.key.flat_path)
+        for (kind, prop), index in self._indexes.items():
+            if kind == entity.key.kind:
+                for v in _index_values(property_value(entity, prop)):
+                    index[v].discard(path)
+
+    def _build_index(self, kind: str, prop: str):
+        index = defaultdict(set)
+        for path, entity in self._kinds[kind].items():
+            for v in _index_values(property_value(entity, prop)):
+                index[v].add(path)
+        self._indexes[(kind, prop)] = index
+        return index
+
+    def _candidates(self, query):
+        with self._lock:
+            entities = self._kinds[query.kind]
+            paths = None
+            for f in query.equality_filters():
+                if isinstance(f.value, (dict, list)):
+                    continue
+                index = self._indexes.get((query.kind, f.property_name))
+                if index is None:
+                    index = self._build_index(query.kind, f.property_name)
+                matched = index.get(f.value, set())
+                paths = matched if paths is None else paths & matched
+            if paths is None:
+                return list(entities.values())
+            return [entities[p] for p in paths if p in entities]
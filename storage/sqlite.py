@@ -0,0 +1,102 @@
+import base64
+import json
+import sqlite3
+from datetime import datetime
+
+from google.cloud import datastore
+
+from storage.base import LocalClient
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_kind ON entities (kind);
+CREATE TABLE IF NOT EXISTS ids (id INTEGER PRIMARY KEY AUTOINCREMENT);
+"""
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def _path(key) -> str:
+    return json.dumps(list(key.flat_path), separators=(",", ":"))
+
+
+# Single-file store for local benchmarking or a single-node deployment. Entities are JSON
+# documents; equality filters are pushed down to SQLite with json_each, the rest of the
+# query (ordering, cursors) runs in LocalQuery.
+class SqliteClient(LocalClient):
+    def __init__(self, path: str, project: str):
+        super().__init__(project)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row_to_entity(self, path: str, data: str) -> datastore.Entity:
+        entity = datastore.Entity(key=self.key(*json.loads(path)))
+        entity.update(json.loads(data, object_hook=_decode))
+        return entity
+
+    def _allocate_id(self, kind: str) -> int:
+        with self._lock:
+            return self._conn.execute("INSERT INTO ids DEFAULT VALUES").lastrowid
+
+    def _load(self, key):
+        row = self._conn.execute("SELECT path, data FROM entities WHERE path = ?", (_path(key),)).fetchone()
+        return self._row_to_entity(*row) if row else None
+
+    # Runs when a transaction is entered, so its reads and writes are one SQLite transaction
+    def _begin(self) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def _rollback(self) -> None:
+        self._conn.execute("ROLLBACK")
+
+    # Ends the transaction _begin opened, or wraps a write made outside one in its own
+    def _commit(self, puts, deletes) -> None:
+        if not self._conn.in_transaction:
+            self._begin()
+        try:
+            self._conn.executemany("DELETE FROM entities WHERE path = ?", [(_path(k),) for k in deletes])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entities (path, kind, data) VALUES (?, ?, ?)",
+                [(_path(e.key), e.key.kind, json.dumps(dict(e), default=_encode)) for e in puts],
+            )
+        except BaseException:
+            self._rollback()
+            raise
+        self._conn.execute("COMMIT")
+
+    def _candidates(self, query):
+        sql = "SELECT path, data FROM entities WHERE kind = ?"
+        params = [query.kind]
+        for f in query.equality_filters():
+            if isinstance(f.value, (dict, list, bytes)):
+                continue
+            # json_each yields a scalar once and each element of a list, matching Datastore's
+            # "any element equals" semantics for list properties
+            sql += " AND EXISTS (SELECT 1 FROM json_each(entities.data, ?) WHERE value = ?)"
+            params += ["$." + f.property_name, f.value]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_entity(path, data) for path, data in rows]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,65 @@
+import pytest
+
+from arts import thumbnails
+from arts.feed import PublicFeed, set_public_feed
+from storage import MemoryClient
+from storage.blobs import LocalBlobStore, set_blob_store
+from users.graph import FriendGraph, set_friend_graph
+from utils.cache import LRUCache, set_entity_cache
+
+
+# Every test gets empty process-wide state: a MemoryClient numbers ids from 1 again, so a
+# cache or graph left over from another test would answer for the wrong entity. Thumbnails
+# render in the calling thread.
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path, monkeypatch):
+    set_entity_cache(LRUCache())
+    set_friend_graph(FriendGraph())
+    set_public_feed(PublicFeed())
+    set_blob_store(LocalBlobStore(tmp_path / "blobs"))
+    renderer = thumbnails.ThumbnailRenderer(thumbnails.ThumbnailCache(tmp_path / "thumbnails"), workers=0)
+    monkeypatch.setattr(thumbnails, "_renderer", renderer)
+    yield
+
+
+@pytest.fixture
+def ds():
+    return MemoryClient("test")
+
+
+@pytest.fixture
+def client(ds):
+    from app import create_app
+
+    return create_app(ds).test_client()
+
+
+# Sends JSON and asks for JSON, like the API's clients
+@pytest.fixture
+def api(client):
+    def call(method, url, body=None, headers=None):
+        return client.open(url, method=method, json=body, headers={"Accept": "application/json", **(headers or {})})
+    return call
+
+
+@pytest.fixture
+def make_user(api):
+    def make(email="a"):
+        return api("POST", "/users", {"userinfo": {"email": email}}).get_json()["U_ID"]
+    return make
+
+
+@pytest.fixture
+def make_art(api):
+    def make(user_id, image="Image Path/File", public=True, title="t"):
+        body = {"A_Title": title, "A_Image": image, "A_Is_Public": public, "User": {"U_ID": user_id}, "A_Comments": []}
+        return api("POST", "/arts", body).get_json()["A_ID"]
+    return make
+
+
+@pytest.fixture
+def make_gallery(api):
+    def make(user_id, name="g", public=True):
+        body = {"G_Name": name, "G_Is_Public": public, "User": {"U_ID": user_id}}
+        return api("POST", "/galleries", body).get_json()["G_ID"]
+    return make
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+
+from flask import Flask
+
+from app import create_app
+from asgi import AsgiApp
+from storage import MemoryClient
+
+
+async def _request(app, method, path, body=None):
+    raw = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"accept", b"application/json")]
+    if body is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())]
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "root_path": "",
+        "query_string": b"", "headers": headers, "scheme": "http", "server": ("testserver", 80),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    status = sent[0]["status"]
+    data = b"".join(m.get("body", b"") for m in sent[1:])
+    is_json = (b"content-type", b"application/json") in sent[0]["headers"]
+    return status, json.loads(data) if is_json else data
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_friend_endpoints_are_served_natively():
+    app = AsgiApp(create_app(MemoryClient("test")))
+
+    async def flow():
+        _, a = await _request(app, "POST", "/users", {"userinfo": {"email": "a"}})
+        _, b = await _request(app, "POST", "/users", {"userinfo": {"email": "b"}})
+        path = f"/users/{a['U_ID']}/users/{b['U_ID']}"
+        added = await _request(app, "PATCH", path)
+        again = await _request(app, "PATCH", path)
+        missing = await _request(app, "PATCH", f"/users/{a['U_ID']}/users/999999")
+        removed = await _request(app, "DELETE", path)
+        return added, again, missing, removed
+
+    added, again, missing, removed = _run(flow())
+    assert added[0] == 200 and len(added[1]["U_Friends"]) == 1
+    assert again[0] == 403
+    assert missing[0] == 404
+    assert removed[0] == 204
+
+
+def test_async_views_run_on_the_event_loop():
+    flask_app = Flask(__name__)
+    threads = {}
+
+    @flask_app.get("/async")
+    async def async_view():
+        threads["view"] = threading.current_thread()
+        await asyncio.sleep(0)
+        return {"ok": True}
+
+    async def call():
+        threads["loop"] = threading.current_thread()
+        return await _request(AsgiApp(flask_app), "GET", "/async")
+
+    assert _run(call()) == (200, {"ok": True})
+    assert threads["view"] is threads["loop"]
+
+
+def test_sync_views_are_served_concurrently():
+    flask_app = Flask(__name__)
+    # Each request waits for the other, so this only completes if both run at once
+    barrier = threading.Barrier(2, timeout=5)
+
+    @flask_app.get("/sync")
+    def sync_view():
+        barrier.wait()
+        return {"ok": True}
+
+    async def both():
+        app = AsgiApp(flask_app)
+        return await asyncio.gather(_request(app, "GET", "/sync"), _request(app, "GET", "/sync"))
+
+    assert _run(both()) == [(200, {"ok": True})] * 2
+
+
+def test_unknown_routes_and_errors_go_through_flask():
+    app = AsgiApp(create_app(MemoryClient("test")))
+    status, body = _run(_request(app, "PATCH", "/users/1/users/1"))
+    assert status == 403 and "Error" in body
+    status, _ = _run(_request(app, "GET", "/nowhere"))
+    assert status == 404
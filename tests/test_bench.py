@@ -0,0 +1,64 @@
+import json
+import os
+
+from app import create_app
+from bench import runner
+from bench.runner import Recorder, percentile, run_benchmark
+from bench.scenarios import parse_http_file, render
+from storage import MemoryClient
+from storage.instrumented import InstrumentedClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HTTP = """\
+@baseUrl = http://localhost:8080
+@json = application/json
+
+### Create a user
+# @name createUser
+POST {{baseUrl}}/users
+Accept: {{json}}
+Content-Type: {{json}}
+
+{"userinfo": {"email": "a"}}
+
+###
+GET {{baseUrl}}/users/{{createUser.response.body.U_ID}}
+Accept: {{json}}
+"""
+
+
+def test_parse_and_render(tmp_path):
+    path = tmp_path / "api.http"
+    path.write_text(HTTP)
+    scenario = parse_http_file(str(path))
+
+    assert scenario.variables == {"baseUrl": "http://localhost:8080", "json": "application/json"}
+    create, get = scenario.requests
+    assert (create.method, create.name, create.body) == ("POST", "createUser", '{"userinfo": {"email": "a"}}')
+    assert create.headers == {"Accept": "{{json}}", "Content-Type": "{{json}}"}
+
+    responses = {"createUser": {"U_ID": 7}}
+    assert render(get.url, scenario.variables, responses) == "http://localhost:8080/users/7"
+    assert render(get.url, scenario.variables, {}) == "http://localhost:8080/users/"
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0 and percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+def test_repo_scenarios_run_without_errors():
+    recorder = Recorder()
+    ds = InstrumentedClient(MemoryClient("test"), recorder.rpc)
+    transport = runner.TestClientTransport(create_app(ds))
+    scenario = parse_http_file(os.path.join(ROOT, "api-tests.http"))
+
+    summary = run_benchmark(scenario, transport, recorder, concurrency=2, iterations=1)
+    assert summary["requests"] == 2 * len(scenario.requests)
+    assert summary["errors"] == 0
+    # RPCs are attributed to the route that caused them
+    create = summary["endpoints"]["POST /users"]
+    assert create["rpcs_per_request"]["commit"] >= 1
+    json.dumps(summary)
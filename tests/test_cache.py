@@ -0,0 +1,83 @@
+import pytest
+from google.cloud import datastore
+
+from utils import cache
+from utils.cache import LRUCache, cached_get, cached_get_multi, get_entity_cache
+
+
+def _entity(ds, kind, **props):
+    e = datastore.Entity(key=ds.key(kind))
+    e.update(props)
+    ds.put(e)
+    return e
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_entries_expire_and_are_copied(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(ttl=10)
+    value = {"n": [1]}
+    lru.set("k", value)
+    value["n"].append(2)
+    got = lru.get("k")
+    got["n"].append(3)
+    assert lru.get("k") == {"n": [1]}
+
+    now[0] += 11
+    assert lru.get("k") is None
+
+
+def test_add_does_not_replace_a_live_entry():
+    lru = LRUCache()
+    lru.set("k", "written")
+    assert not lru.add("k", "read earlier")
+    assert lru.get("k") == "written"
+    lru.invalidate("k")
+    assert lru.add("k", "read later") and lru.get("k") == "read later"
+
+
+def test_reads_go_through_the_cache(ds, monkeypatch):
+    a, b = _entity(ds, "User", n=1), _entity(ds, "User", n=2)
+    assert cached_get(ds, "User", a.key.id) == {"n": 1}
+
+    lookups = []
+    get_multi = ds.get_multi
+    monkeypatch.setattr(ds, "get_multi", lambda keys, **kw: lookups.append(list(keys)) or get_multi(keys, **kw))
+    assert cached_get(ds, "User", a.key.id) == {"n": 1}
+    assert lookups == []
+
+    found = cached_get_multi(ds, "User", [a.key.id, b.key.id, 999])
+    assert found == {a.key.id: {"n": 1}, b.key.id: {"n": 2}}
+    # Only the misses are looked up, in one batch
+    assert [[k.id for k in keys] for keys in lookups] == [[b.key.id, 999]]
+
+
+def test_writes_refresh_and_deletes_invalidate(api, make_user, make_art):
+    art_id = make_art(make_user(), title="before")
+    assert api("GET", f"/arts/{art_id}").get_json()["A_Title"] == "before"
+
+    assert api("PATCH", f"/arts/{art_id}", {"A_Title": "after"}).status_code == 200
+    assert api("GET", f"/arts/{art_id}").get_json()["A_Title"] == "after"
+
+    assert api("DELETE", f"/arts/{art_id}").status_code == 204
+    assert api("GET", f"/arts/{art_id}").status_code == 404
+    assert get_entity_cache().get(("Art", art_id)) is None
+
+
+def test_cache_backend_from_env(monkeypatch):
+    monkeypatch.setenv("ENTITY_CACHE", "none")
+    assert cache._cache_from_env().stats() == {"backend": "none"}
+    monkeypatch.setenv("ENTITY_CACHE", "shared")
+    monkeypatch.delenv("ENTITY_CACHE_AUTHKEY", raising=False)
+    with pytest.raises(ValueError):
+        cache._cache_from_env()
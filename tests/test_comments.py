@@ -0,0 +1,79 @@
+import pytest
+from google.cloud import datastore
+
+from comments.repo import COMMENT_PREVIEW, MAX_COMMENT_LENGTH, list_comment_keys
+
+
+@pytest.fixture(params=["arts", "galleries"])
+def parent(request, make_user, make_art, make_gallery):
+    user_id = make_user()
+    make = make_art if request.param == "arts" else make_gallery
+    return f"/{request.param}/{make(user_id)}", user_id
+
+
+def _comment(api, url, text, user_id=None):
+    body = {"C_Text": text}
+    if user_id is not None:
+        body["User"] = {"U_ID": user_id}
+    return api("POST", f"{url}/comments", body)
+
+
+def test_comments_are_added_listed_and_summarised(api, parent):
+    url, user_id = parent
+    texts = [f"c{i}" for i in range(COMMENT_PREVIEW + 2)]
+    created = [_comment(api, url, t, user_id).get_json() for t in texts]
+    assert created[0]["User"]["U_ID"] == user_id and created[0]["self"].endswith(f"{url}/comments/{created[0]['C_ID']}")
+
+    first = api("GET", f"{url}/comments?limit=3").get_json()
+    second = api("GET", f"{url}/comments?limit=3&cursor={first['next_cursor']}").get_json()
+    assert [c["C_Text"] for c in first["Comments"] + second["Comments"]] == texts
+    assert first["Count"] == len(texts)
+
+    summary = api("GET", url).get_json()["A_Comments" if url.startswith("/arts") else "G_Comments"]
+    assert summary["Count"] == len(texts)
+    assert [c["C_Text"] for c in summary["Latest"]] == texts[-COMMENT_PREVIEW:]
+
+    one = api("GET", f"{url}/comments/{created[1]['C_ID']}").get_json()
+    assert one == created[1]
+
+
+@pytest.mark.parametrize("body", [
+    {"C_Text": ""},
+    {"C_Text": "   "},
+    {"C_Text": 5},
+    {"C_Text": "x" * (MAX_COMMENT_LENGTH + 1)},
+    {"C_Text": "x", "User": {"U_ID": "1"}},
+])
+def test_invalid_comments_are_rejected(api, parent, body):
+    assert api("POST", f"{parent[0]}/comments", body).status_code == 400
+
+
+def test_missing_parent_user_or_comment(api, parent):
+    url, _ = parent
+    collection = url.split("/")[1]
+    assert _comment(api, f"/{collection}/999999", "x").status_code == 404
+    assert _comment(api, url, "x", 999999).status_code == 404
+    assert api("GET", f"/{collection}/999999/comments").status_code == 404
+    assert api("GET", f"{url}/comments/999999").status_code == 404
+
+
+def test_legacy_inline_comments_are_migrated(api, ds):
+    art = datastore.Entity(key=ds.key("Art"))
+    art.update({"A_Title": "old", "A_Is_Public": True, "A_Comments": ["first", {"text": "second"}]})
+    ds.put(art)
+    url = f"/arts/{art.key.id}"
+    assert api("GET", url).get_json()["A_Comments"]["Count"] == 2
+
+    new = _comment(api, url, "third").get_json()
+    listed = api("GET", f"{url}/comments").get_json()
+    assert [c["C_ID"] for c in listed["Comments"]][:2] == [1, 2] and new["C_ID"] not in (1, 2)
+    assert [c["C_Text"] for c in listed["Comments"]] == ["first", '{"text": "second"}', "third"]
+    assert listed["Count"] == 3 and "A_Comments" not in ds.get(art.key)
+
+
+def test_deleting_the_parent_deletes_its_comments(api, ds, parent):
+    url, _ = parent
+    _comment(api, url, "x")
+    api("DELETE", url)
+    kind, parent_id = ("Art" if url.startswith("/arts") else "Gallery"), int(url.rsplit("/", 1)[1])
+    assert list_comment_keys(ds, ds.key(kind, parent_id)) == []
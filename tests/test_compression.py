@@ -0,0 +1,54 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask
+
+from utils import compression, json_provider
+from utils.json_provider import OrjsonProvider
+
+
+@pytest.fixture
+def users(make_user):
+    return [make_user(f"user{i}@example.com") for i in range(40)]
+
+
+def test_large_json_is_gzipped(api, users):
+    plain = api("GET", "/users?limit=100")
+    resp = api("GET", "/users?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(resp.data) < len(plain.data)
+    assert json.loads(gzip.decompress(resp.data)) == plain.get_json()
+
+
+def test_uncompressed_without_accept_encoding_or_when_small(api, users, monkeypatch):
+    resp = api("GET", "/users?limit=100")
+    assert "Content-Encoding" not in resp.headers and "Accept-Encoding" in resp.headers["Vary"]
+    assert api("GET", "/users?limit=100", headers={"Accept-Encoding": "identity"}).headers.get("Content-Encoding") is None
+
+    monkeypatch.setattr(compression, "COMPRESS_MIN_SIZE", 10**9)
+    assert "Content-Encoding" not in api("GET", "/users?limit=100", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_not_modified_and_errors_are_left_alone(api, users, monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESS_MIN_SIZE", 0)
+    etag = api("GET", f"/users/{users[0]}").headers["ETag"]
+    resp = api("GET", f"/users/{users[0]}", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert resp.status_code == 304 and "Content-Encoding" not in resp.headers
+
+    missing = api("GET", "/users/999999", headers={"Accept-Encoding": "gzip"})
+    assert missing.status_code == 404 and "Error" in json.loads(gzip.decompress(missing.data))
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson not installed")
+def test_orjson_output_matches_flask():
+    app = Flask(__name__)
+    obj = {"b": [1, 2.5, None, "é"], "a": {"2": True}}
+    app.json = OrjsonProvider(app)
+    text = app.json.dumps(obj)
+    assert text.startswith('{"a":') and json.loads(text) == obj
+    assert app.json.loads(text) == obj
+    with app.app_context():
+        body = app.json.response(obj).get_data()
+    assert body.endswith(b"\n") and json.loads(body) == obj
@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.fixture
+def urls(make_user, make_art, make_gallery):
+    user_id = make_user()
+    return {
+        "user": f"/users/{user_id}",
+        "art": f"/arts/{make_art(user_id)}",
+        "gallery": f"/galleries/{make_gallery(user_id)}",
+    }
+
+
+@pytest.mark.parametrize("name", ["user", "art", "gallery"])
+def test_conditional_get(api, urls, name):
+    resp = api("GET", urls[name])
+    etag = resp.headers["ETag"]
+    assert resp.status_code == 200
+
+    cached = api("GET", urls[name], headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.data == b"" and cached.headers["ETag"] == etag
+    assert api("GET", urls[name], headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("name, change", [("art", {"A_Title": "new"}), ("gallery", {"G_Name": "new"})])
+def test_etag_changes_with_the_entity(api, urls, name, change):
+    etag = api("GET", urls[name]).headers["ETag"]
+    updated = api("PATCH", urls[name], change)
+    assert updated.status_code == 200 and updated.headers["ETag"] != etag
+    assert api("GET", urls[name], headers={"If-None-Match": etag}).status_code == 200
+
+
+@pytest.mark.parametrize("name, field", [("art", "A_Title"), ("gallery", "G_Name")])
+def test_if_match_guards_updates(api, urls, name, field):
+    etag = api("GET", urls[name]).headers["ETag"]
+    assert api("PATCH", urls[name], {field: "first"}, headers={"If-Match": etag}).status_code == 200
+
+    # The second writer still holds the old version
+    stale = api("PATCH", urls[name], {field: "second"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert api("GET", urls[name]).get_json()[field] == "first"
+
+    current = api("GET", urls[name]).headers["ETag"]
+    assert api("PUT", urls[name], _full_body(api, urls[name], field, "third"), headers={"If-Match": current}).status_code == 200
+    assert api("GET", urls[name]).get_json()[field] == "third"
+
+
+def _full_body(api, url, field, value):
+    body = api("GET", url).get_json()
+    if field == "A_Title":
+        return {"A_Title": value, "A_Image": "Image Path/File", "A_Is_Public": body["A_Is_Public"]}
+    return {"G_Name": value, "G_Profile": body.get("G_Profile", ""), "G_Is_Public": body["G_Is_Public"]}
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from utils import expand
+from utils.cache import NullCache, set_entity_cache
+
+
+def test_expand_inlines_referenced_entities(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    art_id = make_art(user_id)
+    gallery_id = make_gallery(user_id)
+    api("PATCH", f"/galleries/{gallery_id}/arts/{art_id}")
+
+    plain = api("GET", f"/arts/{art_id}").get_json()
+    assert set(plain["User"]) == {"U_ID", "self"}
+
+    art = api("GET", f"/arts/{art_id}?expand=User,Galleries").get_json()
+    assert art["User"] == api("GET", f"/users/{user_id}").get_json()
+    assert [g["G_Name"] for g in art["Galleries"]] == ["g"]
+    assert api("GET", f"/galleries/{gallery_id}?expand=User").get_json()["User"]["U_ID"] == user_id
+
+
+def test_friends_are_loaded_in_one_batch(api, ds, make_user):
+    user_id = make_user()
+    friends = [make_user(f"f{i}") for i in range(3)]
+    for f in friends:
+        api("PATCH", f"/users/{user_id}/users/{f}")
+
+    set_entity_cache(NullCache())
+    with mock.patch.object(ds, "get_multi", wraps=ds.get_multi) as get_multi:
+        user = api("GET", f"/users/{user_id}?expand=U_Friends").get_json()
+    assert [f["U_ID"] for f in user["U_Friends"]] == friends
+    assert all("Arts" in f for f in user["U_Friends"])
+    assert get_multi.call_count == 2  # the user itself, then every friend together
+
+
+def test_unknown_field_is_rejected(api, make_user):
+    assert api("GET", f"/users/{make_user()}?expand=Arts").status_code == 400
+
+
+def test_missing_reference_stays_a_mini_object(api, make_user, make_art):
+    user_id = make_user()
+    art_id = make_art(user_id)
+    api("DELETE", f"/users/{user_id}")
+    art = api("GET", f"/arts/{art_id}?expand=User").get_json()
+    assert set(art["User"]) == {"U_ID", "self"}
+
+
+def test_expansion_is_capped(api, make_user, monkeypatch):
+    monkeypatch.setattr(expand, "MAX_EXPAND", 2)
+    user_id = make_user()
+    for i in range(3):
+        api("PATCH", f"/users/{user_id}/users/{make_user(f'f{i}')}")
+    friends = api("GET", f"/users/{user_id}?expand=U_Friends").get_json()["U_Friends"]
+    assert ["Arts" in f for f in friends] == [True, True, False]
+
+
+def test_etag_follows_expanded_entities(api, make_user, make_art):
+    user_id = make_user()
+    art_id = make_art(user_id)
+    url = f"/arts/{art_id}?expand=User"
+    etag = api("GET", url).headers["ETag"]
+    assert etag != api("GET", f"/arts/{art_id}").headers["ETag"]
+
+    # A new art changes the user's Art_Count, so the art inlining the user has a new version
+    make_art(user_id)
+    assert api("GET", url, headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,78 @@
+import pytest
+
+from arts.feed import PublicFeed, set_public_feed
+
+
+def _feed(api, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return api("GET", f"/feed?{query}").get_json()
+
+
+def _ids(page):
+    return [a["A_ID"] for a in page["Arts"]]
+
+
+def test_feed_lists_public_arts_newest_first(api, make_user, make_art):
+    user_id = make_user()
+    public = [make_art(user_id) for _ in range(3)]
+    make_art(user_id, public=False)
+
+    page = _feed(api)
+    assert _ids(page) == public[::-1] and page["next_cursor"] is None
+    assert page["Arts"][0]["User"]["U_ID"] == user_id and page["Arts"][0]["A_Title"] == "t"
+
+
+def test_feed_follows_updates_and_deletes(api, make_user, make_art):
+    user_id = make_user()
+    first, second = make_art(user_id), make_art(user_id)
+    _feed(api)
+
+    api("PATCH", f"/arts/{first}", {"A_Is_Public": False})
+    assert _ids(_feed(api)) == [second]
+    api("PATCH", f"/arts/{first}", {"A_Is_Public": True, "A_Title": "back"})
+    assert _feed(api)["Arts"][0]["A_Title"] == "back"
+    api("DELETE", f"/arts/{second}")
+    assert _ids(_feed(api)) == [first]
+
+
+def test_cursor_is_stable_while_arts_are_added(api, make_user, make_art):
+    user_id = make_user()
+    arts = [make_art(user_id) for _ in range(4)]
+    first = _feed(api, limit=2)
+    make_art(user_id)
+    second = _feed(api, limit=2, cursor=first["next_cursor"])
+    assert _ids(first) + _ids(second) == arts[::-1]
+    assert api("GET", "/feed?cursor=bm9waXBl").status_code == 400
+
+
+def test_feed_is_served_from_memory(api, ds, make_user, make_art, monkeypatch):
+    make_art(make_user())
+    _feed(api)
+    monkeypatch.setattr(ds, "query", lambda **kw: pytest.fail("feed read storage"))
+    assert len(_ids(_feed(api))) == 1
+
+
+def test_feed_keeps_only_the_newest(api, make_user, make_art):
+    set_public_feed(PublicFeed(size=2))
+    user_id = make_user()
+    arts = [make_art(user_id) for _ in range(3)]
+    assert _ids(_feed(api)) == arts[:0:-1]
+    newest = make_art(user_id)
+    assert _ids(_feed(api)) == [newest, arts[2]]
+
+
+def test_stale_feed_is_rebuilt_from_storage(ds, api, make_user, make_art):
+    user_id = make_user()
+    make_art(user_id)
+    feed = PublicFeed(refresh=60)
+    set_public_feed(feed)
+    assert len(_ids(_feed(api))) == 1
+
+    # Another worker's write only reaches this feed through a rebuild
+    other = PublicFeed()
+    set_public_feed(other)
+    art_id = make_art(user_id)
+    set_public_feed(feed)
+    assert art_id not in _ids(_feed(api))
+    feed._loaded_at -= 61
+    assert _ids(_feed(api))[0] == art_id
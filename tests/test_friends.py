@@ -0,0 +1,82 @@
+from array import array
+
+import pytest
+
+from users.graph import FriendGraph, contains, get_friend_graph, intersect
+from users.repo import USER_KIND
+from utils.cache import cache_invalidate
+
+
+def _befriend(api, user_id, *friend_ids):
+    for friend_id in friend_ids:
+        assert api("PATCH", f"/users/{user_id}/users/{friend_id}").status_code == 200
+
+
+@pytest.mark.parametrize("a, b", [
+    ([1, 3, 5, 7], [3, 4, 5]),
+    ([2], list(range(100))),
+    ([], [1, 2]),
+])
+def test_intersect(a, b):
+    assert intersect(array("q", a), array("q", b)) == sorted(set(a) & set(b))
+
+
+def test_contains():
+    ids = array("q", [2, 4, 6])
+    assert contains(ids, 4) and not contains(ids, 5) and not contains(ids, 7)
+
+
+def test_add_and_remove_friends(api, ds, make_user):
+    a, b = make_user("a"), make_user("b")
+    resp = api("PATCH", f"/users/{a}/users/{b}")
+    assert resp.status_code == 200 and [f["U_ID"] for f in resp.get_json()["U_Friends"]] == [b]
+    assert api("PATCH", f"/users/{a}/users/{b}").status_code == 403
+    assert api("PATCH", f"/users/{a}/users/{a}").status_code == 403
+    assert api("PATCH", f"/users/{a}/users/999999").status_code == 404
+    assert get_friend_graph().are_friends(ds, a, b) and not get_friend_graph().are_friends(ds, b, a)
+
+    assert api("DELETE", f"/users/{a}/users/{b}").status_code == 204
+    assert api("DELETE", f"/users/{a}/users/{b}").status_code == 403
+    assert ds.get(ds.key(USER_KIND, a))["U_Friends"] == []
+    assert not get_friend_graph().are_friends(ds, a, b)
+
+
+def test_mutual_friends(api, make_user):
+    a, b, c, d, e = (make_user(x) for x in "abcde")
+    _befriend(api, a, c, d, e)
+    _befriend(api, b, d, e)
+    body = api("GET", f"/users/{a}/friends/mutual/{b}").get_json()
+    assert [u["U_ID"] for u in body["Mutual"]] == [d, e] and body["Count"] == 2
+    assert api("GET", f"/users/{a}/friends/mutual/999999").status_code == 404
+
+
+def test_suggestions_rank_friends_of_friends(api, make_user):
+    me, f1, f2, x, y = (make_user(x) for x in ["me", "f1", "f2", "x", "y"])
+    _befriend(api, me, f1, f2)
+    _befriend(api, f1, x, y, me)
+    _befriend(api, f2, y, f1)
+    body = api("GET", f"/users/{me}/suggestions").get_json()
+    assert [(s["U_ID"], s["Mutual"]) for s in body["Suggestions"]] == [(y, 2), (x, 1)]
+    assert body["Friends_Count"] == 2
+    assert len(api("GET", f"/users/{me}/suggestions?limit=1").get_json()["Suggestions"]) == 1
+    assert api("GET", "/users/999999/suggestions").status_code == 404
+
+
+def test_graph_reloads_expired_entries(ds, make_user):
+    a, b = make_user("a"), make_user("b")
+    graph = FriendGraph(ttl=0)
+    assert list(graph.friends(ds, a)) == []
+    # Another worker adds the friend; an expired entry is read again from storage
+    user = ds.get(ds.key(USER_KIND, a))
+    user["U_Friends"] = [b]
+    ds.put(user)
+    cache_invalidate(USER_KIND, a)
+    assert list(graph.friends(ds, a)) == [b]
+
+
+def test_graph_evicts_least_recently_used():
+    graph = FriendGraph(maxsize=2)
+    graph.set(1, [2])
+    graph.set(2, [1])
+    graph.set(3, [])
+    assert list(graph.friends_of(None, [2, 3])) == [2, 3]
@@ -0,0 +1,137 @@
+import pytest
+from google.cloud import datastore
+
+from galleries.members import member_key, migrate_embedded_arts
+from galleries.routes import MAX_BULK_ARTS
+
+
+def _arts_of(api, gallery_id, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return api("GET", f"/galleries/{gallery_id}/arts?{query}").get_json()
+
+
+def _listed(page):
+    return [a["A_ID"] for a in page["Arts"]]
+
+
+def test_attach_list_and_detach(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_ids = [make_art(user_id) for _ in range(3)]
+
+    for art_id in art_ids:
+        assert api("PATCH", f"/galleries/{gallery_id}/arts/{art_id}").status_code == 200
+    assert api("PATCH", f"/galleries/{gallery_id}/arts/{art_ids[0]}").status_code == 403
+    page = _arts_of(api, gallery_id)
+    assert _listed(page) == art_ids and page["Count"] == 3
+    assert gallery_id in [g["G_ID"] for g in api("GET", f"/arts/{art_ids[0]}").get_json()["Galleries"]]
+
+    assert api("DELETE", f"/galleries/{gallery_id}/arts/{art_ids[1]}").status_code == 204
+    assert api("DELETE", f"/galleries/{gallery_id}/arts/{art_ids[1]}").status_code == 403
+    page = _arts_of(api, gallery_id)
+    assert _listed(page) == [art_ids[0], art_ids[2]] and page["Count"] == 2
+
+
+def test_missing_gallery_or_art_is_not_found(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_id = make_art(user_id)
+    assert api("PATCH", f"/galleries/999999/arts/{art_id}").status_code == 404
+    assert api("PATCH", f"/galleries/{gallery_id}/arts/999999").status_code == 404
+    assert api("GET", "/galleries/999999/arts").status_code == 404
+
+
+def test_listing_pages_with_a_cursor(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_ids = [make_art(user_id) for _ in range(5)]
+    api("PATCH", f"/galleries/{gallery_id}/arts", {"add": art_ids})
+
+    first = _arts_of(api, gallery_id, limit=3)
+    second = _arts_of(api, gallery_id, limit=3, cursor=first["next_cursor"])
+    assert _listed(first) + _listed(second) == art_ids
+    assert second["next_cursor"] is None and second["Count"] == 5
+
+
+def test_deleting_a_gallery_removes_its_memberships(api, ds, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_id = make_art(user_id)
+    api("PATCH", f"/galleries/{gallery_id}/arts/{art_id}")
+    assert api("DELETE", f"/galleries/{gallery_id}").status_code == 204
+    assert ds.get(member_key(ds, gallery_id, art_id)) is None
+
+
+def _legacy_gallery(ds, art_ids):
+    gallery = datastore.Entity(key=ds.key("Gallery"))
+    gallery.update({"G_Name": "old", "G_Is_Public": True, "Arts": [{"A_ID": a} for a in art_ids]})
+    ds.put(gallery)
+    return gallery
+
+
+def test_embedded_arts_are_migrated_in_order(api, ds, make_user, make_art):
+    user_id = make_user()
+    art_ids = [make_art(user_id) for _ in range(5)]
+    gallery = _legacy_gallery(ds, art_ids[::-1])
+
+    migrated = migrate_embedded_arts(ds, gallery, batch=2)
+    assert "Arts" not in migrated
+    page = _arts_of(api, gallery.key.id)
+    assert _listed(page) == art_ids[::-1] and page["Count"] == 5
+
+
+def test_stale_copy_does_not_restore_a_detached_art(api, ds, make_user, make_art):
+    user_id = make_user()
+    art_ids = [make_art(user_id) for _ in range(3)]
+    stale = _legacy_gallery(ds, art_ids)
+
+    # Another request migrates the gallery and detaches an art ...
+    api("PATCH", f"/galleries/{stale.key.id}/arts/{art_ids[0]}")
+    assert api("DELETE", f"/galleries/{stale.key.id}/arts/{art_ids[0]}").status_code == 204
+
+    # ... before this one, holding the copy read earlier, gets to migrate it
+    assert "Arts" not in migrate_embedded_arts(ds, stale)
+    assert ds.get(member_key(ds, stale.key.id, art_ids[0])) is None
+    page = _arts_of(api, stale.key.id)
+    assert _listed(page) == art_ids[1:] and page["Count"] == 2
+
+
+def _galleries_of(api, art_id):
+    return [g["G_ID"] for g in api("GET", f"/arts/{art_id}").get_json()["Galleries"]]
+
+
+def test_bulk_add_and_remove_in_one_request(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_ids = [make_art(user_id) for _ in range(4)]
+    url = f"/galleries/{gallery_id}/arts"
+
+    assert api("PATCH", url, {"add": art_ids[:3]}).status_code == 200
+    assert api("PATCH", url, {"add": [art_ids[3]], "remove": art_ids[:2]}).status_code == 200
+    assert _listed(_arts_of(api, gallery_id)) == art_ids[2:]
+    assert _galleries_of(api, art_ids[0]) == [] and _galleries_of(api, art_ids[3]) == [gallery_id]
+
+    # Arts already in the requested state are skipped
+    assert api("PATCH", url, {"add": art_ids[2:], "remove": art_ids[:2]}).status_code == 200
+    assert _arts_of(api, gallery_id)["Count"] == 2
+
+
+def test_bulk_change_with_a_missing_art_writes_nothing(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    gallery_id = make_gallery(user_id)
+    art_id = make_art(user_id)
+
+    assert api("PATCH", f"/galleries/{gallery_id}/arts", {"add": [art_id, 999999]}).status_code == 404
+    assert _arts_of(api, gallery_id)["Count"] == 0
+    assert _galleries_of(api, art_id) == []
+
+
+@pytest.mark.parametrize("body", [
+    {"add": "1"},
+    {"add": [True]},
+    {"add": [1], "remove": [1]},
+    {"add": list(range(1, MAX_BULK_ARTS + 2))},
+])
+def test_bulk_change_is_validated(api, make_user, make_gallery, body):
+    gallery_id = make_gallery(make_user())
+    assert api("PATCH", f"/galleries/{gallery_id}/arts", body).status_code == 400
@@ -0,0 +1,89 @@
+import os
+import random
+
+import pytest
+
+from arts import history
+from arts.history import diff, patch
+from storage.blobs import blob_digest, get_blob_store
+
+TEXT = "".join(random.Random(1).choice("abcdef") for _ in range(2000))
+
+
+@pytest.mark.parametrize("old, new", [
+    (b"", b""),
+    (b"", b"new"),
+    (b"same", b"same"),
+    (b"abcdefgh" * 100, b"abcdXfgh" * 100),
+    (b"longer old content", b"short"),
+    (b"short", b"short and then longer"),
+    (os.urandom(500), os.urandom(700)),
+])
+def test_patch_reverses_diff(old, new):
+    assert patch(old, diff(old, new)) == new
+
+
+def test_small_change_gives_a_small_delta():
+    old = os.urandom(10_000)
+    new = old[:5000] + b"x" + old[5001:]
+    assert len(diff(old, new)) < 100
+
+
+def _edit(text, at):
+    return text[:at] + "Z" + text[at + 1:]
+
+
+def _history(api, art_id):
+    return api("GET", f"/arts/{art_id}/history").get_json()
+
+
+def test_image_writes_add_revisions(api, client, make_user, make_art):
+    art_id = make_art(make_user(), image=TEXT)
+    versions = [TEXT, _edit(TEXT, 10), _edit(_edit(TEXT, 10), 1500)]
+    for image in versions[1:]:
+        assert api("PATCH", f"/arts/{art_id}", {"A_Image": image}).status_code == 200
+    # A title change is not an image write
+    api("PATCH", f"/arts/{art_id}", {"A_Title": "renamed"})
+
+    page = _history(api, art_id)
+    assert page["A_Revision"] == 3
+    assert [r["R_Type"] for r in page["Revisions"]] == ["snapshot", "delta", "delta"]
+    for number, image in enumerate(versions, start=1):
+        resp = client.get(f"/arts/{art_id}/history/{number}")
+        assert resp.status_code == 200 and resp.get_data(as_text=True) == image
+
+
+def test_snapshot_every_interval(api, make_user, make_art, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_SNAPSHOT_INTERVAL", 2)
+    art_id = make_art(make_user(), image=TEXT)
+    for at in range(1, 4):
+        api("PATCH", f"/arts/{art_id}", {"A_Image": _edit(TEXT, at)})
+    assert [r["R_Type"] for r in _history(api, art_id)["Revisions"]] == ["snapshot", "delta", "snapshot", "delta"]
+
+
+def test_revision_is_immutable_and_cacheable(api, client, make_user, make_art):
+    art_id = make_art(make_user(), image=TEXT)
+    resp = client.get(f"/arts/{art_id}/history/1")
+    assert resp.headers["ETag"] == f'"{blob_digest(TEXT.encode())}"'
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert client.get(f"/arts/{art_id}/history/1", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+
+def test_missing_revision_or_art(api, client, make_user, make_art):
+    art_id = make_art(make_user(), image=TEXT)
+    assert client.get(f"/arts/{art_id}/history/2").status_code == 404
+    assert api("GET", "/arts/999999/history").status_code == 404
+
+
+def test_broken_chain_is_a_server_error(api, client, make_user, make_art):
+    art_id = make_art(make_user(), image=TEXT)
+    api("PATCH", f"/arts/{art_id}", {"A_Image": _edit(TEXT, 5)})
+    get_blob_store().path(blob_digest(TEXT.encode())).unlink()
+    assert client.get(f"/arts/{art_id}/history/2").status_code == 500
+
+
+def test_deleting_the_art_deletes_its_history(api, ds, make_user, make_art):
+    art_id = make_art(make_user(), image=TEXT)
+    api("PATCH", f"/arts/{art_id}", {"A_Image": _edit(TEXT, 5)})
+    api("DELETE", f"/arts/{art_id}")
+    assert history.list_revision_keys(ds, art_id) == []
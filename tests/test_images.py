@@ -0,0 +1,105 @@
+import base64
+
+import pytest
+from google.cloud import datastore
+
+from arts.images import decode_image, served_type
+from arts.png import encode_png
+from contracts import ApiContractViolation
+from storage import blobs
+from storage.blobs import LocalBlobStore, blob_digest
+
+PNG = encode_png(2, 1, b"\xff\x00\x00\x00\xff\x00")
+PNG_URL = "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+
+def _art(api, user_id, image):
+    return api("POST", "/arts", {"A_Title": "t", "A_Image": image, "A_Is_Public": True, "User": {"U_ID": user_id}, "A_Comments": []})
+
+
+def test_decode_raster_data_url():
+    assert decode_image(PNG_URL) == (PNG, "image/png")
+    assert decode_image("Image Path/File") == (b"Image Path/File", "text/plain; charset=utf-8")
+
+
+@pytest.mark.parametrize("value", [
+    "data:text/html,<script>alert(1)</script>",
+    "data:image/svg+xml;base64," + base64.b64encode(b"<svg onload='alert(1)'/>").decode(),
+    "data:,no type",
+    "data:image/png;base64,not base64!",
+    42,
+])
+def test_decode_rejects_other_types(value):
+    with pytest.raises(ApiContractViolation) as e:
+        decode_image(value)
+    assert e.value.status == 400
+
+
+def test_upload_of_html_is_rejected(api, make_user):
+    resp = _art(api, make_user(), "data:text/html,<script>alert(1)</script>")
+    assert resp.status_code == 400
+
+
+def test_image_is_served_with_nosniff_and_ranges(api, client, make_user):
+    art = _art(api, make_user(), PNG_URL).get_json()
+    url = f"/arts/{art['A_ID']}/image"
+
+    resp = client.get(url)
+    assert resp.status_code == 200 and resp.data == PNG
+    assert resp.content_type == "image/png"
+    assert resp.headers["X-Content-Type-Options"] == "nosniff"
+    assert "Content-Disposition" not in resp.headers
+
+    part = client.get(url, headers={"Range": "bytes=1-3"})
+    assert part.status_code == 206 and part.data == PNG[1:4]
+    assert part.headers["Content-Range"] == f"bytes 1-3/{len(PNG)}"
+    assert client.get(url, headers={"Range": f"bytes={len(PNG) + 10}-"}).status_code == 416
+
+    etag = resp.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_legacy_html_image_is_served_as_download(ds, client, make_user):
+    user_id = make_user()
+    art = datastore.Entity(key=ds.key("Art"))
+    art.update({"A_Title": "old", "A_Image": "data:text/html,<script>alert(1)</script>", "A_Is_Public": True, "User": {"U_ID": user_id}})
+    ds.put(art)
+
+    resp = client.get(f"/arts/{art.key.id}/image")
+    assert resp.status_code == 200
+    assert resp.content_type == "application/octet-stream"
+    assert resp.headers["Content-Disposition"] == "attachment"
+    assert resp.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_served_type():
+    assert served_type("image/webp") == ("image/webp", {"X-Content-Type-Options": "nosniff"})
+    assert served_type("text/plain; charset=utf-8")[0] == "text/plain; charset=utf-8"
+    assert served_type("image/svg+xml")[0] == "application/octet-stream"
+    assert served_type(None)[0] == "application/octet-stream"
+
+
+def test_blob_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    digest = store.put(b"abc")
+    assert digest == blob_digest(b"abc") and store.put(b"abc") == digest
+    assert store.get(digest) == b"abc" and store.size(digest) == 3
+    assert [p.name for p in tmp_path.rglob("*") if p.is_file()] == [digest]
+    assert store.get(blob_digest(b"other")) is None
+
+
+def test_blob_ranges_stream_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "STREAM_CHUNK_SIZE", 4)
+    store = LocalBlobStore(tmp_path)
+    digest = store.put(bytes(range(10)))
+    assert list(store.iter_range(digest)) == [bytes(range(4)), bytes(range(4, 8)), bytes(range(8, 10))]
+    assert b"".join(store.iter_range(digest, 3, 7)) == bytes(range(3, 7))
+    assert list(store.iter_range(store.put(b""))) == []
+
+
+def test_identical_images_share_a_blob(api, ds, make_user):
+    user_id = make_user()
+    arts = [_art(api, user_id, PNG_URL).get_json()["A_ID"] for _ in range(2)]
+    stored = [ds.get(ds.key("Art", a)) for a in arts]
+    assert all("A_Image" not in art for art in stored)
+    assert {art["A_Image_Digest"] for art in stored} == {blob_digest(PNG)}
@@ -0,0 +1,29 @@
+import pytest
+
+@pytest.fixture
+def queries(ds, monkeypatch):
+    made = []
+    query = ds.query
+
+    def recording_query(**kwargs):
+        made.append(query(**kwargs))
+        return made[-1]
+
+    monkeypatch.setattr(ds, "query", recording_query)
+    return made
+
+
+@pytest.mark.parametrize("url, field, id_field", [
+    ("/users", "Users", "U_ID"),
+    ("/arts", "Arts", "A_ID"),
+    ("/galleries", "Galleries", "G_ID"),
+])
+def test_list_pages_read_keys_only(api, ds, make_user, make_art, make_gallery, queries, monkeypatch, url, field, id_field):
+    user_id = make_user()
+    ids = {"/users": [user_id], "/arts": [make_art(user_id)], "/galleries": [make_gallery(user_id)]}[url]
+    del queries[:]
+    monkeypatch.setattr(ds, "get_multi", lambda *a, **kw: pytest.fail("list page read an entity"))
+
+    page = api("GET", url).get_json()
+    assert page[field] == [{id_field: i, "self": f"http://localhost{url}/{i}"} for i in ids]
+    assert queries and all(q.projection == ["__key__"] for q in queries)
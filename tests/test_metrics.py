@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+
+import app as app_module
+from app import create_app
+from utils import metrics as metrics_module
+from utils.metrics import Histogram, Metrics
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = Metrics()
+    monkeypatch.setattr(metrics_module, "metrics", fresh)
+    monkeypatch.setattr(app_module, "metrics", fresh)
+    return fresh
+
+
+@pytest.fixture
+def client(ds, metrics):
+    return create_app(ds).test_client()
+
+
+def test_histogram_buckets_are_upper_bounds():
+    h = Histogram(buckets=(0.1, 1.0))
+    for v in (0.1, 0.5, 2.0):
+        h.observe(v)
+    assert h.counts == [1, 1, 1] and h.count == 3 and h.total == pytest.approx(2.6)
+
+
+def test_requests_and_rpcs_are_exported(client):
+    client.post("/users", json={"userinfo": {"email": "a"}}, headers={"Accept": "application/json"})
+    client.get("/users/999", headers={"Accept": "application/json"})
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200 and resp.content_type.startswith("text/plain")
+    text = resp.get_data(as_text=True)
+    assert 'bearsty_requests_total{endpoint="users.create_user",method="POST",status="201"} 1' in text
+    assert 'bearsty_requests_total{endpoint="users.get_user",method="GET",status="404"} 1' in text
+    assert 'bearsty_request_duration_seconds_count{endpoint="users.create_user",method="POST"} 1' in text
+    assert 'bearsty_request_duration_seconds_bucket{endpoint="users.create_user",method="POST",le="+Inf"} 1' in text
+    assert 'bearsty_datastore_rpc_duration_seconds_count{rpc="commit",endpoint="users.create_user"}' in text
+    assert "bearsty_entity_cache_misses_total" in text
+
+
+def test_counters_and_label_escaping(metrics):
+    metrics.increment("flushes", 2)
+    metrics.observe_request('a"b', "GET", 200, 0.01)
+    text = metrics.render()
+    assert "bearsty_flushes_total 2" in text
+    assert 'endpoint="a\\"b"' in text
+
+
+def test_slow_requests_are_logged(ds, metrics, monkeypatch, caplog):
+    monkeypatch.setenv("SLOW_REQUEST_MS", "0.000001")
+    client = create_app(ds).test_client()
+    with caplog.at_level(logging.WARNING, logger="utils.metrics"):
+        client.get("/", headers={"Accept": "application/json"})
+    assert "Slow request: GET /" in caplog.text
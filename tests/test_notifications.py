@@ -0,0 +1,75 @@
+import copy
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import datastore
+
+from storage import MemoryClient
+from users.notifications import MemorySink, NotificationScheduler, schedule_key, schedule_users, unschedule_user
+from users.repo import USER_KIND
+from utils.time_utils import rfc1123_gmt
+
+NOW = datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _user(ds, **props):
+    user = datastore.Entity(key=ds.key(USER_KIND))
+    user.update({"U_Name": "a", "U_Friends": [], "Is_Custom_Time": False, **props})
+    ds.put(user)
+    schedule_users(ds, [user])
+    return user
+
+
+def _scheduler(ds, sink):
+    return NotificationScheduler(ds, sink, batch=10, lookahead=60, window=100, max_delay=3600)
+
+
+def test_due_user_is_notified_once():
+    ds, sink = MemoryClient("test"), MemorySink()
+    user = _user(ds, Today_Time=rfc1123_gmt(NOW - timedelta(minutes=1)))
+    scheduler = _scheduler(ds, sink)
+
+    assert scheduler.run_pending(NOW) == 1
+    assert sink.sent == [{"id": f"{user.key.id}:2026-01-05T11:59:00Z", "U_ID": user.key.id, "Due": "2026-01-05T11:59:00Z"}]
+    assert _scheduler(ds, sink).run_pending(NOW + timedelta(minutes=5)) == 0
+    assert len(sink.sent) == 1
+
+
+def test_stale_user_write_does_not_resend():
+    ds, sink = MemoryClient("test"), MemorySink()
+    user = _user(ds, Today_Time=rfc1123_gmt(NOW - timedelta(minutes=1)))
+    stale = copy.deepcopy(ds.get(user.key))
+
+    assert _scheduler(ds, sink).run_pending(NOW) == 1
+    # e.g. a friend change that read the user before the claim
+    stale["U_Friends"] = [42]
+    ds.put(stale)
+
+    assert _scheduler(ds, sink).run_pending(NOW + timedelta(minutes=1)) == 0
+    assert len(sink.sent) == 1
+
+
+def test_custom_alarm_moves_to_next_day():
+    ds, sink = MemoryClient("test"), MemorySink()
+    alarm = NOW - timedelta(minutes=2)
+    user = _user(ds, Is_Custom_Time=True, Custom_Time_Alarm=rfc1123_gmt(alarm))
+    # Scheduled as if created just before the alarm
+    schedule = ds.get(schedule_key(ds, user.key.id))
+    schedule["U_Notify_At"] = "2026-01-05T11:58:00Z"
+    ds.put(schedule)
+
+    assert _scheduler(ds, sink).run_pending(NOW) == 1
+    assert ds.get(schedule_key(ds, user.key.id))["U_Notify_At"] == "2026-01-06T11:58:00Z"
+
+
+def test_deleted_user_is_not_notified():
+    ds, sink = MemoryClient("test"), MemorySink()
+    user = _user(ds, Today_Time=rfc1123_gmt(NOW - timedelta(minutes=1)))
+    ds.delete(user.key)
+
+    assert _scheduler(ds, sink).run_pending(NOW) == 0
+    assert ds.get(schedule_key(ds, user.key.id)) is None
+
+    other = _user(ds, Today_Time=rfc1123_gmt(NOW - timedelta(minutes=1)))
+    unschedule_user(ds, other.key.id)
+    assert _scheduler(ds, sink).run_pending(NOW) == 0
+    assert sink.sent == []
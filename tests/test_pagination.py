@@ -0,0 +1,53 @@
+import pytest
+
+from utils.pagination import MAX_PAGE_SIZE
+
+
+def _walk(api, url, field, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = api("GET", f"{url}?limit={limit}" + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen += page[field]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen, pages
+
+
+@pytest.fixture
+def listed(make_user, make_art, make_gallery):
+    user_ids = [make_user(f"u{i}") for i in range(5)]
+    return {
+        "/users": ("Users", "U_ID", user_ids),
+        "/arts": ("Arts", "A_ID", [make_art(user_ids[0]) for _ in range(5)]),
+        "/galleries": ("Galleries", "G_ID", [make_gallery(user_ids[0]) for _ in range(5)]),
+    }
+
+
+@pytest.mark.parametrize("url", ["/users", "/arts", "/galleries"])
+def test_cursor_walks_every_entity_once(api, listed, url):
+    field, id_field, ids = listed[url]
+    seen, pages = _walk(api, url, field, 2)
+    assert [item[id_field] for item in seen] == ids and pages == 3
+    # Mini objects link to the full entity
+    assert seen[0]["self"].endswith(f"{url}/{ids[0]}")
+
+
+@pytest.mark.parametrize("url", ["/users", "/arts", "/galleries"])
+def test_offset_still_works(api, listed, url):
+    field, id_field, ids = listed[url]
+    page = api("GET", f"{url}?limit=2&offset=3").get_json()
+    assert [item[id_field] for item in page[field]] == ids[3:5]
+
+
+def test_limit_is_capped(api, make_user):
+    for i in range(MAX_PAGE_SIZE + 1):
+        make_user(f"u{i}")
+    page = api("GET", f"/users?limit={MAX_PAGE_SIZE * 10}").get_json()
+    assert len(page["Users"]) == MAX_PAGE_SIZE and page["next_cursor"] is not None
+
+
+@pytest.mark.parametrize("query", ["cursor=%21%21", "cursor=bm90IGpzb24", "limit=-1", "offset=-1"])
+def test_bad_page_arguments_are_rejected(api, make_user, query):
+    make_user()
+    assert api("GET", f"/users?{query}").status_code == 400
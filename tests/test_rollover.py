@@ -0,0 +1,52 @@
+from itertools import chain, repeat
+
+from users import rollover
+from users.repo import USER_KIND, get_user
+
+
+def test_rollover_sets_today_time_on_every_user(api, ds, make_user):
+    ids = [make_user(f"u{i}") for i in range(5)]
+    resp = api("PATCH", "/users", {"request_method": "automatically"})
+    assert resp.status_code == 200
+    assert resp.headers["X-Rollover-Processed"] == "5"
+    assert resp.headers["X-Rollover-Complete"] == "true"
+    assert resp.get_json()["U_ID"] == ids[0]
+    assert all(ds.get(ds.key(USER_KIND, i))["Today_Time"] for i in ids)
+
+
+def test_rollover_is_triggered_automatically_only(api):
+    assert api("PATCH", "/users", {"request_method": "manually"}).status_code == 400
+    assert api("PATCH", "/users", {"request_method": "automatically", "cursor": 5}).status_code == 400
+
+
+def test_rollover_keeps_changes_made_after_the_page_was_listed(ds, make_user, monkeypatch):
+    user_id = make_user()
+    list_user_ids = rollover.list_user_ids
+
+    # Another request changes the user between the page read and the chunk write
+    def listed_then_changed(*args, **kwargs):
+        page = list_user_ids(*args, **kwargs)
+        with ds.transaction():
+            user = ds.get(ds.key(USER_KIND, user_id))
+            user["Art_Count"] = 7
+            ds.put(user)
+        return page
+
+    monkeypatch.setattr(rollover, "list_user_ids", listed_then_changed)
+    rollover.rollover_today_times(ds, time_budget=None)
+    stored = ds.get(ds.key(USER_KIND, user_id))
+    assert stored["Art_Count"] == 7 and stored["Today_Time"]
+
+
+def test_rollover_resumes_from_its_cursor(ds, make_user, monkeypatch):
+    ids = [make_user(f"u{i}") for i in range(5)]
+    # The budget runs out after the first page
+    clock = chain([0.0, 0.0, 0.0], repeat(100.0))
+    monkeypatch.setattr(rollover.time, "monotonic", lambda: next(clock))
+    first = rollover.rollover_today_times(ds, page_size=2, time_budget=10.0)
+    assert not first.complete and first.cursor is not None and first.processed == 2
+    assert first.first_user.key.id == ids[0]
+
+    report = rollover.rollover_today_times(ds, start_cursor=first.cursor, page_size=2, time_budget=None)
+    assert report.complete and report.processed == 3
+    assert all(get_user(ds, i)["Today_Time"] for i in ids)
@@ -0,0 +1,82 @@
+import logging
+import os
+import runpy
+import threading
+from types import SimpleNamespace
+
+from app import create_app, shutdown, warm_up
+from storage import MemoryClient, lazy
+from storage.lazy import LazyClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Closing(MemoryClient):
+    def __init__(self):
+        super().__init__("test")
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_lazy_client_is_built_once_per_process(monkeypatch):
+    built = []
+    client = LazyClient(lambda: built.append(_Closing()) or built[-1])
+    assert built == []
+
+    threads = [threading.Thread(target=client.key, args=("User", 1)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+
+    # A forked worker builds its own instead of sharing the parent's channel
+    monkeypatch.setattr(lazy.os, "getpid", lambda: -1)
+    client.key("User", 1)
+    assert len(built) == 2 and client.get_client() is built[1]
+
+    client.close()
+    assert built[1].closed and not built[0].closed
+
+
+def test_close_in_a_forked_child_leaves_the_parents_client(monkeypatch):
+    built = _Closing()
+    client = LazyClient(lambda: built)
+    client.get_client()
+    monkeypatch.setattr(lazy.os, "getpid", lambda: -1)
+    client.close()
+    assert not built.closed
+
+
+def test_shutdown_runs_hooks_and_closes_storage(caplog):
+    ds = _Closing()
+    app = create_app(ds)
+    ran = []
+    app.extensions.setdefault("bearsty.on_shutdown", []).extend([lambda: 1 / 0, lambda: ran.append(True)])
+    with caplog.at_level(logging.ERROR, logger="app"):
+        shutdown(app)
+    assert ran == [True] and ds.closed
+    assert "Shutdown hook failed" in caplog.text
+
+
+def test_warm_up_survives_a_storage_failure(caplog, monkeypatch):
+    ds = MemoryClient("test")
+    monkeypatch.setattr(ds, "get", lambda key: 1 / 0)
+    with caplog.at_level(logging.ERROR, logger="app"):
+        warm_up(create_app(ds))
+    assert "Storage warm-up failed" in caplog.text
+
+
+def test_gunicorn_hooks(monkeypatch):
+    config = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+    assert config["preload_app"] and config["worker_class"] == "gthread"
+
+    calls = []
+    monkeypatch.setattr("app.warm_up", lambda app: calls.append(("warm_up", app)))
+    monkeypatch.setattr("app.shutdown", lambda app: calls.append(("shutdown", app)))
+    worker = SimpleNamespace(wsgi=object())
+    config["post_worker_init"](worker)
+    config["worker_exit"](None, worker)
+    assert calls == [("warm_up", worker.wsgi), ("shutdown", worker.wsgi)]
@@ -0,0 +1,160 @@
+import threading
+
+import pytest
+from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from storage import MemoryClient, SqliteClient
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryClient("test")
+        return
+    client = SqliteClient(str(tmp_path / "store.db"), project="test")
+    yield client
+    client.close()
+
+
+def _put(store, kind, parent=None, **props):
+    key = store.key(*(parent.flat_path if parent else ()), kind)
+    e = datastore.Entity(key=key)
+    e.update(props)
+    store.put(e)
+    return e
+
+
+def _ids(entities):
+    return [e.key.id for e in entities]
+
+
+def test_put_get_delete(store):
+    e = _put(store, "Art", A_Title="t", A_Image=b"\x00\x01", tags=["a", "b"])
+    assert not e.key.is_partial
+    got = store.get(e.key)
+    assert got == {"A_Title": "t", "A_Image": b"\x00\x01", "tags": ["a", "b"]}
+
+    missing = []
+    assert _ids(store.get_multi([e.key, store.key("Art", 999)], missing=missing)) == [e.key.id]
+    assert [m.key.id for m in missing] == [999]
+
+    store.delete(e.key)
+    assert store.get(e.key) is None
+
+
+def test_query_filters_and_order(store):
+    a = _put(store, "Art", n=3, public=True, tags=["x"], User={"U_ID": 1})
+    b = _put(store, "Art", n=1, public=False, tags=["x", "y"], User={"U_ID": 2})
+    c = _put(store, "Art", n=2, public=True, tags=["y"], User={"U_ID": 1})
+    _put(store, "Gallery", n=0)
+
+    def run(*filters, order=()):
+        q = store.query(kind="Art", order=order)
+        for f in filters:
+            q.add_filter(filter=f)
+        return _ids(q.fetch())
+
+    assert run(order=["n"]) == _ids([b, c, a])
+    assert run(order=["-n"]) == _ids([a, c, b])
+    assert run(PropertyFilter("public", "=", True), order=["n"]) == _ids([c, a])
+    assert run(PropertyFilter("n", ">=", 2), order=["n"]) == _ids([c, a])
+    assert run(PropertyFilter("tags", "=", "y"), order=["n"]) == _ids([b, c])  # any list element
+    assert run(PropertyFilter("User.U_ID", "=", 1), order=["n"]) == _ids([c, a])  # embedded entity
+    assert run(PropertyFilter("n", "IN", [1, 3]), order=["n"]) == _ids([b, a])
+
+
+def test_ancestor_query_and_keys_only(store):
+    art = _put(store, "Art", n=0)
+    other = _put(store, "Art", n=1)
+    first = _put(store, "Comment", parent=art.key, n=2)
+    second = _put(store, "Comment", parent=art.key, n=1)
+    _put(store, "Comment", parent=other.key, n=0)
+
+    q = store.query(kind="Comment", ancestor=art.key, order=["n"])
+    assert _ids(q.fetch()) == _ids([second, first])
+
+    q.keys_only()
+    keys_only = list(q.fetch())
+    assert _ids(keys_only) == _ids([second, first]) and all(not e for e in keys_only)
+
+
+def test_cursor_pages_cover_every_entity_once(store):
+    # Ties on n are broken by key, so a cursor never skips or repeats equal values
+    made = [_put(store, "User", n=i % 3) for i in range(7)]
+    seen, cursor = [], None
+    while True:
+        it = store.query(kind="User", order=["n"]).fetch(limit=3, start_cursor=cursor)
+        page = list(next(it.pages))
+        seen += _ids(page)
+        cursor = it.next_page_token
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(_ids(made)) and len(seen) == 7
+    assert [store.get(store.key("User", i))["n"] for i in seen] == sorted(e["n"] for e in made)
+
+    assert _ids(store.query(kind="User", order=["n"]).fetch(limit=2, offset=5)) == seen[5:7]
+    with pytest.raises(ValueError):
+        list(store.query(kind="User").fetch(start_cursor="not a cursor"))
+
+
+def test_transaction_commits_atomically(store):
+    e = _put(store, "User", n=1)
+    with store.transaction():
+        got = store.get(e.key)
+        got["n"] += 1
+        store.put(got)
+        new = _put(store, "User", n=9)
+        # Writes are buffered until commit
+        assert store.get(e.key)["n"] == 1
+    assert store.get(e.key)["n"] == 2
+    assert store.get(new.key)["n"] == 9
+
+
+def test_transaction_rolls_back_on_exception(store):
+    e = _put(store, "User", n=1)
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.put(datastore.Entity(key=e.key))
+            store.delete(e.key)
+            raise RuntimeError
+    assert store.get(e.key) == {"n": 1}
+    # The store is usable afterwards, inside and outside transactions
+    with store.transaction():
+        store.delete(e.key)
+    assert store.get(e.key) is None
+
+
+def _increment(store, key, read, release):
+    with store.transaction():
+        n = store.get(key)["n"]
+        read.set()
+        release.wait(5)
+        e = datastore.Entity(key=key)
+        e["n"] = n + 1
+        store.put(e)
+
+
+def test_transactions_of_two_processes_serialize(tmp_path):
+    # Two clients on one file, as two pre-fork workers: the second transaction cannot read
+    # until the first has committed, so neither increment is lost
+    path = str(tmp_path / "shared.db")
+    first, second = SqliteClient(path, project="test"), SqliteClient(path, project="test")
+    key = _put(first, "User", n=0).key
+
+    read, release, never = threading.Event(), threading.Event(), threading.Event()
+    never.set()
+    t1 = threading.Thread(target=_increment, args=(first, key, read, release))
+    t1.start()
+    read.wait(5)
+    second_read = threading.Event()
+    t2 = threading.Thread(target=_increment, args=(second, key, second_read, never))
+    t2.start()
+    assert not second_read.wait(0.3)
+    release.set()
+    t1.join(5)
+    t2.join(5)
+
+    assert second.get(key)["n"] == 2
+    first.close()
+    second.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from arts import routes
+from arts.strokes import CanvasSessions
+from contracts import ApiContractViolation
+from users.repo import USER_KIND, get_user
+
+
+def _canvas_art(api, user_id):
+    return api("POST", "/arts", {"A_Title": "t", "A_Image": "", "A_Is_Public": True, "User": {"U_ID": user_id}, "A_Comments": []}).get_json()["A_ID"]
+
+
+def _strokes(api, art_id, strokes=(), end=False):
+    body = {"Strokes": [list(s) for s in strokes]}
+    if end:
+        body["End"] = True
+    return api("POST", f"/arts/{art_id}/strokes", body)
+
+
+def test_strokes_are_painted_and_saved_on_end(api, make_user):
+    art_id = _canvas_art(api, make_user())
+    resp = _strokes(api, art_id, [(0, 0, "#ff0000"), (1, 0, "#00ff00")])
+    assert resp.status_code == 200
+    assert resp.get_json() | {"A_ID": art_id} == {
+        "A_ID": art_id, "Applied": 2, "Changed": 2, "Pending": 2, "Pixels_Used": 2, "Pixels_Remaining": 8,
+    }
+
+    done = _strokes(api, art_id, end=True).get_json()
+    assert done["Pending"] == 0 and done["A_Image"]
+    assert api("GET", f"/arts/{art_id}/image").status_code == 200
+
+
+def test_invalid_strokes_are_rejected(api, make_user):
+    art_id = _canvas_art(api, make_user())
+    assert _strokes(api, art_id, [(64, 0, "#ff0000")]).status_code == 400
+    assert _strokes(api, art_id, [(0, 0, "red")]).status_code == 400
+    assert _strokes(api, 999999, [(0, 0, "#ff0000")]).status_code == 404
+
+
+def test_pixel_budget_is_kept_on_the_stored_user(api, ds, make_user):
+    user_id = make_user()
+    art_id = _canvas_art(api, user_id)
+    assert _strokes(api, art_id, [(x, 0, "#ff0000") for x in range(8)]).status_code == 200
+    assert ds.get(ds.key(USER_KIND, user_id))["Pixels_Used"] == 8
+
+    resp = _strokes(api, art_id, [(x, 1, "#ff0000") for x in range(3)])
+    assert resp.status_code == 403
+    assert ds.get(ds.key(USER_KIND, user_id))["Pixels_Used"] == 8
+
+
+def test_pixel_budget_holds_across_workers(api, ds, make_user):
+    user_id = make_user()
+    art_ids = [_canvas_art(api, user_id), _canvas_art(api, user_id)]
+    # Two workers, each with its own sessions, drawing for the same user
+    workers = [CanvasSessions(ds), CanvasSessions(ds)]
+    strokes = [(x, 0, 0xff0000) for x in range(6)]
+
+    owner = get_user(ds, user_id)
+    arts = [ds.get(ds.key("Art", art_id)) for art_id in art_ids]
+    assert workers[0].apply(arts[0], owner, strokes).pixels_used == 6
+    with pytest.raises(ApiContractViolation) as e:
+        workers[1].apply(arts[1], owner, strokes)
+    assert e.value.status == 403
+    assert ds.get(ds.key(USER_KIND, user_id))["Pixels_Used"] == 6
+
+
+def test_end_after_the_art_was_deleted_is_not_found(api, ds, make_user, monkeypatch):
+    art_id = _canvas_art(api, make_user())
+    _strokes(api, art_id, [(0, 0, "#ff0000")])
+
+    # The art goes away between the request's first read and the response
+    reads = iter([routes.repo_get_art(ds, art_id)])
+    monkeypatch.setattr(routes, "repo_get_art", lambda ds, art_id: next(reads, None))
+    assert _strokes(api, art_id, end=True).status_code == 404
@@ -0,0 +1,66 @@
+import base64
+import struct
+import zlib
+
+import pytest
+
+from arts import thumbnails
+from arts.png import SIGNATURE, decode_png, encode_png
+from storage.blobs import get_blob_store
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def _png(width: int, height: int, idat: bytes, *, ihdr: bytes | None = None) -> bytes:
+    ihdr = ihdr if ihdr is not None else struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return SIGNATURE + _chunk(b"IHDR", ihdr) + _chunk(b"IDAT", idat) + _chunk(b"IEND", b"")
+
+
+RGB = bytes([255, 0, 0, 0, 255, 0, 0, 0, 255, 255, 255, 255])
+
+
+def test_round_trip():
+    assert decode_png(encode_png(2, 2, RGB)) == (2, 2, RGB)
+
+
+@pytest.mark.parametrize("data", [
+    _png(2, 2, b"not zlib at all"),                                    # zlib.error
+    _png(2, 2, zlib.compress(b"\0" * 3)),                              # truncated pixel data
+    _png(2, 2, b"", ihdr=b"\0\0\0\2"),                                 # struct.error in IHDR
+    _png(100_000, 100_000, zlib.compress(b"")),                        # oversized header
+])
+def test_corrupt_or_oversized_png_is_rejected(data):
+    with pytest.raises(ValueError):
+        decode_png(data)
+
+
+def test_inflates_only_what_the_header_needs():
+    bomb = _png(2, 2, zlib.compress(b"\0" * 50_000_000, 9))
+    assert len(bomb) < 100_000
+    assert decode_png(bomb) == (2, 2, b"\0" * 12)
+
+
+def test_corrupt_png_is_marked_unsupported_once(monkeypatch):
+    digest = get_blob_store().put(_png(2, 2, b"not zlib at all"))
+    renderer = thumbnails.get_thumbnail_renderer()
+    calls = []
+    render = thumbnails.render_blob
+    monkeypatch.setattr(thumbnails, "render_blob", lambda *a: calls.append(a) or render(*a))
+
+    assert renderer.get(digest, "image/png", 64) is None
+    assert renderer.cache.get(digest, 64) == b""
+    assert renderer.get(digest, "image/png", 64) is None
+    assert len(calls) == 1
+
+
+def test_thumbnail_route(api, client, make_user):
+    image = "data:image/png;base64," + base64.b64encode(encode_png(2, 2, RGB)).decode()
+    art = api("POST", "/arts", {"A_Title": "t", "A_Image": image, "A_Is_Public": True, "User": {"U_ID": make_user()}, "A_Comments": []}).get_json()
+
+    resp = client.get(f"/arts/{art['A_ID']}/thumbnail?size=64")
+    assert resp.status_code == 200 and resp.content_type == "image/png"
+    assert decode_png(resp.data)[:2] == (64, 64)
+    assert client.get(f"/arts/{art['A_ID']}/thumbnail?size=65").status_code == 400
+    assert client.get("/arts/999999/thumbnail").status_code == 404
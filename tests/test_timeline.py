@@ -0,0 +1,87 @@
+import logging
+
+import pytest
+
+from users import timeline
+from users.repo import USER_KIND
+
+
+@pytest.fixture(autouse=True)
+def inline_fan_out(monkeypatch):
+    monkeypatch.setattr(timeline, "TIMELINE_FANOUT_THREADS", 0)
+    timeline._pull_authors.clear()
+
+
+def _timeline(api, user_id, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return api("GET", f"/users/{user_id}/timeline?{query}").get_json()
+
+
+def _ids(page):
+    return [a["A_ID"] for a in page["Arts"]]
+
+
+def _follow(api, reader, author):
+    assert api("PATCH", f"/users/{reader}/users/{author}").status_code == 200
+
+
+# The bucket an art was fanned out to
+def _day_of(ds, art_id):
+    return ds.get(ds.key("Art", art_id))["A_Modified_Date"][:10]
+
+
+def test_friends_public_arts_are_fanned_out(api, ds, make_user, make_art):
+    reader, author, stranger = make_user("r"), make_user("a"), make_user("s")
+    _follow(api, reader, author)
+    arts = [make_art(author) for _ in range(3)]
+    make_art(author, public=False)
+    make_art(stranger)
+
+    assert _ids(_timeline(api, reader)) == arts[::-1]
+    assert _timeline(api, author)["Arts"] == []
+    assert ds.get(timeline.bucket_key(ds, reader, _day_of(ds, arts[0])))
+
+
+def test_publishing_a_private_art_fans_it_out(api, make_user, make_art):
+    reader, author = make_user("r"), make_user("a")
+    _follow(api, reader, author)
+    art_id = make_art(author, public=False)
+    assert _ids(_timeline(api, reader)) == []
+    api("PATCH", f"/arts/{art_id}", {"A_Is_Public": True})
+    assert _ids(_timeline(api, reader)) == [art_id]
+
+
+def test_hidden_or_deleted_arts_are_dropped_on_read(api, make_user, make_art):
+    reader, author = make_user("r"), make_user("a")
+    _follow(api, reader, author)
+    hidden, deleted, kept = make_art(author), make_art(author), make_art(author)
+    api("PATCH", f"/arts/{hidden}", {"A_Is_Public": False})
+    api("DELETE", f"/arts/{deleted}")
+    assert _ids(_timeline(api, reader)) == [kept]
+
+
+def test_timeline_pages_with_a_cursor(api, make_user, make_art):
+    reader, author = make_user("r"), make_user("a")
+    _follow(api, reader, author)
+    arts = [make_art(author) for _ in range(5)]
+    first = _timeline(api, reader, limit=2)
+    second = _timeline(api, reader, limit=3, cursor=first["next_cursor"])
+    assert _ids(first) + _ids(second) == arts[::-1] and second["next_cursor"] is None
+    assert api("GET", f"/users/{reader}/timeline?cursor=bm9waXBl").status_code == 400
+    assert api("GET", "/users/999999/timeline").status_code == 404
+
+
+def test_popular_authors_are_merged_on_read(api, ds, make_user, make_art, monkeypatch, caplog):
+    monkeypatch.setattr(timeline, "TIMELINE_FANOUT_LIMIT", 1)
+    author = make_user("a")
+    readers = [make_user(f"r{i}") for i in range(2)]
+    for reader in readers:
+        _follow(api, reader, author)
+
+    with caplog.at_level(logging.INFO, logger="users.timeline"):
+        art_id = make_art(author)
+    assert ds.get(ds.key(USER_KIND, author))["U_Fanout_On_Read"] is True
+    assert ds.get(timeline.bucket_key(ds, readers[0], _day_of(ds, art_id))) is None
+    assert "timelines now read their arts" in caplog.text
+    for reader in readers:
+        assert _ids(_timeline(api, reader)) == [art_id]
@@ -0,0 +1,76 @@
+import threading
+
+from arts.repo import count_user_arts, create_art_entity
+from users.migrate import migrate_all
+from users.repo import USER_KIND, seed_user_counts
+from utils.cache import cache_invalidate
+
+
+def _counts(api, user_id):
+    user = api("GET", f"/users/{user_id}").get_json()
+    return user["Arts"]["Count"], user["Galleries"]["Count"]
+
+
+def test_counts_follow_creates_and_deletes(api, make_user, make_art, make_gallery):
+    user_id = make_user()
+    art_ids = [make_art(user_id) for _ in range(3)]
+    make_gallery(user_id)
+    assert _counts(api, user_id) == (3, 1)
+
+    assert api("DELETE", f"/arts/{art_ids[0]}").status_code == 204
+    assert _counts(api, user_id) == (2, 1)
+
+
+def test_user_arts_and_galleries_are_paginated(api, make_user, make_art, make_gallery):
+    user_id, other = make_user("a"), make_user("b")
+    art_ids = {make_art(user_id) for _ in range(5)}
+    make_art(other)
+    gallery_id = make_gallery(user_id)
+
+    first = api("GET", f"/users/{user_id}/arts?limit=3").get_json()
+    second = api("GET", f"/users/{user_id}/arts?limit=3&cursor={first['next_cursor']}").get_json()
+    assert len(first["Arts"]) == 3 and second["next_cursor"] is None
+    assert {a["A_ID"] for a in first["Arts"] + second["Arts"]} == art_ids
+
+    galleries = api("GET", f"/users/{user_id}/galleries").get_json()
+    assert [g["G_ID"] for g in galleries["Galleries"]] == [gallery_id]
+    assert api("GET", "/users/999999/arts").status_code == 404
+    assert api("GET", f"/users/{user_id}/arts?cursor=bogus").status_code == 400
+
+
+def _forget_counts(ds, user_id):
+    user = ds.get(ds.key(USER_KIND, user_id))
+    del user["Art_Count"], user["Gallery_Count"]
+    ds.put(user)
+    cache_invalidate(USER_KIND, user_id)
+
+
+def test_migration_seeds_users_without_counts(api, ds, make_user, make_art, make_gallery):
+    legacy, _ = make_user("a"), make_user("b")
+    make_art(legacy)
+    make_art(legacy)
+    make_gallery(legacy)
+    _forget_counts(ds, legacy)
+    assert _counts(api, legacy) == (0, 0)
+
+    assert migrate_all(ds, page_size=1) == (2, 1)
+    assert ds.get(ds.key(USER_KIND, legacy))["Art_Count"] == 2
+    assert ds.get(ds.key(USER_KIND, legacy))["Gallery_Count"] == 1
+    assert migrate_all(ds) == (2, 0)
+
+
+def test_art_created_while_counting_is_counted_once(ds, make_user, make_art):
+    user_id = make_user()
+    make_art(user_id)
+    _forget_counts(ds, user_id)
+    writer = threading.Thread(target=create_art_entity, args=(ds, {"A_Title": "t", "User": {"U_ID": user_id}}))
+
+    # Another request creates an art while the migration is counting
+    def count_while_creating(ds, user_id):
+        writer.start()
+        writer.join(0.2)
+        return count_user_arts(ds, user_id)
+
+    seed_user_counts(ds, user_id, {"Art_Count": count_while_creating})
+    writer.join(5)
+    assert ds.get(ds.key(USER_KIND, user_id))["Art_Count"] == count_user_arts(ds, user_id) == 2
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Iterable
+
+from storage import StorageClient
+
+# In-memory adjacency index over U_Friends (one-way: user -> the users they added). Each
+# user's friends are held as a sorted array of ids, so membership is a binary search and
+# mutual friends a linear merge. U_Friends on the User entity stays the stored copy: entries
+# are loaded from it in one batch lookup on a miss, updated in place by add_friend /
+# remove_friend in this process, and expire after FRIEND_GRAPH_TTL seconds so changes made
+# by other worker processes are picked up.
+#
+#   FRIEND_GRAPH_SIZE   users kept in memory (least recently used are dropped)
+#   FRIEND_GRAPH_TTL    seconds an entry is trusted
+
+FRIEND_GRAPH_SIZE = int(os.getenv("FRIEND_GRAPH_SIZE", "100000"))
+FRIEND_GRAPH_TTL = float(os.getenv("FRIEND_GRAPH_TTL", "300"))
+MAX_SUGGESTION_HOPS = 500  # friends whose friends are considered for suggestions
+
+_EMPTY = array("q")
+
+
+def _sorted_ids(ids: Iterable[int]) -> array:
+    return array("q", sorted(set(ids)))
+
+
+def intersect(a: array, b: array) -> list[int]:
+    if len(a) > len(b):
+        a, b = b, a
+    # A small list against a large one: binary search per element beats a full merge
+    if len(a) * 8 < len(b):
+        out = []
+        for x in a:
+            i = bisect_left(b, x)
+            if i < len(b) and b[i] == x:
+                out.append(x)
+        return out
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            out.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def contains(ids: array, x: int) -> bool:
+    i = bisect_left(ids, x)
+    return i < len(ids) and ids[i] == x
+
+
+class FriendGraph:
+    def __init__(self, *, maxsize: int = FRIEND_GRAPH_SIZE, ttl: float = FRIEND_GRAPH_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._adjacency = OrderedDict()  # user id -> (expires_at, sorted friend ids)
+        self._lock = threading.Lock()
+
+    # Friend ids of each user, loading the ones not in memory with one batch lookup. Users
+    # that do not exist are absent from the result.
+    def friends_of(self, ds: StorageClient, user_ids: Iterable[int]) -> dict[int, array]:
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for uid in dict.fromkeys(user_ids):
+                item = self._adjacency.get(uid)
+                if item is None or item[0] < now:
+                    missing.append(uid)
+                else:
+                    self._adjacency.move_to_end(uid)
+                    found[uid] = item[1]
+        if missing:
+            from users.repo import get_users
+
+            for uid, user in get_users(ds, missing).items():
+                found[uid] = self.set(uid, user.get("U_Friends", []) or [])
+        return found
+
+    def friends(self, ds: StorageClient, user_id: int) -> array:
+        return self.friends_of(ds, [user_id]).get(user_id, _EMPTY)
+
+    # Called after U_Friends is written
+    def set(self, user_id: int, friend_ids: Iterable[int]) -> array:
+        ids = _sorted_ids(friend_ids)
+        with self._lock:
+            self._adjacency[user_id] = (time.monotonic() + self.ttl, ids)
+            self._adjacency.move_to_end(user_id)
+            while len(self._adjacency) > self.maxsize:
+                self._adjacency.popitem(last=False)
+        return ids
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._adjacency.pop(user_id, None)
+
+    def are_friends(self, ds: StorageClient, user_id: int, friend_id: int) -> bool:
+        return contains(self.friends(ds, user_id), friend_id)
+
+    def degree(self, ds: StorageClient, user_id: int) -> int:
+        return len(self.friends(ds, user_id))
+
+    # Users both have as friends, ascending by id
+    def mutual(self, ds: StorageClient, user_id1: int, user_id2: int) -> list[int]:
+        adjacency = self.friends_of(ds, [user_id1, user_id2])
+        return intersect(adjacency.get(user_id1, _EMPTY), adjacency.get(user_id2, _EMPTY))
+
+    # Friends of friends the user hasn't added yet, as (user id, number of the user's friends
+    # who have them), most shared first. One batch lookup for friends not in memory.
+    def suggestions(self, ds: StorageClient, user_id: int, *, limit: int) -> list[tuple[int, int]]:
+        friends = self.friends(ds, user_id)
+        counts = Counter()
+        for ids in self.friends_of(ds, friends[:MAX_SUGGESTION_HOPS]).values():
+            counts.update(ids)
+        del counts[user_id]
+        for fid in friends:
+            counts.pop(fid, None)
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_friend_graph() -> FriendGraph:
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = FriendGraph()
+    return _graph
+
+
+def set_friend_graph(graph: FriendGraph) -> None:
+    global _graph
+    _graph = graph
@@ -0,0 +1,52 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from arts.repo import count_user_arts
+from galleries.repo import count_user_galleries
+from users.repo import list_users, seed_user_counts
+
+logger = logging.getLogger(__name__)
+
+# One-shot backfill of Art_Count / Gallery_Count for users created before the counters
+# existed. Create and delete keep them in step from then on; until this has run, such users
+# show a count of 0. Users that already have both are skipped, so it is safe to re-run, and
+# it can run while the API takes writes: each user's counts are taken and stored in one
+# transaction.
+#
+#   python -m users.migrate
+
+
+def migrate_all(ds, *, page_size: int = 200) -> tuple[int, int]:
+    seen = seeded = 0
+    cursor = None
+    while True:
+        users, cursor = list_users(ds, limit=page_size, cursor=cursor)
+        for user in users:
+            seen += 1
+            if "Art_Count" in user and "Gallery_Count" in user:
+                continue
+            seed_user_counts(ds, user.key.id, {"Art_Count": count_user_arts, "Gallery_Count": count_user_galleries})
+            seeded += 1
+        if cursor is None:
+            break
+    return seen, seeded
+
+
+def main(argv=None) -> int:
+    from config import init_storage_client
+
+    p = argparse.ArgumentParser(prog="python -m users.migrate", description="Count arts and galleries for users that predate the counters.")
+    p.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    started = time.monotonic()
+    seen, seeded = migrate_all(init_storage_client())
+    logger.info("Seeded counts for %d of %d users in %.1fs", seeded, seen, time.monotonic() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+import argparse
+import heapq
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Mapping, Protocol
+
+from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from storage import StorageClient
+from users.repo import USER_KIND
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Daily notification scheduler. Each user's next due time is kept as U_Notify_At (ISO 8601
+# UTC, so it sorts as a string) on a NotificationSchedule entity with the user's id:
+# Custom_Time_Alarm's time of day when Is_Custom_Time is set, otherwise the Today_Time stamped
+# by the daily rollover. The schedule is kept off the User so that only the writers of those
+# times (user creation, the rollover) and the scheduler ever write it; a user write from a
+# stale copy (friends, counters) cannot put back a due time that was already claimed. That
+# property is the persistent index; the scheduler keeps only the next NOTIFY_LOOKAHEAD
+# seconds of it in memory, as a heap of at most NOTIFY_WINDOW (due, user) pairs, so memory
+# stays bounded however many users there are.
+#
+# Sending is split in two so a restart neither skips nor repeats a notification:
+#   claim     in one transaction per chunk, checks the user is still due at that time,
+#             records U_Last_Notified, moves U_Notify_At to the next occurrence and writes
+#             a Notification outbox entity named "<user id>:<due time>"
+#   dispatch  hands pending outbox entities to the sink in batches and deletes them once
+#             the sink has accepted them
+# A crash between the two leaves the outbox in place and it is sent on the next pass. The
+# id is deterministic, so a sink that deduplicates on it sees each notification once.
+# Several scheduler processes can run against the same store; the claim transaction makes
+# sure only one of them takes a given user.
+#
+#   NOTIFY_SINK         log (default), memory or webhook
+#   NOTIFY_WEBHOOK_URL  where the webhook sink POSTs each batch
+#   NOTIFY_BATCH        notifications per sink call
+#   NOTIFY_LOOKAHEAD    seconds of upcoming due times held in memory
+#   NOTIFY_WINDOW       max entries held in memory
+#   NOTIFY_MAX_DELAY    seconds after which a missed notification is dropped, not sent
+
+NOTIFICATION_KIND = "Notification"
+SCHEDULE_KIND = "NotificationSchedule"
+NOTIFY_BATCH = int(os.getenv("NOTIFY_BATCH", "500"))
+NOTIFY_LOOKAHEAD = float(os.getenv("NOTIFY_LOOKAHEAD", "60"))
+NOTIFY_WINDOW = int(os.getenv("NOTIFY_WINDOW", "50000"))
+NOTIFY_MAX_DELAY = float(os.getenv("NOTIFY_MAX_DELAY", str(12 * 3600)))
+CLAIM_CHUNK = 200  # schedules per claim transaction; each also writes one outbox entity
+
+_RFC1123 = "%a, %d %b %Y %H:%M:%S GMT"
+_ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _parse_gmt(value) -> datetime | None:
+    try:
+        return datetime.strptime(value, _RFC1123).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime(_ISO)
+
+
+def _from_iso(value: str) -> datetime:
+    return datetime.strptime(value, _ISO).replace(tzinfo=timezone.utc)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+# -------------------------
+# Index maintenance
+# -------------------------
+
+def schedule_key(ds: StorageClient, user_id: int) -> datastore.Key:
+    return ds.key(SCHEDULE_KIND, user_id)
+
+
+# The user's next due time after their last notification (and not before not_before), or
+# None if there is nothing to send until the next rollover
+def next_notification(user: Mapping, last: str = "", *, not_before: datetime | None = None) -> str | None:
+    if user.get("Is_Custom_Time"):
+        alarm = _parse_gmt(user.get("Custom_Time_Alarm"))
+        if alarm is None:
+            return None
+        after = _from_iso(last) if last else _utcnow()
+        if not_before is not None and not_before > after:
+            after = not_before
+        due = after.replace(hour=alarm.hour, minute=alarm.minute, second=alarm.second)
+        if due <= after:
+            due += timedelta(days=1)
+        return _iso(due)
+
+    today = _parse_gmt(user.get("Today_Time"))
+    if today is None:
+        return None
+    due = _iso(today)
+    return due if due > last else None
+
+
+# Points the users' schedules at their next due time; called wherever Today_Time or the
+# custom alarm is written, once the users are stored. Read and written in one transaction,
+# so a claim that commits in between is not undone. Schedules without U_Notify_At are not
+# in the index at all, so they are never scanned.
+def schedule_users(ds: StorageClient, users: list[datastore.Entity]) -> None:
+    keys = [schedule_key(ds, u.key.id) for u in users]
+    with ds.transaction():
+        stored = {s.key.id: s for s in ds.get_multi(keys)}
+        schedules = []
+        for user, key in zip(users, keys):
+            schedule = stored.get(user.key.id)
+            if schedule is None:
+                schedule = datastore.Entity(key=key)
+                # Users scheduled before the schedule moved off the User keep their last send
+                if user.get("U_Last_Notified"):
+                    schedule["U_Last_Notified"] = user["U_Last_Notified"]
+            _set_due(schedule, next_notification(user, schedule.get("U_Last_Notified") or ""))
+            schedules.append(schedule)
+        ds.put_multi(schedules)
+
+
+def unschedule_user(ds: StorageClient, user_id: int) -> None:
+    ds.delete(schedule_key(ds, user_id))
+
+
+def _set_due(schedule: datastore.Entity, due: str | None) -> None:
+    if due is None:
+        schedule.pop("U_Notify_At", None)
+    else:
+        schedule["U_Notify_At"] = due
+
+
+# -------------------------
+# Sinks
+# -------------------------
+
+class NotificationSink(Protocol):
+    # Raising leaves the batch in the outbox to be retried
+    def send(self, notifications: list[dict]) -> None: ...
+
+
+class LogSink:
+    def send(self, notifications: list[dict]) -> None:
+        for n in notifications:
+            logger.info("Notify user %d (due %s)", n["U_ID"], n["Due"])
+
+
+# Local stand-in that keeps what it was given; for tests and load runs
+class MemorySink:
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, notifications: list[dict]) -> None:
+        with self._lock:
+            self.sent.extend(notifications)
+
+
+class WebhookSink:
+    def __init__(self, url: str, *, timeout: float = 10.0):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, notifications: list[dict]) -> None:
+        resp = self._session.post(self.url, json={"Notifications": notifications}, timeout=self.timeout)
+        resp.raise_for_status()
+
+
+def init_notification_sink() -> NotificationSink:
+    kind = os.getenv("NOTIFY_SINK", "log").lower()
+    if kind == "log":
+        return LogSink()
+    if kind == "memory":
+        return MemorySink()
+    if kind == "webhook":
+        url = os.getenv("NOTIFY_WEBHOOK_URL", "")
+        if not url:
+            raise ValueError("NOTIFY_SINK=webhook needs NOTIFY_WEBHOOK_URL")
+        return WebhookSink(url)
+    raise ValueError(f"Unknown NOTIFY_SINK: {kind}")
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_notification_sink() -> NotificationSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = init_notification_sink()
+    return _sink
+
+
+def set_notification_sink(sink: NotificationSink) -> None:
+    global _sink
+    _sink = sink
+
+
+def notification_payload(n: datastore.Entity) -> dict:
+    return {"id": n.key.name, "U_ID": n["U_ID"], "Due": n["N_Due"]}
+
+
+# -------------------------
+# Scheduler
+# -------------------------
+
+class NotificationScheduler:
+    def __init__(
+        self, ds: StorageClient, sink: NotificationSink | None = None, *, batch: int = NOTIFY_BATCH,
+        lookahead: float = NOTIFY_LOOKAHEAD, window: int = NOTIFY_WINDOW, max_delay: float = NOTIFY_MAX_DELAY,
+    ):
+        self.ds = ds
+        self.sink = sink if sink is not None else get_notification_sink()
+        self.batch = batch
+        self.lookahead = lookahead
+        self.window = window
+        self.max_delay = max_delay
+        self._wheel = []  # heap of (due, user id)
+        self._reload_at = None
+        self._truncated = False  # the last load hit the window, so more is due than is held
+
+    # Reads the schedules due before now + lookahead, earliest first. Users already held are
+    # read again, so the heap also picks up schedules that changed since the last load.
+    def _load(self, now: datetime) -> None:
+        horizon = now + timedelta(seconds=self.lookahead)
+        query = self.ds.query(kind=SCHEDULE_KIND)
+        query.add_filter(filter=PropertyFilter("U_Notify_At", "<=", _iso(horizon)))
+        query.order = ["U_Notify_At"]
+        query.projection = ["U_Notify_At"]
+        schedules = list(query.fetch(limit=self.window))
+        self._wheel = [(s["U_Notify_At"], s.key.id) for s in schedules]
+        heapq.heapify(self._wheel)
+        self._truncated = len(schedules) >= self.window
+        self._reload_at = horizon if not self._truncated else now
+
+    # One pass: claims what is due now and dispatches the outbox. Returns notifications sent.
+    def run_pending(self, now: datetime | None = None) -> int:
+        now = now or _utcnow()
+        if self._reload_at is None or now >= self._reload_at or (self._truncated and not self._wheel):
+            self._load(now)
+        now_iso = _iso(now)
+        due = []
+        while self._wheel and self._wheel[0][0] <= now_iso:
+            due.append(heapq.heappop(self._wheel))
+        for start in range(0, len(due), CLAIM_CHUNK):
+            self._claim(due[start:start + CLAIM_CHUNK], now)
+        return self.dispatch()
+
+    # The User is only read, for its alarm times; the schedule is all that is written
+    def _claim(self, due: list[tuple[str, int]], now: datetime) -> None:
+        oldest = now - timedelta(seconds=self.max_delay)
+        outbox, gone, expired = [], [], 0
+        with self.ds.transaction():
+            keys = [schedule_key(self.ds, uid) for _, uid in due]
+            found = self.ds.get_multi(keys + [self.ds.key(USER_KIND, uid) for _, uid in due])
+            users = {e.key.id: e for e in found if e.key.kind == USER_KIND}
+            wanted = {uid: at for at, uid in due}
+            claimed = [
+                s for s in found
+                if s.key.kind == SCHEDULE_KIND and s.get("U_Notify_At") == wanted.get(s.key.id)
+            ]
+            for schedule in claimed:
+                user = users.get(schedule.key.id)
+                if user is None:
+                    gone.append(schedule.key)
+                    continue
+                at = schedule["U_Notify_At"]
+                if _from_iso(at) < oldest:
+                    expired += 1
+                else:
+                    n = datastore.Entity(key=self.ds.key(NOTIFICATION_KIND, f"{user.key.id}:{at}"))
+                    n.update({"U_ID": user.key.id, "N_Due": at, "N_Created": _iso(now)})
+                    outbox.append(n)
+                schedule["U_Last_Notified"] = at
+                _set_due(schedule, next_notification(user, at, not_before=oldest))
+            written = [s for s in claimed if s.key not in gone]
+            if written:
+                self.ds.put_multi(written + outbox)
+            # Users deleted without their schedule
+            if gone:
+                self.ds.delete_multi(gone)
+        if expired:
+            metrics.increment("notifications_expired", expired)
+            logger.warning("Dropped %d notifications more than %.0fs late", expired, self.max_delay)
+
+    # Sends the outbox, oldest first, one batch per sink call
+    def dispatch(self) -> int:
+        sent = 0
+        while True:
+            query = self.ds.query(kind=NOTIFICATION_KIND)
+            query.order = ["N_Due"]
+            pending = list(query.fetch(limit=self.batch))
+            if not pending:
+                return sent
+            self.sink.send([notification_payload(n) for n in pending])
+            self.ds.delete_multi([n.key for n in pending])
+            sent += len(pending)
+            metrics.increment("notifications_sent", len(pending))
+            if len(pending) < self.batch:
+                return sent
+
+    # Seconds until the next entry falls due or the next load, whichever is first
+    def idle_time(self, now: datetime | None = None) -> float:
+        now = now or _utcnow()
+        wake = self._reload_at or now
+        if self._wheel:
+            wake = min(wake, _from_iso(self._wheel[0][0]))
+        return max(0.0, (wake - now).total_seconds())
+
+    # Runs until stop is set. A failing pass (storage or sink) is logged and retried.
+    def run(self, stop: threading.Event) -> None:
+        backoff = 1.0
+        while not stop.is_set():
+            try:
+                self.run_pending()
+                backoff = 1.0
+                stop.wait(max(self.idle_time(), 0.05))
+            except Exception:
+                logger.exception("Notification pass failed; retrying in %.0fs", backoff)
+                stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+def main(argv=None) -> int:
+    from config import init_storage_client
+
+    p = argparse.ArgumentParser(prog="python -m users.notifications", description="Send daily notifications as they fall due.")
+    p.add_argument("--once", action="store_true", help="run one pass and exit (for cron)")
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    scheduler = NotificationScheduler(init_storage_client())
+    if args.once:
+        started = time.monotonic()
+        sent = scheduler.run_pending()
+        logger.info("Sent %d notifications in %.1fs", sent, time.monotonic() - started)
+        return 0
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        scheduler.run(stop)
+    except KeyboardInterrupt:
+        stop.set()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
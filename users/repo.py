@@ -1,37 +1,146 @@
+from typing import Callable, Iterable
+
 from google.cloud import datastore
 
+from storage import StorageClient
+from users.graph import get_friend_graph
+from utils.aio import to_async
+from utils.cache import cache_invalidate, cache_refresh, cached_get, cached_get_multi
+from utils.pagination import DEFAULT_PAGE_SIZE, fetch_page
+
 USER_KIND = "User"
 
-def create_user_entity(ds: datastore.Client, data: dict) -> datastore.Entity:
+def create_user_entity(ds: StorageClient, data: dict) -> datastore.Entity:
     key = ds.key(USER_KIND)
     user = datastore.Entity(key=key)
     user.update(data)
     ds.put(user)
+    cache_refresh(user)
     return user
 
-def get_user(ds: datastore.Client, user_id: int) -> datastore.Entity | None:
-    return ds.get(ds.key(USER_KIND, user_id))
+def get_user(ds: StorageClient, user_id: int) -> datastore.Entity | None:
+    return cached_get(ds, USER_KIND, user_id)
 
-def delete_user(ds: datastore.Client, user_id: int) -> bool:
+# Batch lookup; ids that do not exist are absent from the result
+def get_users(ds: StorageClient, user_ids: Iterable[int]) -> dict[int, datastore.Entity]:
+    return cached_get_multi(ds, USER_KIND, user_ids)
+
+def delete_user(ds: StorageClient, user_id: int) -> bool:
     key = ds.key(USER_KIND, user_id)
     if ds.get(key) is None:
         return False
     ds.delete(key)
+    cache_invalidate(USER_KIND, user_id)
+    get_friend_graph().discard(user_id)
     return True
 
-def list_users(ds: datastore.Client) -> list[datastore.Entity]:
+def list_users(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[datastore.Entity], str | None]:
     query = ds.query(kind=USER_KIND)
-    return list(query.fetch())
-
-def add_friend(ds: datastore.Client, user1: datastore.Entity, friend_id: int) -> None:
-    friends = user1.get("U_Friends", []) or []
-    if friend_id not in friends:
-        friends.append(friend_id)
-    user1["U_Friends"] = friends
-    ds.put(user1)
-
-def remove_friend(ds: datastore.Client, user1: datastore.Entity, friend_id: int) -> None:
-    friends = user1.get("U_Friends", []) or []
-    friends = [fid for fid in friends if fid != friend_id]  # remove all occurrences
-    user1["U_Friends"] = friends
-    ds.put(user1)
\ No newline at end of file
+    return fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+
+# Keys-only variant for callers that only need ids (mini responses): no property data is read
+def list_user_ids(
+    ds: StorageClient, *, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0, cursor: str | None = None
+) -> tuple[list[int], str | None]:
+    query = ds.query(kind=USER_KIND)
+    query.keys_only()
+    keys, next_cursor = fetch_page(query, limit=limit, offset=offset, cursor=cursor)
+    return [e.key.id for e in keys], next_cursor
+
+# Friend changes read and write the user inside one transaction, so the check runs against
+# the stored U_Friends (not a cached or per-process copy) and no other property is put back
+# stale. Each returns the stored user and whether it changed; (None, False) if it is gone.
+def add_friend(ds: StorageClient, user_id: int, friend_id: int) -> tuple[datastore.Entity | None, bool]:
+    with ds.transaction():
+        user = ds.get(ds.key(USER_KIND, user_id))
+        if user is None:
+            return None, False
+        friends = user.get("U_Friends", []) or []
+        if friend_id in friends:
+            return user, False
+        user["U_Friends"] = friends + [friend_id]
+        ds.put(user)
+    cache_refresh(user)
+    get_friend_graph().set(user_id, user["U_Friends"])
+    return user, True
+
+def remove_friend(ds: StorageClient, user_id: int, friend_id: int) -> tuple[datastore.Entity | None, bool]:
+    with ds.transaction():
+        user = ds.get(ds.key(USER_KIND, user_id))
+        if user is None:
+            return None, False
+        friends = user.get("U_Friends", []) or []
+        if friend_id not in friends:
+            return user, False
+        user["U_Friends"] = [fid for fid in friends if fid != friend_id]  # remove all occurrences
+        ds.put(user)
+    cache_refresh(user)
+    get_friend_graph().set(user_id, user["U_Friends"])
+    return user, True
+
+# Art_Count / Gallery_Count, kept in step by the art and gallery repos so a profile read
+# never has to scan a user's work. Called inside the caller's create/delete transaction: it
+# reads the owner and returns it with the deltas applied, for the caller to put alongside its
+# own write (None if there is nothing to change). Users created before the counters existed
+# have none until `python -m users.migrate` counts them.
+def stage_user_counts(ds: StorageClient, user_id: int | None, **deltas: int) -> datastore.Entity | None:
+    if user_id is None:
+        return None
+    user = ds.get(ds.key(USER_KIND, user_id))
+    if user is None or not any(prop in user for prop in deltas):
+        return None
+    for prop, delta in deltas.items():
+        if prop in user:
+            user[prop] = max(0, user[prop] + delta)
+    return user
+
+# Seeds counters a user doesn't have yet; ones already present are being maintained and are
+# left alone. Used by the migration. Each missing counter is counted (counters map the
+# property to a function of (ds, user_id)) and written in the same transaction, so an art or
+# gallery created or deleted meanwhile is neither lost nor counted twice.
+def seed_user_counts(
+    ds: StorageClient, user_id: int, counters: dict[str, Callable[[StorageClient, int], int]]
+) -> datastore.Entity | None:
+    with ds.transaction():
+        user = ds.get(ds.key(USER_KIND, user_id))
+        if user is None:
+            return None
+        missing = {prop: count(ds, user_id) for prop, count in counters.items() if prop not in user}
+        if not missing:
+            return user
+        user.update(missing)
+        ds.put(user)
+    cache_refresh(user)
+    return user
+
+# Pixels painted in the user's current drawing session (identified by its Today_Time).
+# A rollover starts a new session, which resets the count.
+def pixels_used(user: datastore.Entity) -> int:
+    if user.get("Pixels_Used_Session") != user.get("Today_Time", ""):
+        return 0
+    return user.get("Pixels_Used", 0)
+
+# Spends `count` pixels of the user's budget for their current session. The stored count is
+# read, checked against Pixel_Amount and incremented in one transaction, so workers drawing
+# for the same user at once can't both spend the last pixels. Returns (used, amount, spent);
+# None if the user is gone.
+def spend_pixels(ds: StorageClient, user_id: int, count: int, default_amount: int) -> tuple[int, int, bool] | None:
+    with ds.transaction():
+        user = ds.get(ds.key(USER_KIND, user_id))
+        if user is None:
+            return None
+        used = pixels_used(user)
+        amount = user.get("Pixel_Amount", default_amount)
+        if used + count > amount:
+            return used, amount, False
+        user.update({"Pixels_Used": used + count, "Pixels_Used_Session": user.get("Today_Time", "")})
+        ds.put(user)
+    cache_refresh(user)
+    return used + count, amount, True
+
+# Async twins for the async views; each runs on the shared storage I/O pool
+aget_user = to_async(get_user)
+aadd_friend = to_async(add_friend)
+aremove_friend = to_async(remove_friend)
@@ -0,0 +1,120 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from google.cloud import datastore
+
+from storage import StorageClient
+from users.notifications import schedule_users
+from users.repo import USER_KIND, list_user_ids
+from utils.cache import cache_invalidate
+from utils.time_utils import random_time_today_gmt
+
+logger = logging.getLogger(__name__)
+
+ROLLOVER_PAGE_SIZE = 500
+ROLLOVER_CHUNK_SIZE = 100  # entities per put_multi, well under the 500 mutations/commit limit
+ROLLOVER_WORKERS = 8
+ROLLOVER_TIME_BUDGET = 50.0  # seconds; stay inside a typical 60s request timeout
+
+
+@dataclass
+class RolloverReport:
+    processed: int = 0
+    pages: int = 0
+    elapsed: float = 0.0
+    complete: bool = False
+    # Cursor to resume from when the time budget ran out before the end of the User kind
+    cursor: str | None = None
+    first_user: datastore.Entity | None = None
+
+    @property
+    def users_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+# The chunk is read and written in one transaction and only Today_Time changes, so counts,
+# friends or pixels written since the page was listed are not put back stale. Returns the
+# stored users (ones deleted meanwhile are skipped).
+def _put_chunk(ds: StorageClient, user_ids: list[int]) -> list[datastore.Entity]:
+    with ds.transaction():
+        users = ds.get_multi([ds.key(USER_KIND, user_id) for user_id in user_ids])
+        for u in users:
+            u["Today_Time"] = random_time_today_gmt()
+        ds.put_multi(users)
+    users.sort(key=lambda u: user_ids.index(u.key.id))
+    schedule_users(ds, users)
+    # Invalidate rather than refresh so a full rollover doesn't flush the hot set out of the cache
+    for u in users:
+        cache_invalidate(USER_KIND, u.key.id)
+    return users
+
+
+def _wait(pending: list, report: RolloverReport) -> None:
+    for f in pending:
+        users = f.result()
+        if report.first_user is None and users:
+            report.first_user = users[0]
+
+
+def rollover_today_times(
+    ds: StorageClient,
+    *,
+    start_cursor: str | None = None,
+    page_size: int = ROLLOVER_PAGE_SIZE,
+    chunk_size: int = ROLLOVER_CHUNK_SIZE,
+    workers: int = ROLLOVER_WORKERS,
+    time_budget: float | None = ROLLOVER_TIME_BUDGET,
+    on_progress: Callable[[RolloverReport], None] | None = None,
+) -> RolloverReport:
+    report = RolloverReport(cursor=start_cursor)
+    started = time.monotonic()
+    cursor = start_cursor
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            if time_budget is not None and time.monotonic() - started >= time_budget:
+                break
+
+            # The next page is read while the previous page's writes are still in flight.
+            # Keys only: each chunk reads its users afresh in its own transaction.
+            user_ids, next_cursor = list_user_ids(ds, limit=page_size, cursor=cursor)
+
+            # Only advance the resumable cursor once the previous page is durable.
+            _wait(pending, report)
+            pending = []
+            report.cursor = cursor
+
+            if not user_ids:
+                cursor = None
+                report.complete = True
+                break
+
+            pending = [
+                pool.submit(_put_chunk, ds, user_ids[i:i + chunk_size])
+                for i in range(0, len(user_ids), chunk_size)
+            ]
+
+            report.processed += len(user_ids)
+            report.pages += 1
+            report.elapsed = time.monotonic() - started
+            if on_progress is not None:
+                on_progress(report)
+
+            cursor = next_cursor
+            if cursor is None:
+                report.complete = True
+                break
+
+        _wait(pending, report)
+        report.cursor = cursor
+
+    report.elapsed = time.monotonic() - started
+    logger.info(
+        "Today_Time rollover: %d users in %d pages, %.1fs (%.0f users/s), complete=%s",
+        report.processed, report.pages, report.elapsed, report.users_per_second, report.complete,
+    )
+    return report
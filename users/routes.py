@@ -1,5 +1,6 @@
+import asyncio
+
 from flask import Blueprint, request, jsonify
-from google.cloud import datastore
 
 from contracts import (
     require_accept_json,
@@ -7,13 +8,26 @@ from contracts import (
     reject_body,
     require_json_body,
     error_response,
+    ApiContractViolation,
 )
 
+from storage import StorageClient
 from utils.time_utils import random_time_today_gmt
-from users.repo import create_user_entity, get_user as repo_get_user, delete_user as repo_delete_user, list_users, add_friend as repo_add_friend, remove_friend as repo_remove_friend
-from users.serializers import user_to_response, user_mini_response
-
-def create_users_blueprint(ds: datastore.Client) -> Blueprint:
+from utils.pagination import parse_page_args
+from utils.expand import USER_EXPANDABLE, parse_expand, load_expansions, apply_expansions, expanded_etag
+from utils.etags import entity_etag, is_not_modified, not_modified_response, etag_response
+from users.repo import create_user_entity, get_user as repo_get_user, delete_user as repo_delete_user, list_user_ids, aget_user, aadd_friend, aremove_friend
+from users.serializers import user_to_response, user_mini
+from arts.repo import list_user_art_ids
+from arts.serializers import art_mini, feed_item_response
+from galleries.repo import list_user_gallery_ids
+from galleries.serializers import gallery_mini
+from users.notifications import schedule_users, unschedule_user
+from users.rollover import rollover_today_times
+from users.timeline import read_timeline
+from users.graph import get_friend_graph
+
+def create_users_blueprint(ds: StorageClient) -> Blueprint:
     bp = Blueprint("users", __name__)
 
     @bp.post("/users")
@@ -27,20 +41,22 @@ def create_users_blueprint(ds: datastore.Client) -> Blueprint:
         if not isinstance(userinfo, dict):
             return error_response(400, "The request object is missing the required userinfo attribute")
 
-        user = create_user_entity(ds, {
+        data = {
             "U_Name": userinfo.get("email") or userinfo.get("name") or "",
             "U_Auth_Sub": userinfo.get("sub") or "",
             "U_Profile": userinfo.get("picture") or "Image Path/File",
 
-            "Arts": [],
-            "Galleries": [],
+            "Art_Count": 0,
+            "Gallery_Count": 0,
             "U_Friends": [],
             "Pixel_Amount": 10,
             "Time_Length": 10,
             "Is_Custom_Time": False,
             "Custom_Time_Alarm": random_time_today_gmt(),
             "Today_Time": random_time_today_gmt(),
-        })
+        }
+        user = create_user_entity(ds, data)
+        schedule_users(ds, [user])
 
         return jsonify(user_to_response(user)), 201
 
@@ -48,10 +64,20 @@ def create_users_blueprint(ds: datastore.Client) -> Blueprint:
     @require_accept_json
     @reject_body
     def get_user(user_id: int):
+        try:
+            fields = parse_expand(USER_EXPANDABLE)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
         user = repo_get_user(ds, user_id)
         if user is None:
             return error_response(404, "Not Found")
-        return jsonify(user_to_response(user)), 200
+
+        loaded = load_expansions(ds, user, fields) if fields else {}
+        etag = expanded_etag(user, fields, loaded)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        return etag_response(apply_expansions(user_to_response(user), fields, loaded), 200, etag)
 
     @bp.delete("/users/<int:user_id>")
     @require_accept_json
@@ -59,14 +85,96 @@ def create_users_blueprint(ds: datastore.Client) -> Blueprint:
     def delete_user(user_id: int):
         if not repo_delete_user(ds, user_id):
             return error_response(404, "Not Found")
+        unschedule_user(ds, user_id)
         return "", 204
 
     @bp.get("/users")
     @require_accept_json
     @reject_body
     def get_all_users():
-        users = list_users(ds)
-        return jsonify({"Users": [user_mini_response(u) for u in users]}), 200
+        try:
+            limit, offset, cursor = parse_page_args()
+            user_ids, next_cursor = list_user_ids(ds, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Users": [user_mini(u) for u in user_ids], "next_cursor": next_cursor}), 200
+
+    @bp.get("/users/<int:user_id>/arts")
+    @require_accept_json
+    @reject_body
+    def list_user_arts(user_id: int):
+        if repo_get_user(ds, user_id) is None:
+            return error_response(404, "Not Found")
+        try:
+            limit, offset, cursor = parse_page_args()
+            art_ids, next_cursor = list_user_art_ids(ds, user_id, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Arts": [art_mini(a) for a in art_ids], "next_cursor": next_cursor}), 200
+
+    @bp.get("/users/<int:user_id>/galleries")
+    @require_accept_json
+    @reject_body
+    def list_user_galleries(user_id: int):
+        if repo_get_user(ds, user_id) is None:
+            return error_response(404, "Not Found")
+        try:
+            limit, offset, cursor = parse_page_args()
+            gallery_ids, next_cursor = list_user_gallery_ids(ds, user_id, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Galleries": [gallery_mini(g) for g in gallery_ids], "next_cursor": next_cursor}), 200
+
+    # Recent public arts of the users this user has in U_Friends, newest first
+    @bp.get("/users/<int:user_id>/timeline")
+    @require_accept_json
+    @reject_body
+    def get_timeline(user_id: int):
+        user = repo_get_user(ds, user_id)
+        if user is None:
+            return error_response(404, "Not Found")
+        try:
+            limit, offset, cursor = parse_page_args()
+            arts, next_cursor = read_timeline(ds, user, limit=limit, offset=offset, cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        return jsonify({"Arts": [feed_item_response(a) for a in arts], "next_cursor": next_cursor}), 200
+
+    # Users both have added as friends
+    @bp.get("/users/<int:user_id1>/friends/mutual/<int:user_id2>")
+    @require_accept_json
+    @reject_body
+    def get_mutual_friends(user_id1: int, user_id2: int):
+        graph = get_friend_graph()
+        if len(graph.friends_of(ds, [user_id1, user_id2])) < len({user_id1, user_id2}):
+            return error_response(404, "Not Found")
+
+        mutual = graph.mutual(ds, user_id1, user_id2)
+        return jsonify({"Mutual": [user_mini(uid) for uid in mutual], "Count": len(mutual)}), 200
+
+    # Friends of the user's friends they haven't added yet, ranked by how many of their
+    # friends have them. ?limit= as for list endpoints.
+    @bp.get("/users/<int:user_id>/suggestions")
+    @require_accept_json
+    @reject_body
+    def get_friend_suggestions(user_id: int):
+        try:
+            limit, _, _ = parse_page_args()
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+        if repo_get_user(ds, user_id) is None:
+            return error_response(404, "Not Found")
+
+        graph = get_friend_graph()
+        suggestions = graph.suggestions(ds, user_id, limit=limit)
+        return jsonify({
+            "Suggestions": [{**user_mini(uid), "Mutual": n} for uid, n in suggestions],
+            "Friends_Count": graph.degree(ds, user_id),
+        }), 200
 
     @bp.patch("/users")
     @require_accept_json
@@ -77,52 +185,61 @@ def create_users_blueprint(ds: datastore.Client) -> Blueprint:
         if body.get("request_method") != "automatically":
             return error_response(400, "BadRequest:Should not be triggered manually")
 
-        users = list_users(ds)
-        for u in users:
-            u["Today_Time"] = random_time_today_gmt()
-            ds.put(u)
-
-        return jsonify(user_to_response(users[0])) if users else jsonify({}), 200
+        # Optional resume point from a previous run that hit its time budget
+        cursor = body.get("cursor")
+        if cursor is not None and not isinstance(cursor, str):
+            return error_response(400, "Bad Request: invalid cursor.")
+
+        try:
+            report = rollover_today_times(ds, start_cursor=cursor)
+        except ApiContractViolation as e:
+            return error_response(e.status, e.message)
+
+        resp = jsonify(user_to_response(report.first_user)) if report.first_user is not None else jsonify({})
+        resp.headers["X-Rollover-Processed"] = str(report.processed)
+        resp.headers["X-Rollover-Users-Per-Second"] = f"{report.users_per_second:.0f}"
+        resp.headers["X-Rollover-Complete"] = "true" if report.complete else "false"
+        if report.cursor is not None:
+            resp.headers["X-Rollover-Cursor"] = report.cursor
+        return resp, 200
     
     @bp.patch("/users/<int:user_id1>/users/<int:user_id2>")
     @require_accept_json
     @reject_body
-    def add_friend(user_id1: int, user_id2: int):
+    async def add_friend(user_id1: int, user_id2: int):
         if user_id1 == user_id2:
             return error_response(403, "You cannot add yourself as a friend")
 
-        user1 = repo_get_user(ds, user_id1)
-        user2 = repo_get_user(ds, user_id2)
-
+        # Independent lookups, awaited together
+        user1, user2 = await asyncio.gather(aget_user(ds, user_id1), aget_user(ds, user_id2))
         if user1 is None or user2 is None:
             return error_response(404, "Not Found")
 
-        friends1 = user1.get("U_Friends", []) or []
-        if user_id2 in friends1:
+        # Decided on the stored friend list; the in-memory graph may lag other workers
+        user1, added = await aadd_friend(ds, user_id1, user_id2)
+        if user1 is None:
+            return error_response(404, "Not Found")
+        if not added:
             return error_response(403, "The user is already a friend")
 
-        repo_add_friend(ds, user1, user_id2)
-
         return jsonify(user_to_response(user1)), 200
     
     @bp.delete("/users/<int:user_id1>/users/<int:user_id2>")
     @require_accept_json
     @reject_body
-    def remove_friend(user_id1: int, user_id2: int):
+    async def remove_friend(user_id1: int, user_id2: int):
         if user_id1 == user_id2:
             return error_response(403, "You cannot remove yourself as a friend")
 
-        user1 = repo_get_user(ds, user_id1)
-        user2 = repo_get_user(ds, user_id2)
-
+        user1, user2 = await asyncio.gather(aget_user(ds, user_id1), aget_user(ds, user_id2))
         if user1 is None or user2 is None:
             return error_response(404, "Not Found")
 
-        friends1 = user1.get("U_Friends", []) or []
-        if user_id2 not in friends1:
+        user1, removed = await aremove_friend(ds, user_id1, user_id2)
+        if user1 is None:
+            return error_response(404, "Not Found")
+        if not removed:
             return error_response(403, "The user is not a friend")
-
-        repo_remove_friend(ds, user1, user_id2)
         return "", 204
 
     return bp
@@ -14,8 +14,10 @@ def user_to_response(user_entity: datastore.Entity) -> dict:
         "U_Auth_Sub": user_entity.get("U_Auth_Sub", ""),
         "U_Profile": user_entity.get("U_Profile", "Image Path/File"),
 
-        "Arts": user_entity.get("Arts", []) or [],
-        "Galleries": user_entity.get("Galleries", []) or [],
+        # Counts and links to the paginated lists, so the profile stays small however much
+        # the user has made
+        "Arts": {"Count": user_entity.get("Art_Count", 0), "self": user_self_url(user_id) + "/arts"},
+        "Galleries": {"Count": user_entity.get("Gallery_Count", 0), "self": user_self_url(user_id) + "/galleries"},
         "U_Friends": friends,
 
         "Pixel_Amount": user_entity.get("Pixel_Amount", 10),
@@ -28,6 +30,8 @@ def user_to_response(user_entity: datastore.Entity) -> dict:
         "self": user_self_url(user_id),
     }
 
-def user_mini_response(user_entity: datastore.Entity) -> dict:
-    user_id = user_entity.key.id
+def user_mini(user_id: int) -> dict:
     return {"U_ID": user_id, "self": user_self_url(user_id)}
+
+def user_mini_response(user_entity: datastore.Entity) -> dict:
+    return user_mini(user_entity.key.id)
@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import datastore
+from google.cloud.datastore.query import PropertyFilter
+
+from arts.feed import decode_cursor, encode_cursor
+from arts.repo import get_arts, list_public_user_arts
+from storage import StorageClient
+from users.repo import USER_KIND, get_user
+from utils.cache import cache_refresh
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Friends timelines, fan-out-on-write. When an art is published, an entry (art, author,
+# date) is appended to a per-day TimelineBucket under every user whose U_Friends contains
+# the author, in batched transactional writes. Reading a timeline is then one batch lookup
+# of the user's last TIMELINE_DAYS buckets.
+#
+# Authors followed by more than TIMELINE_FANOUT_LIMIT users are switched to fan-out-on-read
+# (U_Fanout_On_Read): their arts are not copied anywhere, and a reader merges in the recent
+# public arts of the few such authors they follow.
+#
+#   TIMELINE_DAYS             days of buckets a timeline shows
+#   TIMELINE_FANOUT_LIMIT     followers above which an author is read-side merged
+#   TIMELINE_BATCH            follower buckets written per transaction
+#   TIMELINE_FANOUT_THREADS   background fan-out threads (0 fans out inside the request)
+
+BUCKET_KIND = "TimelineBucket"
+TIMELINE_DAYS = int(os.getenv("TIMELINE_DAYS", "7"))
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "1000"))
+TIMELINE_BATCH = int(os.getenv("TIMELINE_BATCH", "100"))
+TIMELINE_FANOUT_THREADS = int(os.getenv("TIMELINE_FANOUT_THREADS", "2"))
+MAX_BUCKET_ENTRIES = 500  # keeps a bucket well under the entity size limit
+MAX_PULL_AUTHORS = 20  # fan-out-on-read authors merged into one timeline
+PULL_AUTHORS_REFRESH = 60  # seconds the set of fan-out-on-read authors is cached
+
+
+def bucket_key(ds: StorageClient, user_id: int, day: str) -> datastore.Key:
+    return ds.key(USER_KIND, user_id, BUCKET_KIND, day)
+
+
+def _entry_key(entry: dict) -> tuple[str, int]:
+    return entry.get("A_Modified_Date") or "", entry["A_ID"]
+
+
+# -------------------------
+# Write side
+# -------------------------
+
+# Fans a newly published art out to its author's followers. Returns the number of timelines
+# written (0 for an author on fan-out-on-read).
+def fan_out_art(ds: StorageClient, art: datastore.Entity) -> int:
+    author_id = (art.get("User") or {}).get("U_ID")
+    author = get_user(ds, author_id) if author_id is not None else None
+    if author is None or author.get("U_Fanout_On_Read"):
+        return 0
+
+    query = ds.query(kind=USER_KIND)
+    query.add_filter(filter=PropertyFilter("U_Friends", "=", author_id))
+    query.keys_only()
+    followers = [e.key.id for e in query.fetch(limit=TIMELINE_FANOUT_LIMIT + 1)]
+    if len(followers) > TIMELINE_FANOUT_LIMIT:
+        _set_fanout_on_read(ds, author_id)
+        return 0
+
+    entry = {"A_ID": art.key.id, "U_ID": author_id, "A_Modified_Date": art.get("A_Modified_Date") or ""}
+    day = entry["A_Modified_Date"][:10] or _today()
+    for i in range(0, len(followers), TIMELINE_BATCH):
+        _append(ds, followers[i:i + TIMELINE_BATCH], day, entry)
+    metrics.increment("timeline_fanout_writes", len(followers))
+    return len(followers)
+
+
+def _append(ds: StorageClient, user_ids: list[int], day: str, entry: dict) -> None:
+    keys = [bucket_key(ds, uid, day) for uid in user_ids]
+    with ds.transaction():
+        found = {b.key.parent.id: b for b in ds.get_multi(keys)}
+        buckets = []
+        for key, uid in zip(keys, user_ids):
+            bucket = found.get(uid) or datastore.Entity(key=key, exclude_from_indexes=("Entries",))
+            # A re-published art replaces its earlier entry
+            entries = [e for e in bucket.get("Entries", []) if e["A_ID"] != entry["A_ID"]]
+            entries.append(entry)
+            bucket["Entries"] = entries[-MAX_BUCKET_ENTRIES:]
+            buckets.append(bucket)
+        ds.put_multi(buckets)
+
+
+def _set_fanout_on_read(ds: StorageClient, user_id: int) -> None:
+    with ds.transaction():
+        user = ds.get(ds.key(USER_KIND, user_id))
+        if user is None or user.get("U_Fanout_On_Read"):
+            return
+        user["U_Fanout_On_Read"] = True
+        ds.put(user)
+    cache_refresh(user)
+    _pull_authors.clear()
+    logger.info("User %d has more than %d followers; timelines now read their arts", user_id, TIMELINE_FANOUT_LIMIT)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+# Fan-out runs off the request thread; a failure is logged and the art simply doesn't appear
+# on timelines (it is still on the author's profile and the public feed).
+def schedule_fan_out(ds: StorageClient, art: datastore.Entity) -> None:
+    global _executor, _executor_pid
+    if TIMELINE_FANOUT_THREADS <= 0:
+        fan_out_art(ds, art)
+        return
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=TIMELINE_FANOUT_THREADS, thread_name_prefix="timeline-fanout")
+            _executor_pid = os.getpid()
+        future = _executor.submit(fan_out_art, ds, art)
+    future.add_done_callback(_log_failure)
+
+
+def _log_failure(future) -> None:
+    if future.exception() is not None:
+        logger.error("Timeline fan-out failed", exc_info=future.exception())
+
+
+# Waits for queued fan-outs, so a graceful shutdown doesn't drop them
+def stop_fan_out() -> None:
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None and _executor_pid == os.getpid():
+        executor.shutdown(wait=True)
+
+
+# -------------------------
+# Read side
+# -------------------------
+
+class _PullAuthors:
+    def __init__(self):
+        self._ids = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, ds: StorageClient) -> set[int]:
+        with self._lock:
+            if self._ids is not None and time.monotonic() - self._loaded_at < PULL_AUTHORS_REFRESH:
+                return self._ids
+        query = ds.query(kind=USER_KIND)
+        query.add_filter(filter=PropertyFilter("U_Fanout_On_Read", "=", True))
+        query.keys_only()
+        ids = {e.key.id for e in query.fetch()}
+        with self._lock:
+            self._ids, self._loaded_at = ids, time.monotonic()
+        return ids
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids = None
+
+
+_pull_authors = _PullAuthors()
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+# One page of a user's timeline, newest first: the public arts still visible, and the next
+# cursor (None at the end). Arts deleted or made private since they were fanned out are
+# dropped here, so a page can be shorter than limit.
+def read_timeline(
+    ds: StorageClient, user: datastore.Entity, *, limit: int, offset: int = 0, cursor: str | None = None
+) -> tuple[list[datastore.Entity], str | None]:
+    after = decode_cursor(cursor) if cursor is not None else None
+    now = datetime.now(timezone.utc)
+    days = [(now - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(TIMELINE_DAYS)]
+
+    entries = {}
+    for bucket in ds.get_multi([bucket_key(ds, user.key.id, day) for day in days]):
+        for e in bucket.get("Entries", []):
+            current = entries.get(e["A_ID"])
+            if current is None or _entry_key(e) > _entry_key(current):
+                entries[e["A_ID"]] = e
+
+    friends = set(user.get("U_Friends", []) or [])
+    for author_id in sorted(friends & _pull_authors.get(ds))[:MAX_PULL_AUTHORS]:
+        arts = list_public_user_arts(ds, author_id, limit=offset + limit + 1, since=days[-1],
+                                     until=after[0] if after is not None else None)
+        for art in arts:
+            entries[art.key.id] = {"A_ID": art.key.id, "U_ID": author_id, "A_Modified_Date": art.get("A_Modified_Date")}
+
+    ordered = sorted(entries.values(), key=_entry_key, reverse=True)
+    if after is not None:
+        ordered = [e for e in ordered if _entry_key(e) < after]
+    else:
+        ordered = ordered[offset:]
+    page = ordered[:limit]
+    next_cursor = encode_cursor(_entry_key(page[-1])) if len(ordered) > limit else None
+
+    arts = get_arts(ds, [e["A_ID"] for e in page])
+    visible = [arts[e["A_ID"]] for e in page if e["A_ID"] in arts and arts[e["A_ID"]].get("A_Is_Public")]
+    return visible, next_cursor
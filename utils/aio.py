@@ -0,0 +1,30 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# The Datastore client is blocking (gRPC), so async code runs repo calls on a shared pool.
+# Its size, not the worker's thread count, bounds how many RPCs are in flight at once.
+IO_THREADS = int(os.getenv("IO_THREADS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="storage-io")
+
+
+# The caller's context is carried over so repo code still sees the Flask request (self URLs,
+# metrics attribution) on the pool thread.
+async def run_io(fn: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+# Async twin of a blocking repo function, e.g. aget_user = to_async(get_user)
+def to_async(fn: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_io(fn, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,235 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+# Read-through entity cache for the repo get_* functions.
+#
+#   ENTITY_CACHE          lru (default) | shared | none
+#   ENTITY_CACHE_SIZE     max entries per process (lru) or in the shared server
+#   ENTITY_CACHE_TTL      seconds an entry may be served; bounds staleness across processes
+#   ENTITY_CACHE_ADDRESS  host:port of the shared cache server (shared backend)
+#   ENTITY_CACHE_AUTHKEY  auth key for the shared cache server (required for shared)
+
+DEFAULT_CACHE_SIZE = 10_000
+DEFAULT_CACHE_TTL = 30.0
+DEFAULT_SHARED_ADDRESS = "127.0.0.1:50055"
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Values are copied in and out so callers can mutate what they get back
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    # Stores value only if the key holds no live entry. Read-through fills use this, so an
+    # entity read before a concurrent write can't replace the copy that write refreshed.
+    def add(self, key, value) -> bool:
+        value = copy.deepcopy(value)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= time.monotonic():
+                return False
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "lru",
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value) -> None:
+        pass
+
+    def add(self, key, value) -> bool:
+        return False
+
+    def invalidate(self, key) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+
+# -------------------------
+# Shared backend: one LRUCache living in a manager process, used by every local worker
+# -------------------------
+
+class _CacheManager(BaseManager):
+    pass
+
+
+def _parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def serve_shared_cache(address: str, authkey: bytes, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL) -> None:
+    store = LRUCache(maxsize=maxsize, ttl=ttl)
+    _CacheManager.register("entity_cache", callable=lambda: store)
+    manager = _CacheManager(address=_parse_address(address), authkey=authkey)
+    manager.get_server().serve_forever()
+
+
+def connect_shared_cache(address: str, authkey: bytes):
+    _CacheManager.register("entity_cache")
+    manager = _CacheManager(address=_parse_address(address), authkey=authkey)
+    manager.connect()
+    return manager.entity_cache()
+
+
+# The shared server accepts any process that knows the key, so there is no default
+def _shared_authkey() -> bytes:
+    authkey = os.getenv("ENTITY_CACHE_AUTHKEY", "")
+    if not authkey:
+        raise ValueError("ENTITY_CACHE=shared needs ENTITY_CACHE_AUTHKEY")
+    return authkey.encode("utf-8")
+
+
+# -------------------------
+# Process-wide instance
+# -------------------------
+
+_entity_cache = None
+_entity_cache_lock = threading.Lock()
+
+
+def _cache_from_env():
+    backend = os.getenv("ENTITY_CACHE", "lru").lower()
+    maxsize = int(os.getenv("ENTITY_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    ttl = float(os.getenv("ENTITY_CACHE_TTL", DEFAULT_CACHE_TTL))
+
+    if backend == "none":
+        return NullCache()
+    if backend == "shared":
+        return connect_shared_cache(
+            os.getenv("ENTITY_CACHE_ADDRESS", DEFAULT_SHARED_ADDRESS),
+            _shared_authkey(),
+        )
+    return LRUCache(maxsize=maxsize, ttl=ttl)
+
+
+def get_entity_cache():
+    global _entity_cache
+    if _entity_cache is None:
+        with _entity_cache_lock:
+            if _entity_cache is None:
+                _entity_cache = _cache_from_env()
+    return _entity_cache
+
+
+def set_entity_cache(cache) -> None:
+    global _entity_cache
+    _entity_cache = cache
+
+
+# -------------------------
+# Repo helpers
+# -------------------------
+
+def cached_get(ds, kind: str, entity_id: int):
+    cache = get_entity_cache()
+    entity = cache.get((kind, entity_id))
+    if entity is None:
+        entity = ds.get(ds.key(kind, entity_id))
+        if entity is not None:
+            cache.add((kind, entity_id), entity)
+    return entity
+
+
+# Batched read-through: cache hits are served locally, all misses go out in one get_multi
+def cached_get_multi(ds, kind: str, entity_ids) -> dict:
+    cache = get_entity_cache()
+    found = {}
+    misses = []
+    for entity_id in dict.fromkeys(entity_ids):
+        entity = cache.get((kind, entity_id))
+        if entity is None:
+            misses.append(entity_id)
+        else:
+            found[entity_id] = entity
+    if misses:
+        for entity in ds.get_multi([ds.key(kind, i) for i in misses]):
+            found[entity.key.id] = entity
+            cache.add((kind, entity.key.id), entity)
+    return found
+
+
+# Called after a successful write so the next read sees the stored copy
+def cache_refresh(entity) -> None:
+    get_entity_cache().set((entity.key.kind, entity.key.id), entity)
+
+
+def cache_invalidate(kind: str, entity_id: int) -> None:
+    get_entity_cache().invalidate((kind, entity_id))
+
+
+if __name__ == "__main__":
+    serve_shared_cache(
+        os.getenv("ENTITY_CACHE_ADDRESS", DEFAULT_SHARED_ADDRESS),
+        _shared_authkey(),
+        int(os.getenv("ENTITY_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        float(os.getenv("ENTITY_CACHE_TTL", DEFAULT_CACHE_TTL)),
+    )
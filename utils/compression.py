@@ -0,0 +1,62 @@
+import gzip
+import os
+
+from flask import Flask, request
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are only gzip-compressed
+    brotli = None
+
+# Compresses JSON responses for clients that send Accept-Encoding. Brotli is preferred when
+# the client accepts it equally and the module is installed. Bodies under
+# COMPRESS_MIN_SIZE bytes are sent as they are; compressing them costs more than it saves.
+# Images and thumbnails are already compressed, and range requests and streamed bodies are
+# left untouched. ETags are kept as they are: they name the entity version, which is the
+# same whichever encoding it is sent in.
+#
+#   COMPRESS_MIN_SIZE  smallest body that is compressed (bytes)
+#   COMPRESS_LEVEL     gzip level, 1-9
+#   BROTLI_QUALITY     brotli quality, 0-11
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json",)
+
+
+def available_encodings() -> list[str]:
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def init_compression(app: Flask) -> None:
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
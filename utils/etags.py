@@ -0,0 +1,36 @@
+import hashlib
+import json
+
+from flask import jsonify, request
+
+from contracts import ApiContractViolation
+
+
+# Version tag for an entity: a hash of its stored properties. It is computed from the entity
+# rather than the response body, so a matching If-None-Match is answered before serialising.
+def entity_etag(entity, *extra) -> str:
+    payload = json.dumps(
+        [entity.key.kind, entity.key.id, entity, *extra],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def is_not_modified(etag: str) -> bool:
+    return request.if_none_match.contains(etag)
+
+
+def not_modified_response(etag: str):
+    return "", 304, {"ETag": f'"{etag}"'}
+
+
+def etag_response(body: dict, status: int, etag: str):
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    return resp, status
+
+
+# Raises 412 if the request carries If-Match and the entity's current version is not in it
+def check_if_match(entity) -> None:
+    if request.if_match and not request.if_match.contains(entity_etag(entity)):
+        raise ApiContractViolation(412, "Precondition Failed")
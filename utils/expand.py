@@ -0,0 +1,103 @@
+from typing import Iterable
+
+from flask import request
+
+from contracts import ApiContractViolation
+from arts.repo import get_arts
+from arts.serializers import art_to_response
+from galleries.repo import get_galleries
+from galleries.serializers import gallery_to_response
+from users.repo import get_users
+from users.serializers import user_to_response
+from utils.etags import entity_etag
+
+# Upper bound on referenced entities inlined into one response. References past the cap
+# are left as mini objects.
+MAX_EXPAND = 50
+
+# field -> id key of the embedded mini object
+_FIELD_ID_KEYS = {
+    "User": "U_ID",
+    "U_Friends": "U_ID",
+    "Arts": "A_ID",
+    "Galleries": "G_ID",
+}
+
+# id key -> (batch loader, serializer)
+_KINDS = {
+    "U_ID": (get_users, user_to_response),
+    "A_ID": (get_arts, art_to_response),
+    "G_ID": (get_galleries, gallery_to_response),
+}
+
+ART_EXPANDABLE = ("User", "Galleries")
+GALLERY_EXPANDABLE = ("User",)
+USER_EXPANDABLE = ("U_Friends",)
+
+
+# Reads ?expand=A,B from the query string; unknown fields are a 400
+def parse_expand(allowed: Iterable[str]) -> list[str]:
+    raw = request.args.get("expand", "")
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiContractViolation(400, f"Bad Request: cannot expand: {', '.join(unknown)}.")
+    return fields
+
+
+# Ids referenced by a stored field (ints or mini objects, single or list)
+def _ref_ids(value, id_key: str) -> list[int]:
+    items = value if isinstance(value, list) else [value]
+    ids = []
+    for v in items:
+        if isinstance(v, dict):
+            v = v.get(id_key)
+        if isinstance(v, int) and not isinstance(v, bool):
+            ids.append(v)
+    return ids
+
+
+# Resolves the references behind `fields` with one batched lookup per kind
+def load_expansions(ds, entity, fields: Iterable[str]) -> dict[tuple[str, int], object]:
+    wanted = {}  # id key -> ids, in reference order
+    budget = MAX_EXPAND
+    for field in fields:
+        id_key = _FIELD_ID_KEYS[field]
+        ids = _ref_ids(entity.get(field), id_key)[:budget]
+        budget -= len(ids)
+        wanted.setdefault(id_key, []).extend(ids)
+
+    loaded = {}
+    for id_key, ids in wanted.items():
+        if not ids:
+            continue
+        loader, _ = _KINDS[id_key]
+        for entity_id, ref in loader(ds, ids).items():
+            loaded[(id_key, entity_id)] = ref
+    return loaded
+
+
+# Replaces mini objects in a serialised body with the full serialised referenced entity
+def apply_expansions(body: dict, fields: Iterable[str], loaded: dict) -> dict:
+    def expand(mini, id_key):
+        ref = loaded.get((id_key, mini.get(id_key))) if isinstance(mini, dict) else None
+        if ref is None:
+            return mini
+        return _KINDS[id_key][1](ref)
+
+    for field in fields:
+        id_key = _FIELD_ID_KEYS[field]
+        value = body.get(field)
+        if isinstance(value, list):
+            body[field] = [expand(v, id_key) for v in value]
+        elif value is not None:
+            body[field] = expand(value, id_key)
+    return body
+
+
+# An expanded response must change version whenever any inlined entity does
+def expanded_etag(entity, fields: list[str], loaded: dict) -> str:
+    if not fields:
+        return entity_etag(entity)
+    refs = [[id_key, entity_id, ref] for (id_key, entity_id), ref in loaded.items()]
+    return entity_etag(entity, fields, refs)
@@ -0,0 +1,41 @@
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: without it Flask's stdlib-json provider is used
+    orjson = None
+
+# Serialises responses with orjson when it is installed. It encodes a page of entities
+# several times faster than the stdlib encoder and returns bytes, so the body isn't built
+# as a str and then encoded again. Output matches Flask's: sorted keys, compact unless
+# the app runs in debug mode, and anything orjson can't encode goes through Flask's
+# default hook.
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs) -> str:
+        return self._dumps(obj, **kwargs).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps(obj) + b"\n", mimetype=self.mimetype)
+
+    def _dumps(self, obj, **kwargs) -> bytes:
+        if kwargs:
+            return super().dumps(obj, **kwargs).encode("utf-8")
+        # Datetimes go through the default hook too, so they keep Flask's HTTP-date format
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+def init_json(app: Flask) -> None:
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Flask, Response, g, has_request_context, request
+
+from utils.cache import get_entity_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cache hit through a slow multi-RPC request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = defaultdict(Histogram)  # (endpoint, method) -> Histogram
+        self.requests = defaultdict(int)  # (endpoint, method, status) -> count
+        self.rpc_latency = defaultdict(Histogram)  # (rpc, endpoint) -> Histogram
+        self.counters = defaultdict(int)  # name -> count, rendered as bearsty_<name>_total
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.request_latency[(endpoint, method)].observe(seconds)
+            self.requests[(endpoint, method, status)] += 1
+
+    # InstrumentedClient callback: every Datastore RPC made while serving a request
+    def observe_rpc(self, rpc: str, seconds: float) -> None:
+        endpoint = (request.endpoint or "unmatched") if has_request_context() else "background"
+        with self._lock:
+            self.rpc_latency[(rpc, endpoint)].observe(seconds)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += _histogram_lines(
+                "bearsty_request_duration_seconds", "Request latency by endpoint.",
+                ("endpoint", "method"), self.request_latency,
+            )
+            lines += [
+                "# HELP bearsty_requests_total Requests served by endpoint and status.",
+                "# TYPE bearsty_requests_total counter",
+            ]
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(f"bearsty_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {n}")
+            lines += _histogram_lines(
+                "bearsty_datastore_rpc_duration_seconds", "Datastore RPC latency by RPC and calling endpoint.",
+                ("rpc", "endpoint"), self.rpc_latency,
+            )
+            for name, n in sorted(self.counters.items()):
+                lines += [f"# TYPE bearsty_{name}_total counter", f"bearsty_{name}_total {n}"]
+
+        stats = get_entity_cache().stats()
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            if name in stats:
+                lines += [f"# TYPE bearsty_entity_cache_{name}_total counter", f"bearsty_entity_cache_{name}_total {stats[name]}"]
+        if "size" in stats:
+            lines += ["# TYPE bearsty_entity_cache_size gauge", f"bearsty_entity_cache_size {stats['size']}"]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels) -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, label_names: tuple, histograms: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for label_values, h in sorted(histograms.items()):
+        labels = dict(zip(label_names, label_values))
+        cumulative = 0
+        for bound, n in zip(h.buckets, h.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {h.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {h.total}")
+        lines.append(f"{name}_count{_labels(**labels)} {h.count}")
+    return lines
+
+
+metrics = Metrics()
+
+
+# Registers request timing and GET /metrics (Prometheus text format). Requests slower than
+# SLOW_REQUEST_MS are logged at WARNING.
+def init_metrics(app: Flask) -> None:
+    slow_ms = float(os.getenv("SLOW_REQUEST_MS", "0") or 0)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe_request(endpoint, request.method, response.status_code, seconds)
+        if slow_ms and seconds * 1000 >= slow_ms:
+            logger.warning("Slow request: %s %s -> %d in %.1fms", request.method, request.path, response.status_code, seconds * 1000)
+        return response
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,44 @@
+import re
+
+from flask import request
+from google.api_core.exceptions import BadRequest as DatastoreBadRequest
+
+from contracts import ApiContractViolation
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_CURSOR_RE = re.compile(r"[A-Za-z0-9_\-]+={0,2}")
+
+
+# Reads limit/offset/cursor from the query string. limit is always bounded so a list
+# endpoint can never return a whole kind.
+def parse_page_args() -> tuple[int, int, str | None]:
+    limit = request.args.get("limit", default=DEFAULT_PAGE_SIZE, type=int)
+    offset = request.args.get("offset", default=0, type=int)
+    cursor = request.args.get("cursor") or None
+
+    if offset < 0 or limit < 0:
+        raise ApiContractViolation(400, "Bad Request: limit/offset must be non-negative.")
+
+    if cursor is not None and not _CURSOR_RE.fullmatch(cursor):
+        raise ApiContractViolation(400, "Bad Request: invalid cursor.")
+
+    return min(limit, MAX_PAGE_SIZE), offset, cursor
+
+
+# Fetches one page of a query. Offset is only the legacy compatibility path: a cursor
+# resumes where the previous page ended instead of scanning and discarding skipped rows.
+def fetch_page(query, *, limit: int, offset: int = 0, cursor: str | None = None) -> tuple[list, str | None]:
+    if cursor is not None:
+        it = query.fetch(limit=limit, start_cursor=cursor)
+    else:
+        it = query.fetch(limit=limit, offset=offset)
+    try:
+        page = list(next(it.pages, ()))
+    except (ValueError, DatastoreBadRequest):
+        if cursor is None:
+            raise
+        raise ApiContractViolation(400, "Bad Request: invalid cursor.")
+    token = it.next_page_token
+    return page, token.decode("ascii") if isinstance(token, bytes) else token
@@ -1,7 +1,16 @@
-from flask import request
+from flask import g, request
+
+# Scheme and host every self link starts with. request.host_url is cached by werkzeug, but
+# a list response builds one link per item, so the stripped prefix is kept on g and each
+# link is a single concatenation.
+def base_url() -> str:
+    prefix = g.get("base_url")
+    if prefix is None:
+        prefix = g.base_url = request.host_url.rstrip("/")
+    return prefix
 
 def user_self_url(user_id: int) -> str:
-    return request.host_url.rstrip("/") + f"/users/{user_id}"
+    return f"{base_url()}/users/{user_id}"
 
 def friend_mini(user_id: int) -> dict:
     return {"U_ID": user_id, "self": user_self_url(user_id)}
@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Coalesces field updates per entity in memory and persists each entity at most once per
+# interval, from a background thread. persist(ds, entity_id, updates) writes the merged
+# updates; it should apply them to a fresh read so concurrent writes to other fields survive.
+# Counters are exported through /metrics as bearsty_<name>_writes_{buffered,coalesced,persisted}_total.
+class WriteBehindBuffer:
+    def __init__(self, persist: Callable[[object, int, dict], object], *, interval: float, name: str):
+        self._persist = persist
+        self.interval = interval
+        self.name = name
+        self._pending = {}  # entity id -> (ds, merged updates)
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+        self._stop = threading.Event()
+
+    # Returns True if the updates were merged into ones already waiting to be written
+    def add(self, ds, entity_id: int, updates: dict) -> bool:
+        with self._lock:
+            entry = self._pending.get(entity_id)
+            coalesced = entry is not None
+            if coalesced:
+                entry[1].update(updates)
+            else:
+                self._pending[entity_id] = (ds, dict(updates))
+        metrics.increment(f"{self.name}_writes_buffered")
+        if coalesced:
+            metrics.increment(f"{self.name}_writes_coalesced")
+        self._ensure_flusher()
+        return coalesced
+
+    # Updates not yet persisted, for read-your-writes
+    def pending(self, entity_id: int) -> dict | None:
+        with self._lock:
+            entry = self._pending.get(entity_id)
+            return dict(entry[1]) if entry is not None else None
+
+    # Removes and returns the pending updates, for a caller that writes them itself
+    def take(self, entity_id: int) -> dict:
+        with self._lock:
+            entry = self._pending.pop(entity_id, None)
+        return entry[1] if entry is not None else {}
+
+    # Puts taken updates back after a failed write; anything buffered since takes precedence
+    def restore(self, ds, entity_id: int, updates: dict) -> None:
+        if not updates:
+            return
+        with self._lock:
+            entry = self._pending.get(entity_id)
+            merged = {**updates, **(entry[1] if entry is not None else {})}
+            self._pending[entity_id] = (ds, merged)
+
+    def discard(self, entity_id: int) -> None:
+        with self._lock:
+            self._pending.pop(entity_id, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush_all(self) -> None:
+        with self._lock:
+            entries = list(self._pending.items())
+            self._pending.clear()
+        for entity_id, (ds, updates) in entries:
+            try:
+                self._persist(ds, entity_id, updates)
+                metrics.increment(f"{self.name}_writes_persisted")
+            except Exception:
+                logger.exception("Write-behind flush of %s %d failed; retrying", self.name, entity_id)
+                self.restore(ds, entity_id, updates)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush_all()
+
+    # Started on first use in each process, so a pre-fork master never runs one
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher_pid == os.getpid():
+                return
+            self._flusher = threading.Thread(target=self._run, name=f"{self.name}-write-behind", daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            started = time.monotonic()
+            self.flush_all()
+            elapsed = time.monotonic() - started
+            if elapsed > self.interval:
+                logger.warning("Write-behind flush of %s took %.1fs, longer than its %.1fs interval",
+                               self.name, elapsed, self.interval)
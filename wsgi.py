@@ -0,0 +1,9 @@
+import logging
+import os
+
+from app import create_app
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+# WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()